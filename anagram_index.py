@@ -0,0 +1,130 @@
+"""Anagram index over the dictionary.
+
+Every word is filed under its letters in sorted order, e.g. CAT, ACT and
+TAC all under ``ACT``. The sorted keys also form a trie. Walking it while
+spending letters from a multiset visits only sub-multisets that begin
+some key, so "which words can be spelled from these letters" takes one
+pass however many letters there are, from a single row to a whole
+region.
+
+Usage:
+    python anagram_index.py RATSEI          # words spelled from these letters
+"""
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+
+WORDS = None  # Trie node key holding the words that end there
+
+
+class AnagramIndex:
+    """Maps sorted letter multisets to words, with sub-multiset queries."""
+
+    def __init__(self, words, max_length, letter_scores):
+        self.max_length = max_length
+        self.letter_scores = letter_scores
+        self.keys = {}  # sorted letters -> [words]
+        self.root = {}
+        for word in words:
+            if not 3 <= len(word) <= max_length:
+                continue
+            key = ''.join(sorted(word))
+            anagrams = self.keys.get(key)
+            if anagrams is None:
+                anagrams = self.keys[key] = []
+                node = self.root
+                for letter in key:
+                    node = node.setdefault(letter, {})
+                node[WORDS] = anagrams
+            anagrams.append(word)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def anagrams(self, letters):
+        """Words using exactly ``letters``."""
+        return self.keys.get(''.join(sorted(letters)), [])
+
+    def words_in(self, letters, blanks=0):
+        """Every word that can be spelled from ``letters`` (each used at most once).
+
+        ``blanks`` wildcards may stand in for any letter.
+        """
+        found = []
+        self._collect(self.root, *self._spend(letters), 0, blanks, found)
+        return found
+
+    # Trie access, so a subclass can keep the trie elsewhere (see ``lexicon``)
+
+    @staticmethod
+    def _words(node):
+        return node.get(WORDS)
+
+    @staticmethod
+    def _children(node):
+        return [(letter, child) for letter, child in node.items() if letter is not WORDS]
+
+    @staticmethod
+    def _child(node, letter):
+        return node.get(letter)
+
+    @staticmethod
+    def _spend(letters):
+        """The distinct letters in sorted order and how many of each are left to spend."""
+        counts = Counter(letters)
+        distinct = sorted(counts)
+        return distinct, [counts[letter] for letter in distinct]
+
+    def _collect(self, node, distinct, counts, start, blanks, found):
+        """Depth-first walk of the trie spending ``counts``.
+
+        Keys are sorted, so below a letter only that letter and later ones
+        can follow: the walk spends ``distinct[start:]`` only, and visits
+        each reachable key once.
+        """
+        words = self._words(node)
+        if words:
+            found.extend(words)
+        if blanks:
+            # A blank can be any letter, so every child is reachable
+            floor = distinct[start - 1] if start else ""
+            for letter, child in self._children(node):
+                if letter < floor:
+                    continue
+                i = bisect_left(distinct, letter)
+                if i < len(distinct) and distinct[i] == letter and counts[i]:
+                    counts[i] -= 1
+                    self._collect(child, distinct, counts, i, blanks, found)
+                    counts[i] += 1
+                else:
+                    self._collect(child, distinct, counts, i, blanks - 1, found)
+            return
+        for i in range(start, len(distinct)):
+            if counts[i]:
+                child = self._child(node, distinct[i])
+                if child is not None:
+                    counts[i] -= 1
+                    self._collect(child, distinct, counts, i, 0, found)
+                    counts[i] += 1
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python anagram_index.py LETTERS")
+        return 2
+
+    from engine import get_anagram_index
+    letters = argv[0].upper()
+    index = get_anagram_index(max(len(letters), 3))
+    start = time.perf_counter()
+    words = index.words_in(letters)
+    duration = time.perf_counter() - start
+    print(f"{len(words)} words from {letters} ({duration * 1e6:.0f} us, {len(index)} keys indexed):")
+    print(" ".join(sorted(words, key=lambda word: (-len(word), word))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
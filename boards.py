@@ -0,0 +1,261 @@
+"""Batch analysis of boards for QA of generated grids.
+
+``analyze`` streams boards from a file or stdin, one per line, through
+the engine and writes one JSON line per board:
+
+    line           line number in the input
+    size           grid size
+    words          every word on the board, overlapping ones included
+    score          points the board pops as it stands, under ``--selection``
+    optimal_score  points the best non-overlapping set of those words is worth
+    optimal_exact  false if the search for that set ran out of budget, so
+                   ``optimal_score`` is only the best found (see ``selection``)
+    best_swap      [[row, col], [row, col]] of the best greedy swap, or null
+    swap_score     points that swap scores
+    dead           true if no swap can score
+    richness       [words, best score]: distinct words the letters of each
+                   line could spell if rearranged, summed over the lines, and
+                   the best of them (see ``GameEngine.board_richness``)
+
+A board line is its letters, row after row, optionally split into rows
+by spaces, commas or slashes; its length must be a square (3x3 and up).
+Blank lines and lines starting with ``#`` are skipped. Lines that are
+not a board produce ``{"line": n, "error": "..."}``.
+
+Boards are read in chunks of ``--chunk-size`` lines and analyzed across
+a process pool. At most ``PENDING_PER_WORKER`` chunks per worker are in
+flight, and results are written in input order as they complete, so
+memory stays bounded however long the input is. Totals go to stderr.
+
+Usage:
+    python boards.py analyze boards.txt --output report.jsonl
+    python boards.py generate --count 100000 | python boards.py analyze - > report.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from multiprocessing import Pool
+
+from engine import GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE, LETTER_SCORES, calculate_word_score
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES
+from selection import SELECTION_RULES, max_score_packing
+
+CHUNK_SIZE = 1000  # Board lines per pool task
+PENDING_PER_WORKER = 2  # Chunks queued per worker before reading more input
+SEPARATORS = str.maketrans("", "", " \t\r\n,/")
+
+_engines = {}  # (grid size, selection, scan) -> engine reused for every board of that size
+
+
+class BoardStats:
+    """Totals over analyzed boards; chunks merge into one."""
+
+    def __init__(self):
+        self.boards = 0
+        self.errors = 0
+        self.with_words = 0
+        self.dead = 0
+        self.swap_score = 0
+        self.richness = 0
+        self.inexact = 0  # Boards whose optimal score is only the best found
+        self.sizes = Counter()  # grid size -> boards
+
+    def add(self, result):
+        if "error" in result:
+            self.errors += 1
+            return
+        self.boards += 1
+        self.sizes[result["size"]] += 1
+        self.with_words += bool(result["words"])
+        self.dead += result["dead"]
+        self.swap_score += result["swap_score"]
+        self.richness += result["richness"][0]
+        self.inexact += not result["optimal_exact"]
+
+    def merge(self, other):
+        self.boards += other.boards
+        self.errors += other.errors
+        self.with_words += other.with_words
+        self.dead += other.dead
+        self.swap_score += other.swap_score
+        self.richness += other.richness
+        self.inexact += other.inexact
+        self.sizes.update(other.sizes)
+
+    def report(self):
+        boards = max(1, self.boards)
+        sizes = "  ".join(f"{size}x{size}: {count}" for size, count in sorted(self.sizes.items()))
+        return "\n".join([
+            f"Boards: {self.boards}  Errors: {self.errors}  ({sizes})",
+            f"With words: {self.with_words} ({self.with_words / boards:.1%})  "
+            f"Dead: {self.dead} ({self.dead / boards:.1%})  "
+            f"Mean best swap: {self.swap_score / boards:.2f}  Mean richness: {self.richness / boards:.1f} words",
+            f"Optimal score cut short by the search budget: {self.inexact} ({self.inexact / boards:.1%})",
+        ])
+
+
+def parse_board(text):
+    """The rows of the board written on ``text``; raises ValueError if it is not one."""
+    letters = text.translate(SEPARATORS).upper()
+    size = math.isqrt(len(letters))
+    if size < 3 or size * size != len(letters):
+        raise ValueError(f"{len(letters)} letters is not a square board of 3x3 or more")
+    for letter in letters:
+        if letter not in LETTER_SCORES:
+            raise ValueError(f"not a letter: {letter!r}")
+    return [list(letters[r * size:(r + 1) * size]) for r in range(size)]
+
+
+def board_engine(rows, selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+    """An engine holding ``rows``; one is kept per grid size and reloaded for each board."""
+    key = (len(rows), selection, scan)
+    engine = _engines.get(key)
+    if engine is None:
+        engine = _engines[key] = GameEngine(seed=0, clock=ManualClock(), grid_size=len(rows),
+                                            selection=selection, scan=scan, grid=rows)
+    else:
+        engine.grid = rows
+    engine.mark_dirty(engine.segments.full_mask)
+    return engine
+
+
+def analyze_board(rows, selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+    """The report of one board (see the module docstring), without its line number."""
+    engine = board_engine(rows, selection, scan)
+    words = engine.find_all_word_masks()
+    score = sum(calculate_word_score(word) for word, _ in engine.select_words(words, calculate_word_score))
+    packing, exact = max_score_packing(words, calculate_word_score)
+    optimal = sum(calculate_word_score(word) for word, _ in packing)
+    swap_score, pos1, pos2 = engine.find_best_swaps(1)[0]
+    return {
+        "size": engine.grid_size,
+        "words": [word for word, _ in words],
+        "score": score,
+        "optimal_score": optimal,
+        "optimal_exact": exact,
+        "best_swap": [list(pos1), list(pos2)] if swap_score else None,
+        "swap_score": swap_score,
+        "dead": engine.is_dead_board(),
+        "richness": list(engine.board_richness()),
+    }
+
+
+def analyze_chunk(task):
+    """Pool worker: report on a chunk of numbered lines; returns (JSON lines, ``BoardStats``)."""
+    lines, selection, scan = task
+    stats = BoardStats()
+    out = []
+    for number, text in lines:
+        try:
+            result = {"line": number, **analyze_board(parse_board(text), selection, scan)}
+        except ValueError as e:
+            result = {"line": number, "error": str(e)}
+        stats.add(result)
+        out.append(json.dumps(result, separators=(",", ":")))
+    out.append("")
+    return "\n".join(out), stats
+
+
+def read_chunks(stream, chunk_size):
+    """Numbered board lines from ``stream``, ``chunk_size`` at a time; blanks and comments skipped."""
+    chunk = []
+    for number, text in enumerate(stream, 1):
+        text = text.strip()
+        if not text or text.startswith("#"):
+            continue
+        chunk.append((number, text))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_stream(stream, output, workers=1, chunk_size=CHUNK_SIZE, selection=DEFAULT_SELECTION,
+                   scan=DEFAULT_SCAN_MODE):
+    """Analyze every board on ``stream``, writing reports to ``output``; returns the ``BoardStats``."""
+    total = BoardStats()
+    tasks = ((chunk, selection, scan) for chunk in read_chunks(stream, chunk_size))
+    if workers <= 1:
+        for task in tasks:
+            text, stats = analyze_chunk(task)
+            output.write(text)
+            total.merge(stats)
+        return total
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                text, stats = pending.popleft().get()
+                output.write(text)
+                total.merge(stats)
+            pending.append(pool.apply_async(analyze_chunk, (task,)))
+        while pending:
+            text, stats = pending.popleft().get()
+            output.write(text)
+            total.merge(stats)
+    return total
+
+
+def command_analyze(args):
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.perf_counter()
+    try:
+        stats = analyze_stream(stream, output, args.workers, args.chunk_size, args.selection, args.scan)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if output is not sys.stdout:
+            output.close()
+    duration = time.perf_counter() - start
+    print(stats.report(), file=sys.stderr)
+    print(f"Analyzed in {duration:.2f}s ({(stats.boards + stats.errors) / max(duration, 1e-9):.0f} boards/s, "
+          f"{args.workers} workers)", file=sys.stderr)
+    return 0
+
+
+def command_generate(args):
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for seed in range(args.seed, args.seed + args.count):
+            engine = GameEngine(seed=seed, clock=ManualClock(), grid_size=args.grid_size, scan=args.scan)
+            output.write(" ".join("".join(row) for row in engine.grid) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word Crush board analysis")
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze = commands.add_parser("analyze", help="report on every board in a file or stdin")
+    analyze.add_argument("input", nargs="?", default="-", help="boards, one per line ('-' for stdin)")
+    analyze.add_argument("--output", default="-", help="JSON lines report ('-' for stdout)")
+    analyze.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    analyze.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="board lines per pool task")
+    analyze.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                         help="rule for choosing between overlapping words")
+    analyze.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                         help="game mode: directions words are read in")
+    generate = commands.add_parser("generate", help="write the starting boards of seeded games")
+    generate.add_argument("--count", type=int, default=1000)
+    generate.add_argument("--seed", type=int, default=0, help="seed of the first board")
+    generate.add_argument("--grid-size", type=int, default=GRID_SIZE)
+    generate.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE)
+    generate.add_argument("--output", default="-", help="board file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "analyze":
+        return command_analyze(args)
+    return command_generate(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
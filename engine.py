@@ -0,0 +1,1206 @@
+"""Headless game engine for Word Crush.
+
+All game rules live here: letter generation, word detection, scoring,
+cascades and the move/hint/timer accounting. The engine has no pygame
+dependency so the same rules drive the pygame frontend, replays and
+headless simulations.
+"""
+import copy
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, OrderedDict
+
+from anagram_index import AnagramIndex
+from lexicon import DEFAULT_PATH, open_lexicon
+from pattern_index import PatternIndex, WILDCARD
+from sampler import get_sampler
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES, get_segment_table
+from selection import SELECTION_RULES
+from undo import MoveDiff
+
+# Game rules
+GRID_SIZE = 6
+TOTAL_MOVES = 10  # Set initial move count
+TIMER_START = 180  # 3 minutes in seconds
+MAX_HINTS = 3
+
+LETTER_SCORES = {
+    "A": 1, "B": 3, "C": 3, "D": 2, "E": 1, "F": 4, "G": 2, "H": 4, "I": 1,
+    "J": 8, "K": 5, "L": 1, "M": 3, "N": 1, "O": 1, "P": 3, "Q": 10, "R": 1,
+    "S": 1, "T": 1, "U": 1, "V": 4, "W": 4, "X": 8, "Y": 4, "Z": 10
+}
+
+LETTER_DISTRIBUTION = {
+    'A': 6, 'B': 3, 'C': 3, 'D': 4, 'E': 8, 'F': 3, 'G': 3, 'H': 3, 'I': 6,
+    'J': 2, 'K': 2, 'L': 4, 'M': 3, 'N': 4, 'O': 5, 'P': 3, 'Q': 2, 'R': 4,
+    'S': 4, 'T': 4, 'U': 3, 'V': 3, 'W': 3, 'X': 2, 'Y': 3, 'Z': 2
+}
+
+# Letter groups for grid generation strategy
+LETTER_GROUPS = {
+    'VOWELS': ['A', 'E', 'I', 'O', 'U', 'Y'],
+    'COMMON_CONSONANTS': ['R', 'S', 'T', 'N', 'L'],
+    'RARE_CONSONANTS': ['Q', 'X', 'Z', 'J', 'K'],
+    'SUFFIX_LETTERS': ['S', 'D', 'R']
+}
+
+# Common English letter pairs to avoid generating too many valid words
+COMMON_BIGRAMS = {
+    'TH', 'HE', 'IN', 'ER', 'AN', 'RE', 'ND', 'ON', 'EN', 'AT',
+    'ES', 'OR', 'AR', 'AL', 'TE', 'CO', 'DE', 'TO', 'RA', 'ET'
+}
+
+LETTER_POOL = []
+for letter, count in LETTER_DISTRIBUTION.items():
+    LETTER_POOL.extend([letter] * count)
+
+# Chance that get_new_letter forces a vowel (reduced from 40%)
+VOWEL_CHANCE = 0.3
+
+# Tuned letter parameters written by tuner.py, keyed by grid size
+LETTER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "letter_config.json")
+
+# Longest words kept in the wildcard index; longer slots are checked letter by letter
+PATTERN_INDEX_MAX_LENGTH = 8
+# Redraws allowed per cell when a new letter would complete a word during generation
+MAX_LETTER_REDRAWS = 5
+# Distinct row/column strings remembered by the line match cache
+LINE_CACHE_SIZE = 65536
+# Rule for picking which overlapping words pop (see ``selection``)
+DEFAULT_SELECTION = "greedy"
+# Shuffles (then fresh grids) tried when a board has no scoring swap left
+MAX_RESHUFFLES = 20
+
+# Compiled dictionary shared by all processes (see ``lexicon``); empty to disable
+LEXICON_PATH = os.environ.get("WORDCRUSH_LEXICON", DEFAULT_PATH)
+
+# Minimal dictionary used when NLTK is not installed
+FALLBACK_WORDS = frozenset({
+    "CAT", "DOG", "PIG", "BAT", "HAT", "RUN", "SIT", "FLY", "BIG",
+    "RED", "MAP", "PIN", "CUP", "BOX", "CAR", "BUS", "SUN", "AIR",
+    "SEA", "TOP", "LOW", "HOT", "ICE", "ONE", "TWO", "EAT", "TEN"})
+
+
+def load_source_words():
+    """Valid English words from the NLTK corpus, or a mini-dictionary without NLTK."""
+    try:
+        import nltk
+        from nltk.corpus import words
+
+        # Download words corpus if not already present
+        try:
+            nltk.data.find('corpora/words')
+        except LookupError:
+            nltk.download('words', quiet=True)
+
+        # Get all words and convert to uppercase for case-insensitive matching
+        source = {word.upper() for word in words.words() if len(word) >= 3}
+        print(f"Loaded {len(source)} words from NLTK corpus", file=sys.stderr)
+        return source
+    except ImportError:
+        print("NLTK not installed, using fallback dictionary", file=sys.stderr)
+        return set(FALLBACK_WORDS)
+
+
+def word_source_digest():
+    """Digest naming the source ``load_source_words`` reads, without reading it.
+
+    Covers the NLTK words corpus files (names, sizes and modification
+    times), or the fallback dictionary without NLTK, so a compiled
+    lexicon can tell that it is stale.
+    """
+    try:
+        import nltk
+    except ImportError:
+        source = "fallback\n" + "\n".join(sorted(FALLBACK_WORDS))
+    else:
+        try:
+            path = nltk.data.find('corpora/words').path
+        except LookupError:
+            path = None  # Not downloaded yet: no lexicon built from it can match
+        source = f"nltk {nltk.__version__} {path}\n"
+        if path is not None and os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                stat = os.stat(os.path.join(path, name))
+                source += f"{name} {stat.st_size} {stat.st_mtime_ns}\n"
+        elif path is not None:
+            stat = os.stat(path)
+            source += f"{stat.st_size} {stat.st_mtime_ns}\n"
+    return hashlib.sha256(source.encode()).digest()[:8]
+
+
+def load_lexicon(path):
+    """The compiled lexicon at ``path`` if it matches the word source, else None."""
+    try:
+        mapped = open_lexicon(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not map lexicon {path} ({e}), loading words from source", file=sys.stderr)
+        return None
+    if mapped is not None and mapped.source != word_source_digest():
+        print(f"Lexicon {path} was built from another word source, loading words from source "
+              f"(rebuild it with: python lexicon.py build)", file=sys.stderr)
+        return None
+    return mapped
+
+
+# Map the compiled lexicon if there is one: its pages are shared between
+# processes instead of every worker building its own set and indexes
+lexicon = load_lexicon(LEXICON_PATH) if LEXICON_PATH else None
+if lexicon is not None:
+    word_list = lexicon.words
+    print(f"Mapped {len(word_list)} words from {LEXICON_PATH}", file=sys.stderr)
+else:
+    word_list = load_source_words()
+
+
+def check_word(word):
+    """Checks if a string is a valid word in our dictionary."""
+    return word in word_list and len(word) >= 3
+
+
+def default_letter_config():
+    """The hand-tuned letter generation parameters."""
+    return {
+        "letter_distribution": dict(LETTER_DISTRIBUTION),
+        "common_bigrams": sorted(COMMON_BIGRAMS),
+        "vowel_chance": VOWEL_CHANCE,
+        "rare_consonants": list(LETTER_GROUPS['RARE_CONSONANTS']),
+    }
+
+
+_letter_configs = {}  # (grid_size, path) -> loaded config
+
+
+def load_letter_config(grid_size=GRID_SIZE, path=LETTER_CONFIG_PATH):
+    """Letter parameters for ``grid_size``: tuned values from ``path`` if present, else the defaults."""
+    key = (grid_size, path)
+    if key not in _letter_configs:
+        config = default_letter_config()
+        try:
+            with open(path) as f:
+                tuned = json.load(f).get(str(grid_size), {})
+            config.update({name: value for name, value in tuned.items() if name in config})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not load letter config from {path} ({e}), using defaults", file=sys.stderr)
+        _letter_configs[key] = config
+    return _letter_configs[key]
+
+
+def save_letter_config(config, grid_size=GRID_SIZE, path=LETTER_CONFIG_PATH):
+    """Store tuned parameters for ``grid_size`` in ``path``, keeping other grid sizes."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data[str(grid_size)] = config
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    _letter_configs.pop((grid_size, path), None)
+
+
+def calculate_word_score(word):
+    # Cache common word scores
+    if not hasattr(calculate_word_score, 'score_cache'):
+        calculate_word_score.score_cache = {}
+
+    if word in calculate_word_score.score_cache:
+        return calculate_word_score.score_cache[word]
+
+    score = sum(LETTER_SCORES[letter] for letter in word)
+    calculate_word_score.score_cache[word] = score
+    return score
+
+
+_pattern_indexes = {}  # max word length -> PatternIndex
+
+
+def get_pattern_index(max_length):
+    """Shared wildcard index over ``word_list`` for words up to ``max_length`` letters.
+
+    The mapped lexicon's index covers every length up to the one it was
+    built with; lines shorter than that never query the longer patterns.
+    """
+    if lexicon is not None and max_length <= lexicon.max_length:
+        return lexicon.patterns
+    index = _pattern_indexes.get(max_length)
+    if index is None:
+        index = _pattern_indexes[max_length] = PatternIndex(word_list, max_length, LETTER_SCORES)
+    return index
+
+
+_anagram_indexes = {}  # max word length -> AnagramIndex
+
+
+def get_anagram_index(max_length):
+    """Shared anagram index over ``word_list`` for words up to ``max_length`` letters.
+
+    Built on first use, so sessions that never ask pay nothing for it;
+    with a mapped lexicon, lengths it covers walk its anagram table instead.
+    """
+    index = _anagram_indexes.get(max_length)
+    if index is None:
+        if lexicon is not None and max_length <= lexicon.max_length:
+            index = lexicon.anagram_index(max_length, LETTER_SCORES)
+        else:
+            index = AnagramIndex(word_list, max_length, LETTER_SCORES)
+        _anagram_indexes[max_length] = index
+    return index
+
+
+class LineMatchCache:
+    """Bounded LRU cache from a row or column string to the words in it.
+
+    Each entry is a tuple of (word, start, end) in scan order (start, then
+    end, ascending). Lines repeat a lot across hint searches, cascade steps
+    and simulated games, so most lookups skip the substring scan. Call
+    ``clear()`` if ``word_list`` changes.
+    """
+
+    def __init__(self, maxsize=LINE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, line):
+        matches = self.entries.get(line)
+        if matches is not None:
+            self.hits += 1
+            self.entries.move_to_end(line)
+            return matches
+
+        self.misses += 1
+        matches = self.compute(line)
+        self.entries[line] = matches
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return matches
+
+    def compute(self, line):
+        n = len(line)
+        return tuple((line[start:end+1], start, end)
+                     for start in range(n - 2)  # Minimum 3-letter word
+                     for end in range(start + 2, n)
+                     if check_word(line[start:end+1]))
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries),
+                "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class LineSwaps:
+    """What a swap could score in one row or column string, worked out on demand.
+
+    ``slot(i)`` is the frozenset of letters that, placed at position ``i``,
+    complete a word running through it, which answers swaps coming in from
+    across the line. ``swap(i)`` says whether swapping positions ``i`` and
+    ``i + 1`` forms a word along the line. ``slot_words(i)`` lists those
+    words for the hint search. All are computed on first use and kept, so
+    an early exit never pays for the rest of the line.
+    """
+
+    __slots__ = ("line", "slots", "swaps", "words")
+
+    def __init__(self, line):
+        self.line = line
+        self.slots = [None] * len(line)
+        self.swaps = [None] * (len(line) - 1)
+        self.words = [None] * len(line)
+
+    def slot(self, i):
+        letters = self.slots[i]
+        if letters is None:
+            line = self.line
+            n = len(line)
+            patterns = get_pattern_index(min(n, PATTERN_INDEX_MAX_LENGTH))
+            max_length = patterns.max_length
+            found = []
+            for start in range(i + 1):
+                left = line[start:i] + WILDCARD
+                # Windows short enough for the index, skipped outright when
+                # no word starts with these letters and then the slot
+                if len(left) <= max_length and patterns.has_head(left):
+                    for end in range(max(i, start + 2), min(n, start + max_length)):
+                        completions = patterns.completions(left + line[i+1:end+1])
+                        if completions:
+                            found.append(completions)
+                # Longer windows are checked letter by letter
+                for end in range(max(i, start + 2, start + max_length), n):
+                    pattern = left + line[i+1:end+1]
+                    found.append([letter for letter in LETTER_SCORES
+                                  if check_word(pattern.replace(WILDCARD, letter))])
+            letters = self.slots[i] = frozenset().union(*found)
+        return letters
+
+    def swap(self, i):
+        scores = self.swaps[i]
+        if scores is None:
+            line = self.line
+            n = len(line)
+            swapped = line[:i] + line[i+1] + line[i] + line[i+2:]
+            # Only words that cover position i or i + 1 changed
+            scores = self.swaps[i] = any(check_word(swapped[start:end+1])
+                                         for start in range(i + 2)
+                                         for end in range(max(i, start + 2), n))
+        return scores
+
+    def slot_words(self, i, completions):
+        """{letter: [(start, end, word), ...]} for words through position ``i``.
+
+        ``completions(pattern)`` gives the letters that fill the one
+        wildcard in ``pattern`` to make a word (see
+        ``GameEngine.slot_completions``).
+        """
+        words = self.words[i]
+        if words is None:
+            line = self.line
+            words = self.words[i] = {}
+            for start in range(i + 1):
+                for end in range(max(i, start + 2), len(line)):
+                    pattern = line[start:i] + WILDCARD + line[i+1:end+1]
+                    for letter in completions(pattern):
+                        words.setdefault(letter, []).append((start, end, pattern.replace(WILDCARD, letter)))
+        return words
+
+
+class LineSwapCache(LineMatchCache):
+    """Bounded LRU cache from a row or column string to its ``LineSwaps``.
+
+    The dead-board check and the hint search need nothing else, so a board
+    costs one lookup per line and a move only misses on the lines it
+    changed.
+    """
+
+    def compute(self, line):
+        return LineSwaps(line)
+
+
+# Shared by every engine in the process
+line_matches = LineMatchCache()
+line_swaps = LineSwapCache()
+
+
+class ManualClock:
+    """A clock that only moves when told to, for headless and replayed sessions."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def set(self, now):
+        self.now = now
+
+
+class GameEngine:
+    """State and rules of a single Word Crush session.
+
+    ``seed`` makes letter generation reproducible and ``clock`` replaces
+    ``time.time`` for the game timer. If ``recorder`` is given, every move
+    and hint press is appended to it (see ``replay.ReplayLog``).
+    ``letter_config`` overrides the letter generation parameters, which
+    otherwise come from ``load_letter_config``. ``selection`` names the
+    rule in ``selection.SELECTION_RULES`` that picks which overlapping
+    words pop. ``grid`` starts the session from an existing board instead
+    of generating one. ``hint_search(engine, count)`` replaces
+    ``find_best_swaps`` for hints and recommendations. ``scan`` names the
+    game mode in ``segments.SCAN_MODES`` that sets the directions words
+    are read in.
+
+    Objects in ``observers`` are told about every state change as it
+    happens (see ``notify``); ``stream.StreamEncoder`` turns these into
+    deltas for spectators. ``history`` (e.g. ``undo.UndoStack``) and
+    ``recorder`` are handed a ``undo.MoveDiff`` of every move with
+    ``record_move``.
+    """
+
+    def __init__(self, seed=None, clock=None, grid_size=GRID_SIZE,
+                 total_moves=TOTAL_MOVES, time_limit=TIMER_START,
+                 recorder=None, verbose=False, letter_config=None,
+                 selection=DEFAULT_SELECTION, grid=None, hint_search=None, scan=DEFAULT_SCAN_MODE):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.clock = clock or time.time
+        self.grid_size = grid_size
+        self.time_limit = time_limit
+        self.recorder = recorder
+        self.verbose = verbose
+        if selection not in SELECTION_RULES:
+            raise ValueError(f"Unknown selection rule {selection!r}")
+        self.selection = selection
+        self.select_words = SELECTION_RULES[selection]
+        self.hint_search = hint_search
+        if scan not in SCAN_MODES:
+            raise ValueError(f"Unknown scan mode {scan!r}")
+        self.scan = scan
+        self.observers = []
+        self.history = None
+        self.move_diff = None  # Diff of the move being played, while one is captured
+
+        # Letter generation parameters
+        if letter_config is None:
+            letter_config = load_letter_config(grid_size)
+        self.letter_config = letter_config
+        self.sampler = get_sampler(letter_config, LETTER_GROUPS['VOWELS'])
+        self.patterns = get_pattern_index(min(grid_size, PATTERN_INDEX_MAX_LENGTH))
+
+        # Words found in each line at the last scan; lines holding a dirty
+        # cell (bitmask, see ``segments``) are rescanned on demand
+        self.segments = get_segment_table(grid_size, scan)
+        self.line_words = [()] * len(self.segments.lines)
+
+        self.moves_left = total_moves
+        self.score = 0
+        self.hints_used = 0
+        self.reshuffles = 0  # Dead boards replaced so far
+        self.generation_attempts = 0  # Grids tried by the last generate_grid_without_words
+        self.generation_fallback = False  # True if it gave up and patched a grid instead
+        self.dirty = self.segments.full_mask
+        if grid is None:
+            self.grid = self.generate_grid_without_words()
+            self.ensure_playable()
+        else:
+            self.grid = [list(row) for row in grid]
+
+        # Timer pausing variables
+        self.start_time = self.clock()
+        self.paused_time = 0  # Total time paused
+        self.is_paused = False  # Is timer currently paused
+        self.pause_start_time = 0  # When the current pause began
+
+    def copy(self, rng=None):
+        """Return an independent copy of this session, including the RNG state.
+
+        Used by search and simulation code to try moves without touching
+        the real game. The copy shares the clock but not the recorder.
+        Passing ``rng`` gives the copy that generator instead of a copy of
+        this session's, which saves copying the state when the caller
+        reseeds it anyway.
+        """
+        clone = copy.copy(self)
+        clone.grid = [row[:] for row in self.grid]
+        clone.line_words = list(self.line_words)
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        clone.rng = rng
+        clone.recorder = None
+        clone.history = None
+        clone.observers = []
+        return clone
+
+    def notify(self, event, *args):
+        """Call ``event(engine, *args)`` on every observer.
+
+        Events: ``on_swap(pos1, pos2)``, ``on_words(words)`` with (word,
+        cell bitmask) pairs as they are scored, ``on_cells()`` after tiles
+        drop or are reshuffled, ``on_timer()`` when the timer pauses or
+        resumes, ``on_hint(swaps)``, ``on_settled()`` once a move,
+        cascade included, is fully resolved and ``on_restore()`` when a
+        move is undone or redone. Nothing is sent while a search move
+        plays out (see ``try_move``).
+        """
+        if self.in_search():
+            return
+        for observer in self.observers:
+            getattr(observer, event)(self, *args)
+
+    def in_search(self):
+        """True while a move played by ``try_move`` is resolving."""
+        return self.move_diff is not None and self.move_diff.rng_state is not None
+
+    def get_new_letter(self, adjacent_letters=None):
+        """Get a new letter based on strategic distribution to minimize word formation.
+
+        Next to two or more vowels a consonant is drawn, next to a common
+        bigram a rare consonant, and otherwise a vowel is forced with
+        ``vowel_chance`` before falling back to the letter pool. The
+        distributions are precomputed alias tables (see ``sampler``).
+        """
+        return self.sampler.sample(self.rng, adjacent_letters)
+
+    def slot_completions(self, pattern):
+        """Letters that turn ``pattern`` (one ``?`` slot) into a word, with that word's score."""
+        if len(pattern) <= self.patterns.max_length:
+            return self.patterns.completions(pattern)
+        completions = {}
+        for letter in LETTER_SCORES:
+            word = pattern.replace(WILDCARD, letter)
+            if check_word(word):
+                completions[letter] = calculate_word_score(word)
+        return completions
+
+    def line_text(self, line, grid=None):
+        """The letters of ``line`` (an id in ``segments``) in reading order."""
+        grid = self.grid if grid is None else grid
+        return ''.join([grid[r][c] for r, c in self.segments.line_positions[line]])
+
+    def forbidden_letters(self, new_grid, r, c):
+        """Letters that would complete a word at (r, c) of a grid filled row by row.
+
+        Along a line read in filling order the word ends at (r, c); along a
+        reversed one it starts there, the rest of it already placed.
+        """
+        forbidden = set()
+        segments = self.segments
+        for line, index in segments.cell_lines[r * self.grid_size + c]:
+            positions = segments.line_positions[line]
+            if positions[0] < positions[-1]:
+                placed = ''.join([new_grid[i][j] for i, j in positions[:index]])
+                for start in range(index - 1):  # Minimum 3-letter word
+                    forbidden.update(self.slot_completions(placed[start:] + WILDCARD))
+            else:
+                placed = ''.join([new_grid[i][j] for i, j in positions[index + 1:]])
+                for end in range(2, len(placed) + 1):
+                    forbidden.update(self.slot_completions(WILDCARD + placed[:end]))
+        return forbidden
+
+    def grid_has_words(self, new_grid):
+        """Return True if any line of ``new_grid`` contains a word."""
+        return any(line_matches.get(self.line_text(line, new_grid))
+                   for line in range(len(self.segments.lines)))
+
+    def generate_grid_without_words(self):
+        """Generate a grid with no valid words already formed."""
+        size = self.grid_size
+        rng = self.rng
+        attempts = 0
+        max_attempts = 100  # Prevent infinite loop
+
+        while attempts < max_attempts:
+            attempts += 1
+
+            # Create initial random grid with smarter letter placement
+            new_grid = [[None for _ in range(size)] for _ in range(size)]
+            clean = True  # No placed letter has completed a word so far
+
+            # Fill grid with strategic letter placement
+            for r in range(size):
+                for c in range(size):
+                    # Get adjacent letters (that are already placed)
+                    adjacent_letters = set()  # Using set for faster lookups
+                    # Check left
+                    if c > 0 and new_grid[r][c-1]:
+                        adjacent_letters.add(new_grid[r][c-1])
+                    # Check above
+                    if r > 0 and new_grid[r-1][c]:
+                        adjacent_letters.add(new_grid[r-1][c])
+                    # Check diagonals if needed
+                    if r > 0 and c > 0 and new_grid[r-1][c-1]:
+                        adjacent_letters.add(new_grid[r-1][c-1])
+
+                    # Get a new letter considering adjacent letters
+                    # (sorted so the draw does not depend on set ordering)
+                    adjacent_letters = sorted(adjacent_letters)
+                    letter = self.get_new_letter(adjacent_letters)
+
+                    # Redraw letters that would finish a word along any line
+                    forbidden = self.forbidden_letters(new_grid, r, c)
+                    redraws = 0
+                    while letter in forbidden and redraws < MAX_LETTER_REDRAWS:
+                        letter = self.get_new_letter(adjacent_letters)
+                        redraws += 1
+                    if letter in forbidden:
+                        clean = False
+                    new_grid[r][c] = letter
+
+            # If no valid words were found, use this grid
+            if clean or not self.grid_has_words(new_grid):
+                self.generation_attempts = attempts
+                self.generation_fallback = False
+                if self.verbose:
+                    print(f"Found grid with no words after {attempts} attempts")
+                return new_grid
+
+        # If we can't find a grid without words after max attempts,
+        # create a grid with minimal valid words by replacing problematic letters
+        self.generation_attempts = attempts
+        self.generation_fallback = True
+        if self.verbose:
+            print(f"Could not find grid with no words after {max_attempts} attempts")
+            print("Creating grid with manual fixes...")
+
+        # Create an initial grid
+        letters = self.sampler.sample_many(rng, size * size)
+        fallback_grid = [letters[r * size:(r + 1) * size] for r in range(size)]
+
+        # Replace tiles that form words with less common letters (Q, Z, X)
+        uncommon = ['Q', 'Z', 'X', 'J', 'K']
+
+        # Check and fix every line, rows first, then columns
+        for line, positions in enumerate(self.segments.line_positions):
+            line_str = self.line_text(line, fallback_grid)
+            for start in range(len(line_str) - 2):
+                for end in range(start + 2, len(line_str)):
+                    word = line_str[start:end+1]
+                    if check_word(word):
+                        # Replace middle letter with uncommon letter
+                        r, c = positions[start + (end - start) // 2]
+                        fallback_grid[r][c] = rng.choice(uncommon)
+
+        return fallback_grid
+
+    # ------------------------------------------------------------------
+    # Timer
+    # ------------------------------------------------------------------
+
+    def pause_timer(self):
+        """Pause the game timer (used while a chain reaction resolves)."""
+        if not self.is_paused:
+            self.is_paused = True
+            self.pause_start_time = self.clock()
+            if self.observers:
+                self.notify("on_timer")
+
+    def resume_timer(self):
+        """Resume the game timer and bank the time spent paused."""
+        if self.is_paused:
+            # Calculate how long we were paused and add to total paused time
+            self.paused_time += self.clock() - self.pause_start_time
+            self.is_paused = False
+            if self.observers:
+                self.notify("on_timer")
+
+    def elapsed_time(self):
+        """Seconds of play so far, not counting paused time."""
+        if self.is_paused:
+            current_pause_duration = self.clock() - self.pause_start_time
+            total_paused = self.paused_time + current_pause_duration
+        else:
+            total_paused = self.paused_time
+        return self.clock() - self.start_time - total_paused
+
+    def remaining_time(self):
+        """Whole seconds left on the game timer."""
+        return max(0, self.time_limit - int(self.elapsed_time()))
+
+    def next_tick(self):
+        """Seconds until ``remaining_time`` next changes, or None while the timer is paused."""
+        if self.is_paused:
+            return None
+        return 1 - self.elapsed_time() % 1
+
+    def is_time_over(self):
+        return int(self.elapsed_time()) >= self.time_limit
+
+    def is_game_over(self):
+        return self.moves_left <= 0 or self.is_time_over()
+
+    # ------------------------------------------------------------------
+    # Word detection and scoring
+    # ------------------------------------------------------------------
+
+    def mark_dirty(self, mask):
+        """Flag the cells in ``mask`` as changed so their lines are rescanned.
+
+        Engine methods do this themselves; code that writes to ``grid``
+        directly must call it for the cells it changed.
+        """
+        self.dirty |= mask
+
+    def scan_lines(self):
+        """Rescan the lines holding dirty cells and return the words of every line."""
+        dirty = self.dirty
+        if dirty:
+            grid = self.grid
+            line_positions = self.segments.line_positions
+            line_words = self.line_words
+            for line in self.segments.dirty_lines(dirty):
+                line_words[line] = line_matches.get(''.join([grid[r][c] for r, c in line_positions[line]]))
+            self.dirty = 0
+        return self.line_words
+
+    def find_all_word_masks(self):
+        """Every word on the board as (word, cell bitmask), overlapping ones included."""
+        segments = self.segments.segments
+        all_words = []
+        # In line order: rows first, then columns, then any other directions
+        for line, matches in enumerate(self.scan_lines()):
+            if matches:
+                line_segments = segments[line]
+                for word, start, end in matches:
+                    all_words.append((word, line_segments[start][end]))
+        return all_words
+
+    def find_word_masks(self):
+        """Words to pop as (word, cell bitmask), chosen by the selection rule so no cells are shared."""
+        # Filter out overlapping words
+        return self.select_words(self.find_all_word_masks(), calculate_word_score)
+
+    def get_words_and_positions(self):
+        """Check for valid words in every scanned line, returns words with their positions."""
+        segments = self.segments
+        grid = self.grid
+        return [(word, segments.reading_positions(mask, word, grid)) for word, mask in self.find_word_masks()]
+
+    def calculate_grid_total_score(self):
+        """Process all valid words, calculate total score, and return it (without animations or drops)."""
+        total_score = 0
+        for word, _ in self.find_word_masks():
+            total_score += calculate_word_score(word)
+        return total_score
+
+    def simulate_swap_and_evaluate(self, pos1, pos2):
+        """Simulate swap directly on the real grid and calculate score gain, then restore grid."""
+        grid = self.grid
+        r1, c1 = pos1
+        r2, c2 = pos2
+
+        swapped = self.segments.cell_mask(pos1) | self.segments.cell_mask(pos2)
+
+        # Swap directly
+        grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+        self.dirty |= swapped
+
+        temp_score = self.calculate_grid_total_score()
+
+        # Undo the swap back to original grid (restoring the grid)
+        grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+        self.dirty |= swapped
+
+        return temp_score
+
+    def slot_words(self, line, i, slot_cache):
+        """Words through cell ``i`` of ``line`` for each letter placed there.
+
+        Returns {letter: [(start, end, word), ...]} in scan order (start,
+        then end). Every word through the cell is kept, since the selection
+        rule may prefer a shorter one to the longest. Only the other cells
+        of the line are read, so the result is reused for every swap that
+        moves a letter into the cell from across the line. It depends only
+        on the line's letters, so it is kept with the line string in
+        ``line_swaps`` and shared across boards.
+        """
+        key = (line, i)
+        words = slot_cache.get(key)
+        if words is None:
+            words = slot_cache[key] = line_swaps.get(self.line_text(line)).slot_words(i, self.slot_completions)
+        return words
+
+    def evaluate_swap_on_settled_board(self, pos1, pos2, slot_cache):
+        """Score a swap on a board with no words, touching only the lines it changes.
+
+        Gives the same result as ``simulate_swap_and_evaluate``: on a settled
+        board every word after the swap runs through one of the two cells,
+        so only the lines they share (scanned directly) and the lines
+        crossing each of them (looked up in the pattern index) can score.
+        """
+        grid = self.grid
+        (r1, c1), (r2, c2) = pos1, pos2
+        letter1, letter2 = grid[r1][c1], grid[r2][c2]
+        size = self.grid_size
+        segments = self.segments
+        shared, crossing1, crossing2 = segments.swap_lines[r1 * size + c1, r2 * size + c2]
+
+        candidates = []  # (line, word, mask)
+        for line, i in shared:
+            # The shared line after the swap; only words covering the swapped cells are new
+            text = self.line_text(line)
+            text = text[:i] + text[i+1] + text[i] + text[i+2:]
+            for word, start, end in line_matches.get(text):
+                if start <= i + 1 and end >= i:
+                    candidates.append((line, word, segments.segments[line][start][end]))
+        for crossing, letter in ((crossing1, letter2), (crossing2, letter1)):
+            for line, i in crossing:
+                for start, end, word in self.slot_words(line, i, slot_cache).get(letter, ()):
+                    candidates.append((line, word, segments.segments[line][start][end]))
+
+        # Same order as the full scan (by line), then apply the selection rule
+        candidates.sort(key=lambda candidate: candidate[0])
+        return sum(calculate_word_score(word)
+                   for word, _ in self.select_words([(word, mask) for _, word, mask in candidates],
+                                                    calculate_word_score))
+
+    def has_scoring_swap(self):
+        """Return True if some adjacent swap forms a word, stopping at the first one.
+
+        Everything needed is cached per line string (see ``LineSwapCache``):
+        a swap scores if it forms a word along a line the two cells share,
+        or if either letter completes a word along a line it moves into.
+        """
+        if self.find_word_masks():
+            return True
+        letters = [letter for row in self.grid for letter in row]
+        lines = [line_swaps.get(''.join([letters[i] for i in cells])) for cells in self.segments.lines]
+        for cell1, cell2, shared, crossing1, crossing2 in self.segments.swaps:
+            letter1, letter2 = letters[cell1], letters[cell2]
+            for line, i in crossing1:
+                if letter2 in lines[line].slot(i):
+                    return True
+            for line, i in crossing2:
+                if letter1 in lines[line].slot(i):
+                    return True
+            for line, i in shared:
+                if lines[line].swap(i):
+                    return True
+        return False
+
+    def is_dead_board(self):
+        """True if no adjacent swap can score."""
+        return not self.has_scoring_swap()
+
+    # ------------------------------------------------------------------
+    # Letter opportunities (see ``anagram_index``)
+    # ------------------------------------------------------------------
+
+    def region_words(self, positions):
+        """Words that could be spelled from the letters at ``positions``, in any order."""
+        letters = [self.grid[r][c] for r, c in positions if self.grid[r][c]]
+        return get_anagram_index(self.grid_size).words_in(letters)
+
+    def board_richness(self):
+        """How much a board has to offer: (words, best score) over its lines.
+
+        ``words`` counts, line by line, the distinct words that the line's
+        letters could spell if rearranged; ``best score`` is the best such
+        word anywhere. A rich board leaves many words a few swaps away.
+        """
+        words = 0
+        best = 0
+        for positions in self.segments.line_positions:
+            found = self.region_words(positions)
+            words += len(set(found))
+            for word in found:
+                best = max(best, calculate_word_score(word))
+        return words, best
+
+    def explain_swap(self, pos1, pos2):
+        """Why a swap is worth making: the lines it changes and the words their letters allow.
+
+        Returns (line name, letters after the swap, words spelled from
+        them) for every line through either swapped cell.
+        """
+        (r1, c1), (r2, c2) = pos1, pos2
+        grid = self.grid
+        size = self.grid_size
+        segments = self.segments
+        grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+        try:
+            lines = {line for cell in (r1 * size + c1, r2 * size + c2) for line, _ in segments.cell_lines[cell]}
+            explanation = []
+            for line in sorted(lines):
+                letters = self.line_text(line)
+                words = sorted(set(get_anagram_index(size).words_in(letters)),
+                               key=lambda word: (-calculate_word_score(word), word))
+                explanation.append((segments.line_names[line], letters, words))
+            return explanation
+        finally:
+            grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+
+    def find_best_swaps(self, count=3):
+        """Greedy Best-First Search: return the best swaps ranked by potential score gain."""
+        moves = []
+
+        if self.find_word_masks():
+            # Words already on the board count towards every swap; score by full rescan
+            def evaluate(pos1, pos2):
+                return self.simulate_swap_and_evaluate(pos1, pos2)
+        else:
+            slot_cache = {}
+
+            def evaluate(pos1, pos2):
+                return self.evaluate_swap_on_settled_board(pos1, pos2, slot_cache)
+
+        cell_positions = self.segments.cell_positions
+        for cell1, cell2, *_ in self.segments.swaps:
+            pos1, pos2 = cell_positions[cell1], cell_positions[cell2]
+            moves.append((evaluate(pos1, pos2), pos1, pos2))
+
+        moves.sort(reverse=True, key=lambda x: x[0])
+        return moves[:count]
+
+    def score_words(self, valid_words):
+        """Add the score of ``valid_words`` and return the set of positions to pop."""
+        all_positions = set()
+        for word, positions in valid_words:
+            self.score += calculate_word_score(word)
+            # Only add positions of tiles that form valid words
+            all_positions.update(positions)
+        if self.observers:
+            self.notify("on_words", [(word, self.segments.positions_mask(positions))
+                                     for word, positions in valid_words])
+        return all_positions
+
+    def score_word_masks(self, valid_words):
+        """Add the score of (word, mask) pairs and return the bitmask of cells to pop."""
+        popped = 0
+        for word, mask in valid_words:
+            self.score += calculate_word_score(word)
+            popped |= mask
+        if self.observers:
+            self.notify("on_words", valid_words)
+        return popped
+
+    # ------------------------------------------------------------------
+    # Board mutation
+    # ------------------------------------------------------------------
+
+    def pop_tiles(self, positions):
+        """Remove popped tiles from the grid."""
+        self.pop_mask(self.segments.positions_mask(positions))
+
+    def pop_mask(self, mask):
+        """Remove the tiles whose cells are set in ``mask``."""
+        grid = self.grid
+        size = self.grid_size
+        for i in self.segments.mask_cells(mask):
+            grid[i // size][i % size] = None
+        self.dirty |= mask
+        if self.move_diff is not None:
+            self.move_diff.popped |= mask
+
+    def write_cells(self, mask, letters):
+        """Put ``letters`` into the cells set in ``mask``, lowest cell first."""
+        grid = self.grid
+        size = self.grid_size
+        for i, letter in zip(self.segments.mask_cells(mask), letters):
+            grid[i // size][i % size] = letter
+        self.dirty |= mask
+
+    def drop_column(self, col):
+        """Shift tiles in ``col`` down over empty cells and refill from the top.
+
+        Returns the number of new tiles added to the column.
+        """
+        grid = self.grid
+        size = self.grid_size
+        # Count how many empty spaces in this column
+        empty_spaces = [row for row in range(size) if grid[row][col] is None]
+
+        for empty_row in empty_spaces:
+            # Move all tiles above this empty space down
+            for row in range(empty_row, 0, -1):
+                grid[row][col] = grid[row-1][col]
+
+            # Add new letter at the top using our smart algorithm
+            # Get adjacent letters to consider when placing the new one
+            adjacent_letters = []
+            # Check left and right neighbors for the top row
+            if col > 0 and grid[0][col-1]:
+                adjacent_letters.append(grid[0][col-1])
+            if col < size - 1 and grid[0][col+1]:
+                adjacent_letters.append(grid[0][col+1])
+            # Check the tile below if it exists
+            if size > 1 and grid[1][col]:
+                adjacent_letters.append(grid[1][col])
+
+            grid[0][col] = self.get_new_letter(adjacent_letters)
+
+        if empty_spaces:
+            # Every cell from the top down to the lowest gap has changed
+            self.dirty |= self.segments.segments[self.segments.column_line(col)][0][empty_spaces[-1]]
+            if self.observers:
+                self.notify("on_cells")
+        return len(empty_spaces)
+
+    def drop_new_tiles(self):
+        """Fill empty spaces in every column."""
+        for col in range(self.grid_size):
+            self.drop_column(col)
+
+    def plant_word(self, letters, word):
+        """Lay ``letters`` out on the grid with ``word`` one swap away.
+
+        ``word`` (spelled from ``letters``) goes along a random line with
+        two neighbouring letters swapped, and the rest of ``letters`` are
+        shuffled into the other cells. Returns True if the layout forms no
+        word yet; swapping the two letters back then forms ``word``.
+        """
+        pairs = [i for i in range(len(word) - 1) if word[i] != word[i + 1]]
+        lines = [cells for cells in self.segments.lines if len(cells) >= len(word)]
+        if not pairs or not lines:
+            return False
+        rng = self.rng
+        cells = rng.choice(lines)
+        start = rng.randrange(len(cells) - len(word) + 1)
+        i = rng.choice(pairs)
+        planted = list(word)
+        planted[i], planted[i + 1] = planted[i + 1], planted[i]
+        rest = Counter(letters)
+        rest.subtract(word)
+        rest = list(rest.elements())
+        rng.shuffle(rest)
+        board = [None] * len(letters)
+        for cell, letter in zip(cells[start:start + len(word)], planted):
+            board[cell] = letter
+        fill = iter(rest)
+        board = [letter if letter is not None else next(fill) for letter in board]
+        size = self.grid_size
+        self.grid = [board[r * size:(r + 1) * size] for r in range(size)]
+        self.dirty = self.segments.full_mask
+        return not self.find_word_masks()
+
+    def reshuffle(self):
+        """Rearrange a dead board so that at least one swap scores.
+
+        A word the board's letters can spell is planted one swap away (see
+        ``plant_word``), which needs no dead-board check. If the letters
+        spell no word or no layout works in ``MAX_RESHUFFLES`` tries, plain
+        shuffles are tried, keeping one only if it forms no word but has a
+        scoring swap, and then fresh grids; the last one is kept even if it
+        is dead too (only possible with a tiny dictionary).
+        """
+        size = self.grid_size
+        self.generation_attempts = 0
+        letters = [letter for row in self.grid for letter in row]
+        # Sorted, since the index lists words in the dictionary's set order, which varies by process
+        words = sorted(set(get_anagram_index(size).words_in(letters)))
+        if words:
+            for _ in range(MAX_RESHUFFLES):
+                if self.plant_word(letters, self.rng.choice(words)):
+                    return
+        for _ in range(MAX_RESHUFFLES):
+            self.rng.shuffle(letters)
+            self.grid = [letters[r * size:(r + 1) * size] for r in range(size)]
+            self.dirty = self.segments.full_mask
+            if not self.find_word_masks() and self.has_scoring_swap():
+                return
+        for _ in range(MAX_RESHUFFLES):
+            self.grid = self.generate_grid_without_words()
+            self.dirty = self.segments.full_mask
+            if self.has_scoring_swap():
+                return
+
+    def ensure_playable(self):
+        """Reshuffle the board if no swap can score. Returns True if it was reshuffled.
+
+        Called once every move has settled, so it also tells observers so.
+        """
+        reshuffled = not self.has_scoring_swap()
+        if reshuffled:
+            if self.verbose:
+                print("No scoring swap left, reshuffling the board")
+            self.reshuffle()
+            self.reshuffles += 1
+        diff = self.move_diff
+        if diff is not None:
+            self.move_diff = None
+            diff.finish(self, reshuffled)
+            # Exact diffs belong to a search (see ``try_move``) and are not kept
+            if diff.rng_state is not None:
+                return reshuffled
+            if self.history is not None:
+                self.history.record_move(diff)
+            if self.recorder is not None:
+                self.recorder.record_move(diff)
+        if self.observers:
+            if reshuffled:
+                self.notify("on_cells")
+            self.notify("on_settled")
+        return reshuffled
+
+    def swap_tiles(self, pos1, pos2):
+        """Swap two tiles and spend a move (no cascade resolution)."""
+        if self.recorder is not None and not self.in_search():
+            self.recorder.record_swap(self.elapsed_time(), pos1, pos2)
+        if self.move_diff is None and (self.history is not None or self.recorder is not None):
+            self.move_diff = MoveDiff.begin(self, pos1, pos2)
+        r1, c1 = pos1
+        r2, c2 = pos2
+        self.grid[r1][c1], self.grid[r2][c2] = self.grid[r2][c2], self.grid[r1][c1]
+        self.dirty |= self.segments.cell_mask(pos1) | self.segments.cell_mask(pos2)
+        self.moves_left -= 1  # Reduce move count
+        if self.observers:
+            self.notify("on_swap", pos1, pos2)
+
+    def resolve_cascades(self):
+        """Pop words, drop tiles and repeat until the board settles.
+
+        Returns the (word, cell bitmask) lists popped at each cascade step.
+        """
+        steps = []
+        valid_words = self.find_word_masks()
+        if valid_words:
+            # Chain reaction starts, pause the timer
+            self.pause_timer()
+        while valid_words:
+            steps.append(valid_words)
+            self.pop_mask(self.score_word_masks(valid_words))
+            self.drop_new_tiles()
+            valid_words = self.find_word_masks()
+        self.resume_timer()
+        return steps
+
+    def make_move(self, pos1, pos2):
+        """Headless move: swap adjacent tiles and resolve the resulting cascade.
+
+        Returns the cascade steps, or None if the move is not allowed. A
+        board left without any scoring swap is reshuffled.
+        """
+        if self.is_game_over():
+            return None
+        if abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1]) != 1:
+            return None
+        self.swap_tiles(pos1, pos2)
+        steps = self.resolve_cascades()
+        self.ensure_playable()
+        return steps
+
+    def try_move(self, pos1, pos2):
+        """Play a move for a search and return its exact diff, or None if it is not allowed.
+
+        ``revert_move`` on the diff restores the session exactly, RNG,
+        timer and reshuffle counters included, which is much cheaper than
+        playing on a ``copy``. The recorder and observers are not told
+        about the move or its reversal.
+        """
+        if self.is_game_over():
+            return None
+        if abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1]) != 1:
+            return None
+        diff = self.move_diff = MoveDiff.begin(self, pos1, pos2, exact=True)
+        self.make_move(pos1, pos2)
+        return diff
+
+    def revert_move(self, diff):
+        """Undo the move ``diff`` was taken from, which must be the last one played."""
+        diff.revert(self)
+        if self.observers and diff.rng_state is None:
+            self.notify("on_restore")
+
+    def apply_move(self, diff):
+        """Redo the move ``diff`` was taken from on the board it was reverted to."""
+        diff.apply(self)
+        if self.observers:
+            self.notify("on_restore")
+
+    def recommend_swaps(self, count=3):
+        """The ``count`` best swaps as (score, pos1, pos2), from ``hint_search`` if set."""
+        if self.hint_search is not None:
+            return self.hint_search(self, count)
+        return self.find_best_swaps(count)
+
+    def use_hint(self, count=3):
+        """Spend a hint and return the recommended swaps, or None if none are left."""
+        if self.hints_used >= MAX_HINTS:
+            return None
+        if self.recorder is not None:
+            self.recorder.record_hint(self.elapsed_time())
+        self.hints_used += 1
+        swaps = self.recommend_swaps(count)
+        if self.observers:
+            self.notify("on_hint", swaps)
+        return swaps
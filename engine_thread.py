@@ -0,0 +1,350 @@
+"""Run a game engine on its own thread and render it from board snapshots.
+
+``EngineThread`` owns the ``GameEngine``: swaps, cascades and hint
+searches all run on it. Input reaches it through a ``queue.SimpleQueue``
+and every state change comes back as a ``BoardSnapshot``, an immutable
+namedtuple appended to a deque. Deque appends and pops are atomic, and
+snapshots are never changed after publishing, so neither thread takes a
+lock to hand one over or to read one.
+
+``SnapshotPlayer`` runs on the render thread. It takes snapshots in the
+order they were published and gives each kind of change some time on
+screen (``TRANSITION_TIMES``), reporting how far along the current one
+is, so the renderer can ease between boards at a steady frame rate. A
+long cascade or a slow expected-value hint search no longer holds up
+frames, only the snapshots it produces.
+
+The game timer stops while a cascade plays, as it does when animations
+run on the game loop: the engine thread keeps it paused after a scoring
+move until the player reports that the move's last snapshot is on
+screen.
+
+Usage:
+    python wordcrush.py --threaded            # play with the engine on its own thread
+    python engine_thread.py --seed 42         # check threaded play against direct play
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from queue import SimpleQueue
+
+TRANSITION_TIMES = {  # Seconds a transition into a snapshot of this kind stays on screen
+    "swap": 0.15,
+    "words": 0.5,
+    "cells": 0.3,
+}
+
+BoardSnapshot = namedtuple("BoardSnapshot", [
+    "seq",          # Publishing order, from 1
+    "kind",         # start, swap, words, cells, timer, hint, settled or restore
+    "grid_size",
+    "letters",      # Row-major tuple of letters (None for an empty cell)
+    "score",
+    "moves_left",
+    "hints_used",
+    "time_limit",
+    "game_time",    # Engine elapsed time when published, in seconds
+    "paused",       # Timer paused
+    "swap",         # (pos1, pos2) for a swap snapshot, else None
+    "words",        # ((word, positions), ...) for a words snapshot, else ()
+    "hint_swaps",   # (score, pos1, pos2) of the hint shown, cleared by the next swap
+])
+
+
+class EngineThread:
+    """A ``GameEngine`` played on a thread of its own.
+
+    ``swap``, ``hint``, ``undo`` and ``redo`` queue input and return at
+    once; undo and redo need the engine's ``history``. ``after_input`` is
+    called with the engine on the engine thread after each input has been
+    applied (e.g. to checkpoint the session). ``wake`` is
+    called with no arguments whenever a snapshot is published, so a
+    renderer blocked on its event queue can be woken up.
+    """
+
+    def __init__(self, engine, after_input=None, wake=None):
+        self.engine = engine
+        self.after_input = after_input
+        self.wake = wake
+        self.inputs = SimpleQueue()
+        self.snapshots = deque()  # Published, not yet taken by the player
+        self.latest = None
+        self.seq = 0
+        self.hint_swaps = ()
+        self.pending_cells = False
+        self.awaiting = None  # Seq the player must show before the timer resumes
+        # Written by one thread each, so they need no lock
+        self.submitted = 0  # Inputs queued (render thread)
+        self.processed = 0  # Inputs applied (engine thread)
+        self.thread = threading.Thread(target=self.run, name="engine", daemon=True)
+        engine.observers.append(self)
+        self.publish("start")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    # ------------------------------------------------------------------
+    # Render thread side
+    # ------------------------------------------------------------------
+
+    def swap(self, pos1, pos2):
+        self.submitted += 1
+        self.inputs.put(("swap", pos1, pos2))
+
+    def hint(self):
+        self.submitted += 1
+        self.inputs.put(("hint",))
+
+    def undo(self):
+        self.submitted += 1
+        self.inputs.put(("undo",))
+
+    def redo(self):
+        self.submitted += 1
+        self.inputs.put(("redo",))
+
+    def shown(self, seq):
+        """Tell the engine that the snapshot ``seq`` and all before it are on screen."""
+        if self.awaiting is not None and seq >= self.awaiting:
+            self.inputs.put(("shown", seq))
+
+    def idle(self):
+        """True once every queued input has been applied and published."""
+        return self.processed == self.submitted
+
+    def stop(self):
+        """Stop the thread after the input queued so far and return the engine.
+
+        The engine is the caller's again afterwards, with its timer running.
+        """
+        if self.thread.is_alive():
+            self.inputs.put(("stop",))
+            self.thread.join()
+        self.engine.observers.remove(self)
+        self.engine.resume_timer()
+        return self.engine
+
+    # ------------------------------------------------------------------
+    # Engine thread side
+    # ------------------------------------------------------------------
+
+    def run(self):
+        engine = self.engine
+        while True:
+            command = self.inputs.get()
+            op = command[0]
+            if op == "stop":
+                return
+            if op == "shown":
+                if self.awaiting is not None and command[1] >= self.awaiting:
+                    self.awaiting = None
+                    engine.resume_timer()
+                continue
+            if op == "swap":
+                steps = engine.make_move(command[1], command[2])
+                if steps:
+                    # Keep the timer stopped until the cascade has played on screen
+                    engine.pause_timer()
+                    self.awaiting = self.seq
+            elif op == "hint":
+                engine.use_hint()
+            elif op == "undo":
+                engine.history.undo()
+            elif op == "redo":
+                engine.history.redo()
+            if self.after_input is not None:
+                self.after_input(engine)
+            self.processed += 1
+            if self.wake is not None:
+                self.wake()
+
+    def publish(self, kind, swap=None, words=()):
+        engine = self.engine
+        self.seq += 1
+        snapshot = BoardSnapshot(
+            self.seq, kind, engine.grid_size, tuple(letter for row in engine.grid for letter in row),
+            engine.score, engine.moves_left, engine.hints_used, engine.time_limit,
+            engine.elapsed_time(), engine.is_paused, swap, words, self.hint_swaps)
+        self.latest = snapshot
+        self.snapshots.append(snapshot)
+        if self.wake is not None:
+            self.wake()
+
+    def flush_cells(self):
+        # Tiles drop one column at a time; all of a step's drops make one snapshot
+        if self.pending_cells:
+            self.pending_cells = False
+            self.publish("cells")
+
+    # Engine observer hooks (see ``GameEngine.notify``)
+
+    def on_swap(self, engine, pos1, pos2):
+        self.flush_cells()
+        self.hint_swaps = ()
+        self.publish("swap", swap=(pos1, pos2))
+
+    def on_words(self, engine, words):
+        self.flush_cells()
+        size = engine.grid_size
+        popped = tuple((word, tuple(divmod(i, size) for i in range(size * size) if mask >> i & 1))
+                       for word, mask in words)
+        self.publish("words", words=popped)
+
+    def on_cells(self, engine):
+        self.pending_cells = True
+
+    def on_timer(self, engine):
+        self.flush_cells()
+        self.publish("timer")
+
+    def on_hint(self, engine, swaps):
+        self.flush_cells()
+        self.hint_swaps = tuple(swaps)
+        self.publish("hint")
+
+    def on_settled(self, engine):
+        self.flush_cells()
+        self.publish("settled")
+
+    def on_restore(self, engine):
+        self.flush_cells()
+        self.publish("restore")
+
+
+class SnapshotView:
+    """The snapshot on screen, read like a ``GameEngine`` by the renderer.
+
+    Between snapshots the timer runs on the local ``clock`` from the game
+    time of the snapshot, as ``stream.StateMirror`` does.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or time.monotonic
+        self.snapshot = None
+        self.grid = []
+        self.shown_at = self.clock()
+
+    def show(self, snapshot):
+        size = snapshot.grid_size
+        letters = snapshot.letters
+        self.snapshot = snapshot
+        self.grid = [list(letters[r * size:(r + 1) * size]) for r in range(size)]
+        self.shown_at = self.clock()
+
+    def __getattr__(self, name):
+        # grid_size, score, moves_left, hints_used, time_limit, hint_swaps...
+        snapshot = self.__dict__.get("snapshot")
+        if snapshot is None or name not in BoardSnapshot._fields:
+            raise AttributeError(name)
+        return getattr(snapshot, name)
+
+    @property
+    def is_paused(self):
+        return self.snapshot.paused
+
+    def elapsed_time(self):
+        if self.snapshot.paused:
+            return self.snapshot.game_time
+        return self.snapshot.game_time + self.clock() - self.shown_at
+
+    def remaining_time(self):
+        return max(0, self.time_limit - int(self.elapsed_time()))
+
+    def next_tick(self):
+        if self.snapshot.paused:
+            return None
+        return 1 - self.elapsed_time() % 1
+
+    def is_time_over(self):
+        return int(self.elapsed_time()) >= self.time_limit
+
+    def is_game_over(self):
+        return self.moves_left <= 0 or self.is_time_over()
+
+
+class SnapshotPlayer:
+    """Steps the render thread through an ``EngineThread``'s snapshots in order.
+
+    ``advance`` moves on to the next snapshot once the current transition
+    has had its time on screen and returns how far along (0 to 1) the
+    current one is. ``previous`` is the snapshot being eased away from.
+    """
+
+    def __init__(self, game, transition_times=None, clock=None):
+        self.game = game
+        self.transition_times = TRANSITION_TIMES if transition_times is None else transition_times
+        self.clock = clock or time.monotonic
+        self.view = SnapshotView(self.clock)
+        self.previous = None
+        self.current = None
+        self.started = 0.0
+        self.duration = 0.0
+        self.advance()
+
+    def advance(self):
+        now = self.clock()
+        snapshots = self.game.snapshots
+        while snapshots and (self.current is None or now - self.started >= self.duration):
+            self.previous = self.current
+            self.current = snapshots.popleft()
+            self.view.show(self.current)
+            self.started = now
+            self.duration = self.transition_times.get(self.current.kind, 0.0)
+        progress = 1.0 if self.duration <= 0 else min(1.0, (now - self.started) / self.duration)
+        if progress >= 1.0 and not snapshots and self.current is not None:
+            self.game.shown(self.current.seq)
+        return progress
+
+    def animating(self):
+        """True while a transition plays or snapshots are waiting to be shown."""
+        return bool(self.game.snapshots) or self.clock() - self.started < self.duration
+
+    def idle(self):
+        """Nothing left to apply or to show: the screen shows the engine's current state."""
+        return self.game.idle() and not self.animating()
+
+    def time_to_next(self):
+        """Seconds until the current transition ends (0 if it has)."""
+        return max(0.0, self.duration - (self.clock() - self.started))
+
+
+def main(argv=None):
+    from engine import GameEngine, GRID_SIZE, ManualClock
+
+    parser = argparse.ArgumentParser(description="Play random moves through an engine thread and compare "
+                                                 "the result with the same moves played directly")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--moves", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    moves = []
+    for _ in range(args.moves):
+        r, c = rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE - 1)
+        moves.append(((r, c), (r, c + 1)))
+
+    direct = GameEngine(seed=args.seed, clock=ManualClock())
+    for pos1, pos2 in moves:
+        direct.make_move(pos1, pos2)
+
+    game = EngineThread(GameEngine(seed=args.seed, clock=ManualClock())).start()
+    player = SnapshotPlayer(game, transition_times={})
+    start = time.perf_counter()
+    for pos1, pos2 in moves:
+        game.swap(pos1, pos2)
+    while not player.idle():
+        player.advance()
+    duration = time.perf_counter() - start
+    engine = game.stop()
+    same = engine.grid == direct.grid and engine.score == direct.score
+    print(f"{game.seq} snapshots for {len(moves)} moves in {duration * 1000:.1f} ms; "
+          f"score {engine.score}, {'matches' if same else 'differs from'} direct play")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
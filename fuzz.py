@@ -0,0 +1,518 @@
+"""Property-based fuzzing of the engine's invariants.
+
+Each case is a random game: a seed, a grid size, a scan mode, a
+selection rule, move and time limits, and a sequence of actions, all
+drawn from the case number. The actions are:
+
+    move      a swap played headless with ``make_move``
+    animated  a swap played the way the game loop plays it: swap, then
+              pop and drop one column at a time with the timer paused and
+              the clock running, as ``wordcrush.process_valid_words`` does
+    illegal   a swap of two cells that are not adjacent
+    hint      ``use_hint``
+    undo      ``UndoStack.undo``
+    redo      ``UndoStack.redo``
+    wait      advance the clock
+
+Every new engine and every action is followed by these checks (the
+check name is what a failure reports):
+
+    settled   no empty cell and no word left on the board
+    letters   every cell holds a letter that can be drawn
+    lines     the words kept per line match a full rescan of the board
+    timer     elapsed time never goes backwards and runs once a move has settled
+    paused    the timer stands still while an animated cascade plays
+    drop      no empty cell in a column once it has dropped
+    moves     moves left and score follow the moves and the words they popped
+    rejected  illegal swaps and moves after the game is over change nothing
+    undo      undo and redo bring back the board, score and moves from before and after the move
+    hint      the top hint scores what the words its swap forms are worth
+    crash     the engine raised an exception
+
+A failing case is shrunk: the actions after the failure are cut, then
+runs of actions and single actions are dropped for as long as the case
+still fails the same check. The minimal case is written as JSON to
+``--failures``; ``--replay`` runs it again and prints every step.
+
+Cases run in batches across a process pool; the default 200 steps
+play about 110 moves per case, so 20000 cases cover two million moves.
+
+Usage:
+    python fuzz.py --cases 20000 --steps 200
+    python fuzz.py --cases 2000 --grid-sizes 3 4 --scan all --workers 8
+    python fuzz.py --replay fuzz-failures/case-1234.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, deque, namedtuple
+from multiprocessing import Pool
+
+from engine import GameEngine, ManualClock, LETTER_SCORES, MAX_HINTS, TIMER_START, calculate_word_score
+from segments import SCAN_MODES
+from selection import SELECTION_RULES
+from undo import UNDO_LIMIT, UndoStack
+
+STEPS = 200  # Actions per case
+CASES_PER_TASK = 20  # Cases per pool task
+GRID_SIZES = (3, 4, 5, 6, 7, 8)
+SHORT_GAME_MOVES = 20  # Most moves a case with a move limit gets
+SHORT_GAME_TIME = 60  # Most seconds a case with a time limit gets
+MEAN_WAIT = 0.5  # Mean seconds a wait advances the clock
+ANIMATION_TIME = 0.3  # Seconds each animated cascade step takes on the clock
+TIME_EPSILON = 1e-9
+FAILURE_DIR = "fuzz-failures"
+
+ACTION_WEIGHTS = {  # Relative frequency of each action
+    "move": 50,
+    "animated": 15,
+    "illegal": 4,
+    "hint": 3,
+    "undo": 8,
+    "redo": 5,
+    "wait": 15,
+}
+
+FuzzCase = namedtuple("FuzzCase", [
+    "number",       # Case number; everything else is drawn from it
+    "seed",         # Engine seed
+    "grid_size",
+    "scan",
+    "selection",
+    "total_moves",
+    "time_limit",
+    "actions",      # ((name, *arguments), ...)
+])
+
+Failure = namedtuple("Failure", ["step", "check", "message"])  # step -1 is the starting board
+
+
+class InvariantError(Exception):
+    def __init__(self, check, message):
+        super().__init__(f"{check}: {message}")
+        self.check = check
+        self.message = message
+
+
+class FuzzStats:
+    """Totals over fuzzed cases; batches merge into one."""
+
+    def __init__(self):
+        self.cases = 0
+        self.steps = 0
+        self.moves = 0  # Moves played, animated ones included
+        self.animated = 0
+        self.cascade_steps = 0
+        self.rejected = 0
+        self.undos = 0
+        self.redos = 0
+        self.hints = 0
+        self.reshuffles = 0
+        self.fallbacks = 0  # Starting boards patched by the generator fallback
+        self.failures = Counter()  # check -> failing cases
+
+    def merge(self, other):
+        self.cases += other.cases
+        self.steps += other.steps
+        self.moves += other.moves
+        self.animated += other.animated
+        self.cascade_steps += other.cascade_steps
+        self.rejected += other.rejected
+        self.undos += other.undos
+        self.redos += other.redos
+        self.hints += other.hints
+        self.reshuffles += other.reshuffles
+        self.fallbacks += other.fallbacks
+        self.failures.update(other.failures)
+
+    def report(self, duration):
+        duration = max(duration, 1e-9)
+        failures = "  ".join(f"{check}: {count}" for check, count in sorted(self.failures.items())) or "none"
+        return "\n".join([
+            f"Cases: {self.cases}  Steps: {self.steps}  Moves: {self.moves} ({self.animated} animated)  "
+            f"Cascade steps: {self.cascade_steps}",
+            f"Rejected: {self.rejected}  Undos: {self.undos}  Redos: {self.redos}  Hints: {self.hints}  "
+            f"Reshuffles: {self.reshuffles}  Fallback boards: {self.fallbacks}",
+            f"Throughput: {self.moves / duration:.0f} moves/s, {self.steps / duration:.0f} steps/s "
+            f"in {duration:.2f}s",
+            f"Failures: {failures}",
+        ])
+
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+
+def random_action(rng, size):
+    name = rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+    if name in ("move", "animated"):
+        r, c = rng.randrange(size), rng.randrange(size)
+        if rng.random() < 0.5:
+            # Horizontal; (r, c) is the right cell when it is in the last column
+            return (name, (r, c - 1), (r, c)) if c == size - 1 else (name, (r, c), (r, c + 1))
+        return (name, (r - 1, c), (r, c)) if r == size - 1 else (name, (r, c), (r + 1, c))
+    if name == "illegal":
+        while True:
+            pos1 = (rng.randrange(size), rng.randrange(size))
+            pos2 = (rng.randrange(size), rng.randrange(size))
+            if abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1]) != 1:
+                return (name, pos1, pos2)
+    if name == "wait":
+        return (name, round(rng.expovariate(1 / MEAN_WAIT), 3))
+    return (name,)
+
+
+def generate_case(number, steps=STEPS, grid_sizes=GRID_SIZES, scans=tuple(SCAN_MODES),
+                  selections=tuple(SELECTION_RULES)):
+    """Case ``number``; the same arguments always give the same case."""
+    rng = random.Random(number)
+    size = rng.choice(grid_sizes)
+    # Most cases play on until the actions run out; some hit the move or time limit
+    total_moves = rng.randint(1, SHORT_GAME_MOVES) if rng.random() < 0.2 else steps
+    time_limit = rng.randint(1, SHORT_GAME_TIME) if rng.random() < 0.2 else max(TIMER_START, steps)
+    return FuzzCase(number, rng.randrange(2 ** 32), size, rng.choice(scans), rng.choice(selections),
+                    total_moves, time_limit, tuple(random_action(rng, size) for _ in range(steps)))
+
+
+def case_to_json(case, failure=None):
+    data = case._asdict()
+    if failure is not None:
+        data["failure"] = failure._asdict()
+    return json.dumps(data, indent=1)
+
+
+def case_from_json(text):
+    data = json.loads(text)
+    data.pop("failure", None)
+    data["actions"] = tuple(tuple(tuple(arg) if isinstance(arg, list) else arg for arg in action)
+                            for action in data["actions"])
+    return FuzzCase(**data)
+
+
+# ----------------------------------------------------------------------
+# Checks
+# ----------------------------------------------------------------------
+
+def session_state(engine):
+    """What a move, its undo and its redo change: (score, moves left, board)."""
+    return engine.score, engine.moves_left, tuple(letter for row in engine.grid for letter in row)
+
+
+def check_board(engine):
+    """A settled board: every cell a letter, the line words up to date, no word left."""
+    for r, row in enumerate(engine.grid):
+        for c, letter in enumerate(row):
+            if letter is None:
+                raise InvariantError("settled", f"empty cell at {(r, c)}")
+            if letter not in LETTER_SCORES:
+                raise InvariantError("letters", f"{letter!r} at {(r, c)}")
+    kept = list(engine.scan_lines())
+    engine.mark_dirty(engine.segments.full_mask)
+    for line, words in enumerate(engine.scan_lines()):
+        if words != kept[line]:
+            raise InvariantError("lines", f"{engine.segments.line_names[line]} kept {kept[line]}, holds {words}")
+    words = engine.find_word_masks()
+    if words:
+        raise InvariantError("settled", f"words left on the board: {', '.join(word for word, _ in words)}")
+
+
+def check_unchanged(before, engine, check, what):
+    if session_state(engine) != before:
+        raise InvariantError(check, f"{what} changed the session")
+
+
+def check_hint(engine, swaps):
+    """The top hint's score is what the words formed by its swap are worth."""
+    if not swaps:
+        return
+    score, (r1, c1), (r2, c2) = swaps[0]
+    board = engine.copy()
+    grid = board.grid
+    grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+    board.mark_dirty(board.segments.full_mask)
+    formed = sum(calculate_word_score(word) for word, _ in board.find_word_masks())
+    if formed != score:
+        raise InvariantError("hint", f"swap {(r1, c1)}-{(r2, c2)} hinted at {score}, forms {formed}")
+
+
+class DropChecker:
+    """Engine observer checking that a column holds no empty cell once it has dropped.
+
+    Columns drop left to right, each telling observers with ``on_cells``;
+    a reshuffle tells them once for the whole board.
+    """
+
+    def __init__(self):
+        self.columns = deque()  # Columns with popped cells still to drop, in drop order
+
+    def on_words(self, engine, words):
+        popped = 0
+        for _, mask in words:
+            popped |= mask
+        size = engine.grid_size
+        self.columns = deque(sorted({i % size for i in engine.segments.mask_cells(popped)}))
+
+    def on_cells(self, engine):
+        columns = [self.columns.popleft()] if self.columns else range(engine.grid_size)
+        for col in columns:
+            for row in range(engine.grid_size):
+                if engine.grid[row][col] is None:
+                    raise InvariantError("drop", f"empty cell at {(row, col)} after tiles dropped")
+
+    def on_swap(self, engine, pos1, pos2):
+        pass
+
+    def on_timer(self, engine):
+        pass
+
+    def on_hint(self, engine, swaps):
+        pass
+
+    def on_settled(self, engine):
+        pass
+
+    def on_restore(self, engine):
+        pass
+
+
+def play_animated(engine, clock, pos1, pos2):
+    """Play a move as the game loop does; returns the points its words are worth."""
+    engine.swap_tiles(pos1, pos2)
+    points = 0
+    while True:
+        words = engine.get_words_and_positions()
+        if not words:
+            engine.resume_timer()
+            break
+        engine.pause_timer()
+        paused_at = engine.elapsed_time()
+        points += sum(calculate_word_score(word) for word, _ in words)
+        engine.pop_tiles(engine.score_words(words))
+        for col in range(engine.grid_size):
+            engine.drop_column(col)
+        clock.advance(ANIMATION_TIME)
+        if not engine.is_paused or abs(engine.elapsed_time() - paused_at) > TIME_EPSILON:
+            raise InvariantError("paused", f"timer ran for {engine.elapsed_time() - paused_at:.3f}s of a cascade")
+    engine.ensure_playable()
+    return points
+
+
+# ----------------------------------------------------------------------
+# Running a case
+# ----------------------------------------------------------------------
+
+def run_case(case, stats=None, trace=None):
+    """Play ``case``, checking every invariant after every step.
+
+    Returns the first ``Failure``, or None. ``stats`` (a ``FuzzStats``)
+    counts what was played; ``trace`` is called with a line per step.
+    """
+    stats = stats or FuzzStats()
+    step = -1
+    try:
+        clock = ManualClock()
+        engine = GameEngine(seed=case.seed, clock=clock, grid_size=case.grid_size,
+                            total_moves=case.total_moves, time_limit=case.time_limit,
+                            selection=case.selection, scan=case.scan)
+        engine.observers.append(DropChecker())
+        history = UndoStack(engine)
+        done = deque(maxlen=UNDO_LIMIT)  # (state before, state after) of the moves history can undo
+        undone = []
+        stats.cases += 1
+        stats.fallbacks += engine.generation_fallback
+        check_board(engine)
+        elapsed = engine.elapsed_time()
+        for step, action in enumerate(case.actions):
+            name = action[0]
+            before = session_state(engine)
+            reshuffles = engine.reshuffles
+            if name in ("move", "animated", "illegal"):
+                pos1, pos2 = action[1], action[2]
+                allowed = name != "illegal" and not engine.is_game_over()
+                if name == "animated":
+                    points = play_animated(engine, clock, pos1, pos2) if allowed else None
+                    stats.animated += allowed
+                else:
+                    steps = engine.make_move(pos1, pos2)
+                    if (steps is not None) != allowed:
+                        raise InvariantError("rejected", f"{'refused' if allowed else 'played'} "
+                                                         f"swap {pos1}-{pos2}")
+                    points = None if steps is None else sum(calculate_word_score(word)
+                                                           for words in steps for word, _ in words)
+                    stats.cascade_steps += len(steps or ())
+                if allowed:
+                    stats.moves += 1
+                    after = session_state(engine)
+                    if after[1] != before[1] - 1 or after[0] != before[0] + points:
+                        raise InvariantError("moves", f"score {before[0]} -> {after[0]} for {points} points, "
+                                                      f"moves left {before[1]} -> {after[1]}")
+                    done.append((before, after))
+                    undone.clear()
+                else:
+                    stats.rejected += 1
+                    check_unchanged(before, engine, "rejected", f"refused swap {pos1}-{pos2}")
+            elif name == "undo":
+                diff = history.undo()
+                if (diff is not None) != (bool(done) and not engine.is_time_over()):
+                    raise InvariantError("undo", "undo " + ("refused" if diff is None else "allowed") +
+                                         f" with {len(done)} moves to undo")
+                if diff is not None:
+                    stats.undos += 1
+                    move = done.pop()
+                    undone.append(move)
+                    if session_state(engine) != move[0]:
+                        raise InvariantError("undo", "undo did not bring back the session from before the move")
+            elif name == "redo":
+                diff = history.redo()
+                if (diff is not None) != (bool(undone) and not engine.is_time_over()):
+                    raise InvariantError("undo", "redo " + ("refused" if diff is None else "allowed") +
+                                         f" with {len(undone)} moves to redo")
+                if diff is not None:
+                    stats.redos += 1
+                    move = undone.pop()
+                    done.append(move)
+                    if session_state(engine) != move[1]:
+                        raise InvariantError("undo", "redo did not bring back the session from after the move")
+            elif name == "hint":
+                hints_used = engine.hints_used
+                swaps = engine.use_hint()
+                if (swaps is None) != (hints_used >= MAX_HINTS):
+                    raise InvariantError("hint", f"hint {'refused' if swaps is None else 'given'} "
+                                                 f"with {hints_used} used")
+                stats.hints += swaps is not None
+                check_unchanged(before, engine, "hint", "a hint")
+                check_hint(engine, swaps)
+            elif name == "wait":
+                clock.advance(action[1])
+            else:
+                raise ValueError(f"Unknown action {name!r}")
+
+            stats.steps += 1
+            stats.reshuffles += engine.reshuffles - reshuffles
+            check_board(engine)
+            if engine.is_paused:
+                raise InvariantError("timer", "timer left paused after the board settled")
+            now = engine.elapsed_time()
+            if now < elapsed - TIME_EPSILON:
+                raise InvariantError("timer", f"elapsed time went back from {elapsed:.3f}s to {now:.3f}s")
+            elapsed = now
+            if trace is not None:
+                trace(f"{step:4d} {' '.join(map(str, action)):<24} score {engine.score:4d}  "
+                      f"moves {engine.moves_left:3d}  time {now:7.2f}s  "
+                      f"{'/'.join(''.join(row) for row in engine.grid)}")
+    except InvariantError as e:
+        return Failure(step, e.check, e.message)
+    except Exception as e:
+        return Failure(step, "crash", f"{type(e).__name__}: {e}")
+    return None
+
+
+def shrink(case, failure):
+    """The smallest case found that still fails ``failure``'s check, and its failure."""
+    case = case._replace(actions=case.actions[:failure.step + 1])
+    chunk = len(case.actions) // 2
+    while chunk >= 1:
+        i = 0
+        while i < len(case.actions):
+            candidate = case._replace(actions=case.actions[:i] + case.actions[i + chunk:])
+            found = run_case(candidate)
+            if found is not None and found.check == failure.check:
+                case = candidate._replace(actions=candidate.actions[:found.step + 1])
+                failure = found
+            else:
+                i += chunk
+        chunk //= 2
+    return case, failure
+
+
+def run_batch(task):
+    """Pool worker: fuzz a range of cases; returns (``FuzzStats``, [(case, failure), ...]), shrunk."""
+    numbers, steps, grid_sizes, scans, selections, minimize = task
+    stats = FuzzStats()
+    failures = []
+    for number in numbers:
+        case = generate_case(number, steps, grid_sizes, scans, selections)
+        failure = run_case(case, stats)
+        if failure is not None:
+            stats.failures[failure.check] += 1
+            if minimize:
+                case, failure = shrink(case, failure)
+            failures.append((case, failure))
+    return stats, failures
+
+
+def fuzz(cases, steps=STEPS, workers=1, seed=0, grid_sizes=GRID_SIZES, scans=tuple(SCAN_MODES),
+         selections=tuple(SELECTION_RULES), minimize=True, max_failures=None):
+    """Fuzz cases ``seed`` to ``seed + cases``; returns the merged ``FuzzStats`` and the failures.
+
+    Stops early once ``max_failures`` cases have failed.
+    """
+    tasks = [(range(start, min(start + CASES_PER_TASK, seed + cases)), steps, grid_sizes, scans, selections,
+              minimize)
+             for start in range(seed, seed + cases, CASES_PER_TASK)]
+    total = FuzzStats()
+    failures = []
+    if workers <= 1:
+        results = map(run_batch, tasks)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap_unordered(run_batch, tasks)
+    try:
+        for stats, found in results:
+            total.merge(stats)
+            failures.extend(found)
+            if max_failures is not None and len(failures) >= max_failures:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return total, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzz the engine with random games and check its invariants")
+    parser.add_argument("--cases", type=int, default=1000, help="number of random games")
+    parser.add_argument("--steps", type=int, default=STEPS, help="actions per game")
+    parser.add_argument("--seed", type=int, default=0, help="number of the first case")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=list(GRID_SIZES))
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), nargs="+", default=sorted(SCAN_MODES),
+                        help="game modes to draw from")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), nargs="+", default=sorted(SELECTION_RULES),
+                        help="selection rules to draw from")
+    parser.add_argument("--max-failures", type=int, default=10, help="stop after this many failing cases")
+    parser.add_argument("--no-shrink", action="store_true", help="report failing cases as generated")
+    parser.add_argument("--failures", default=FAILURE_DIR, help="directory minimal failing cases are written to")
+    parser.add_argument("--replay", help="run one case file again, printing every step")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        with open(args.replay) as f:
+            case = case_from_json(f.read())
+        failure = run_case(case, trace=print)
+        print("passed" if failure is None else
+              f"failed at step {failure.step}: {failure.check}: {failure.message}")
+        return 0 if failure is None else 1
+
+    start = time.perf_counter()
+    stats, failures = fuzz(args.cases, args.steps, args.workers, args.seed, tuple(args.grid_sizes),
+                           tuple(args.scan), tuple(args.selection), not args.no_shrink, args.max_failures)
+    print(stats.report(time.perf_counter() - start))
+    if failures:
+        os.makedirs(args.failures, exist_ok=True)
+    for case, failure in failures:
+        path = os.path.join(args.failures, f"case-{case.number}.json")
+        with open(path, "w") as f:
+            f.write(case_to_json(case, failure))
+        print(f"case {case.number}: {failure.check} at step {failure.step} of {len(case.actions)}: "
+              f"{failure.message} -> {path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
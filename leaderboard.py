@@ -0,0 +1,330 @@
+"""Persistent leaderboard backed by SQLite in WAL mode.
+
+Finished games are submitted to a ``LeaderboardWriter``, which queues
+them and writes them on a background thread, many per transaction, so a
+game (or a server handling thousands of sessions) never waits on disk.
+WAL mode lets readers query while the writer commits.
+
+Besides the ``games`` table, the writer keeps each player's best score
+per board size and a count of players per best score. Top-N lists read
+straight off an index. A player's rank is one plus the number of players
+with a higher best, summed over the distinct best scores above theirs.
+That stays a few hundred rows however many games are stored.
+
+Usage:
+    python leaderboard.py top --limit 10
+    python leaderboard.py rank alice
+    python leaderboard.py bench --games 1000000     # bulk-load synthetic games, time queries
+"""
+import argparse
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from engine import GRID_SIZE
+
+LEADERBOARD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard.db")
+BATCH_SIZE = 500  # Most games written per transaction
+FLUSH_INTERVAL = 0.05  # Seconds a queued game may wait for more to batch with
+SQLITE_MAX_INT = 2 ** 63 - 1  # Largest value an INTEGER column holds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    grid_size INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    seed INTEGER,
+    selection TEXT,
+    played_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_score ON games (grid_size, score DESC, id);
+CREATE INDEX IF NOT EXISTS games_by_player ON games (player, grid_size, score DESC);
+
+CREATE TABLE IF NOT EXISTS player_best (
+    grid_size INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    best INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (grid_size, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_best_by_score ON player_best (grid_size, best DESC);
+
+CREATE TABLE IF NOT EXISTS best_counts (
+    grid_size INTEGER NOT NULL,
+    best INTEGER NOT NULL,
+    players INTEGER NOT NULL,
+    PRIMARY KEY (grid_size, best)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL keeps the database consistent; a crash may lose the last batch
+    return conn
+
+
+def write_batch(conn, entries):
+    """Insert ``(player, grid_size, score, seed, selection, played_at)`` rows in one transaction."""
+    # Fold the batch per player first, so each best is read and written once
+    bests = {}
+    for player, grid_size, score, *_ in entries:
+        key = (grid_size, player)
+        best, games = bests.get(key, (score, 0))
+        bests[key] = (max(best, score), games + 1)
+
+    with conn:
+        conn.executemany("INSERT INTO games (player, grid_size, score, seed, selection, played_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", entries)
+        counts = {}  # (grid_size, best) -> change in players
+        for (grid_size, player), (best, games) in bests.items():
+            row = conn.execute("SELECT best FROM player_best WHERE grid_size = ? AND player = ?",
+                               (grid_size, player)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO player_best VALUES (?, ?, ?, ?)", (grid_size, player, best, games))
+                counts[grid_size, best] = counts.get((grid_size, best), 0) + 1
+            else:
+                old = row[0]
+                conn.execute("UPDATE player_best SET best = max(best, ?), games = games + ? "
+                             "WHERE grid_size = ? AND player = ?", (best, games, grid_size, player))
+                if best > old:
+                    counts[grid_size, old] = counts.get((grid_size, old), 0) - 1
+                    counts[grid_size, best] = counts.get((grid_size, best), 0) + 1
+        conn.executemany("INSERT INTO best_counts VALUES (?, ?, ?) ON CONFLICT (grid_size, best) "
+                         "DO UPDATE SET players = players + excluded.players",
+                         [(grid_size, best, delta) for (grid_size, best), delta in counts.items() if delta])
+        conn.execute("DELETE FROM best_counts WHERE players <= 0")
+
+
+class LeaderboardWriter:
+    """Background thread writing submitted games in batches.
+
+    ``submit`` only queues the game. ``flush`` waits until everything
+    submitted so far is committed; ``close`` flushes and stops the thread.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.written = 0
+        self.dropped = 0  # Games in batches that failed to commit
+        conn = connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, player, score, grid_size=GRID_SIZE, seed=None, selection=None, played_at=None):
+        """Queue a game. Raises ValueError for a score or grid size SQLite cannot store.
+
+        The seed only identifies the game, so one that does not fit an
+        INTEGER column (or is not an int) is stored as NULL.
+        """
+        if not isinstance(player, str):
+            raise ValueError(f"player must be a string, not {type(player).__name__}")
+        for name, value in (("score", score), ("grid size", grid_size)):
+            if not isinstance(value, int) or not 0 <= value <= SQLITE_MAX_INT:
+                raise ValueError(f"{name} {value!r} cannot be stored")
+        if not isinstance(seed, int) or not 0 <= seed <= SQLITE_MAX_INT:
+            seed = None
+        self.queue.put((player, grid_size, score, seed, selection,
+                        time.time() if played_at is None else played_at))
+
+    def run(self):
+        conn = connect(self.path)
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                self.queue.task_done()
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+            try:
+                self.write(conn, batch)
+            finally:
+                # Whatever went wrong, ``flush`` must return
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def write(self, conn, batch):
+        """Commit ``batch``; if it fails, commit its games one by one and drop those that fail.
+
+        Never raises, so one bad game cannot stop the thread.
+        """
+        try:
+            write_batch(conn, batch)
+            self.batches += 1
+            self.written += len(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self.dropped += 1
+                print(f"Could not save leaderboard entry {batch[0]!r} ({type(e).__name__}: {e})",
+                      file=sys.stderr)
+                return
+        for entry in batch:
+            self.write(conn, [entry])
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class Leaderboard:
+    """Read side of the leaderboard, plus a writer for submissions.
+
+    Each thread reading gets its own connection, so queries never wait on
+    one another or on the writer.
+    """
+
+    def __init__(self, path=LEADERBOARD_PATH, **writer_options):
+        self.path = path
+        self.writer = LeaderboardWriter(path, **writer_options)
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path)
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def submit(self, player, score, grid_size=GRID_SIZE, seed=None, selection=None):
+        self.writer.submit(player, score, grid_size, seed, selection)
+
+    def top_games(self, limit=10, grid_size=GRID_SIZE):
+        """Best games as (player, score, seed, played_at), highest score first."""
+        return self.connection().execute(
+            "SELECT player, score, seed, played_at FROM games WHERE grid_size = ? "
+            "ORDER BY score DESC, id LIMIT ?", (grid_size, limit)).fetchall()
+
+    def top_players(self, limit=10, grid_size=GRID_SIZE):
+        """Players by best score as (player, best, games played)."""
+        return self.connection().execute(
+            "SELECT player, best, games FROM player_best WHERE grid_size = ? "
+            "ORDER BY best DESC LIMIT ?", (grid_size, limit)).fetchall()
+
+    def rank(self, player, grid_size=GRID_SIZE):
+        """(rank, best score, players ranked) for ``player``, or None if they have no games.
+
+        Players tied on their best share a rank.
+        """
+        conn = self.connection()
+        row = conn.execute("SELECT best FROM player_best WHERE grid_size = ? AND player = ?",
+                           (grid_size, player)).fetchone()
+        if row is None:
+            return None
+        best = row[0]
+        above, total = conn.execute(
+            "SELECT coalesce(sum(CASE WHEN best > ? THEN players END), 0), coalesce(sum(players), 0) "
+            "FROM best_counts WHERE grid_size = ?", (best, grid_size)).fetchone()
+        return above + 1, best, total
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+def bench(board, games, players):
+    """Submit ``games`` synthetic scores, then time top-N and rank queries."""
+    rng = random.Random(0)
+    names = [f"player{i}" for i in range(players)]
+    start = time.perf_counter()
+    for _ in range(games):
+        board.submit(rng.choice(names), max(0, int(rng.gauss(50, 15))), seed=rng.getrandbits(32))
+    board.flush()
+    duration = time.perf_counter() - start
+    print(f"Wrote {games} games in {duration:.2f}s ({games / duration:.0f}/s, "
+          f"{board.writer.batches} transactions)")
+
+    def timed(query, count=200):
+        latencies = []
+        for _ in range(count):
+            t = time.perf_counter()
+            query()
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+    for name, query in [("top 10 games", lambda: board.top_games(10)),
+                        ("top 10 players", lambda: board.top_players(10)),
+                        ("player rank", lambda: board.rank(rng.choice(names)))]:
+        p50, p99 = timed(query)
+        print(f"{name:<15} p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+
+    # Reads while the writer is busy: WAL keeps them from blocking
+    for _ in range(games // 10):
+        board.submit(rng.choice(names), max(0, int(rng.gauss(50, 15))))
+    p50, p99 = timed(lambda: board.rank(rng.choice(names)))
+    board.flush()
+    print(f"{'rank (writing)':<15} p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word Crush leaderboard")
+    parser.add_argument("--db", default=LEADERBOARD_PATH, help="SQLite database file")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board size to rank")
+    commands = parser.add_subparsers(dest="command", required=True)
+    top = commands.add_parser("top", help="list the best games and players")
+    top.add_argument("--limit", type=int, default=10)
+    rank = commands.add_parser("rank", help="show a player's rank")
+    rank.add_argument("player")
+    bench_parser = commands.add_parser("bench", help="load synthetic games and time queries")
+    bench_parser.add_argument("--games", type=int, default=100000)
+    bench_parser.add_argument("--players", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    board = Leaderboard(args.db)
+    try:
+        if args.command == "top":
+            print("Top games:")
+            for i, (player, score, seed, played_at) in enumerate(board.top_games(args.limit, args.grid_size), 1):
+                print(f"{i:>4}. {player:<20} {score:>5}  seed {seed}  "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(played_at))}")
+            print("Top players:")
+            for i, (player, best, games) in enumerate(board.top_players(args.limit, args.grid_size), 1):
+                print(f"{i:>4}. {player:<20} {best:>5}  ({games} games)")
+        elif args.command == "rank":
+            result = board.rank(args.player, args.grid_size)
+            if result is None:
+                print(f"{args.player} has no games on the {args.grid_size}x{args.grid_size} board")
+                return 1
+            position, best, total = result
+            print(f"{args.player}: #{position} of {total} with a best of {best}")
+        else:
+            bench(board, args.games, args.players)
+    finally:
+        board.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
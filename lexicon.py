@@ -0,0 +1,307 @@
+"""Compiled dictionary shared between processes through a memory-mapped file.
+
+Every process that builds ``word_list`` as a Python set of ~200k strings,
+plus its wildcard and anagram indexes, pays tens of MB. ``lexicon.py
+build`` writes the words, the wildcard patterns (see ``pattern_index``)
+and their heads, and the anagram trie (see ``anagram_index``) into one
+read-only file of open-addressing hash tables. Processes map it and look
+keys up directly in the mapped buffer, so the pages live once in the OS
+page cache however many workers use them.
+
+File layout (little-endian):
+    header  magic "WCLX", version u16, index max length u16,
+            offsets of the words, patterns, heads and anagram tables (u64 each),
+            source digest (8 bytes)
+    table   slot count u32 (a power of two), key count u32,
+            slots u32[slot count] (record offset, 0 = empty),
+            records: key length u8, key, value length u16, value
+
+Slots are found by ``zlib.crc32`` of the key with linear probing; the
+pattern table's values are (letter, word score u16) pairs. The anagram
+table has a record per trie node, keyed by its sorted letters (the root
+by the empty key): the letters of its children, a NUL, then the words
+filed under it separated by commas.
+
+The source digest names the word source the file was compiled from (see
+``engine.word_source_digest``); the engine ignores a file whose digest
+no longer matches rather than play with a stale dictionary.
+
+Usage:
+    python lexicon.py build                 # compile the current dictionary to lexicon.bin
+    python lexicon.py info lexicon.bin
+"""
+import mmap
+import os
+import struct
+import sys
+from zlib import crc32
+
+from anagram_index import WORDS, AnagramIndex
+from pattern_index import PatternIndex
+
+MAGIC = b"WCLX"
+VERSION = 2
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon.bin")
+
+_HEADER = struct.Struct("<4sHHQQQQ8s")
+_TABLE = struct.Struct("<II")
+_SLOT = struct.Struct("<I")
+_VALUE_LENGTH = struct.Struct("<H")
+_COMPLETION = struct.Struct("<cH")
+
+
+def _pack_table(items, base):
+    """Serialize ``(key bytes, value bytes)`` pairs as a hash table starting at file offset ``base``."""
+    slot_count = 1
+    while slot_count < 2 * len(items):  # Keep probe chains short
+        slot_count *= 2
+    mask = slot_count - 1
+    slots = [0] * slot_count
+
+    records = []
+    offset = base + _TABLE.size + _SLOT.size * slot_count
+    for key, value in items:
+        i = crc32(key) & mask
+        while slots[i]:
+            i = (i + 1) & mask
+        slots[i] = offset
+        record = bytes([len(key)]) + key + _VALUE_LENGTH.pack(len(value)) + value
+        records.append(record)
+        offset += len(record)
+    return b"".join([_TABLE.pack(slot_count, len(items)), struct.pack(f"<{slot_count}I", *slots)] + records)
+
+
+def _anagram_items(index):
+    """Anagram table records for ``index``: one per trie node, root first."""
+    items = []
+    stack = [("", index.root)]
+    while stack:
+        key, node = stack.pop()
+        children = sorted(letter for letter in node if letter is not WORDS)
+        words = node.get(WORDS, [])
+        items.append((key.encode(), "".join(children).encode() + b"\0" + ",".join(sorted(words)).encode()))
+        stack.extend((key + letter, node[letter]) for letter in reversed(children))
+    return items
+
+
+def build_lexicon(words, letter_scores, path, max_length, source):
+    """Compile ``words`` and their wildcard and anagram indexes (words up to ``max_length`` letters) to ``path``.
+
+    ``source`` is the digest of the word source, stored for readers to check.
+    """
+    words = sorted(word for word in words if len(word) >= 3 and word.isascii())
+    index = PatternIndex(words, max_length, letter_scores)
+    anagrams = AnagramIndex(words, max_length, letter_scores)
+
+    tables = [
+        [(word.encode(), b"") for word in words],
+        [(pattern.encode(), b"".join(_COMPLETION.pack(letter.encode(), score)
+                                     for letter, score in sorted(completions.items())))
+         for pattern, completions in sorted(index.patterns.items())],
+        [(head.encode(), b"") for head in sorted(index.heads)],
+        _anagram_items(anagrams),
+    ]
+
+    parts = []
+    offsets = []
+    offset = _HEADER.size
+    for items in tables:
+        data = _pack_table(items, offset)
+        offsets.append(offset)
+        parts.append(data)
+        offset += len(data)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, max_length, *offsets, source))
+        for data in parts:
+            f.write(data)
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+
+
+class MappedTable:
+    """Read-only view of one hash table in the mapped file."""
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        slot_count, self.count = _TABLE.unpack_from(buf, offset)
+        self.mask = slot_count - 1
+        start = offset + _TABLE.size
+        self.slots = memoryview(buf)[start:start + _SLOT.size * slot_count].cast("I")
+
+    def find(self, key):
+        """Offset of the record for ``key`` (bytes), or 0 if absent."""
+        buf = self.buf
+        slots = self.slots
+        mask = self.mask
+        end = len(key) + 1
+        i = crc32(key) & mask
+        while True:
+            record = slots[i]
+            if not record or buf[record + 1:record + end] == key and buf[record] == end - 1:
+                return record
+            i = (i + 1) & mask
+
+    def value(self, record):
+        start = record + 1 + self.buf[record]
+        (length,) = _VALUE_LENGTH.unpack_from(self.buf, start)
+        start += _VALUE_LENGTH.size
+        return self.buf[start:start + length]
+
+    def keys(self):
+        buf = self.buf
+        for record in self.slots:
+            if record:
+                yield buf[record + 1:record + 1 + buf[record]].decode()
+
+
+class MappedLexicon:
+    """Set-like dictionary of words backed by the mapped file."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __contains__(self, word):
+        # Keys are ASCII, so a word with other characters simply finds no record
+        return self.table.find(word.encode()) != 0
+
+    def __len__(self):
+        return self.table.count
+
+    def __iter__(self):
+        return self.table.keys()
+
+
+class MappedPatternIndex:
+    """``PatternIndex`` interface over the mapped pattern and head tables."""
+
+    def __init__(self, patterns, heads, max_length):
+        self.patterns = patterns
+        self.heads = heads
+        self.max_length = max_length
+
+    def __len__(self):
+        return self.patterns.count
+
+    def completions(self, pattern):
+        """Letters that complete ``pattern`` into a word, with that word's score."""
+        record = self.patterns.find(pattern.encode())
+        if not record:
+            return {}
+        return {letter.decode(): score for letter, score in _COMPLETION.iter_unpack(self.patterns.value(record))}
+
+    def has_head(self, head):
+        """True if some pattern starts with ``head``, which ends at its slot."""
+        return self.heads.find(head.encode()) != 0
+
+    def best_completion(self, pattern):
+        """The highest scoring (letter, score) for ``pattern``, or None."""
+        completions = self.completions(pattern)
+        if not completions:
+            return None
+        return max(completions.items(), key=lambda item: item[1])
+
+
+class MappedAnagramIndex(AnagramIndex):
+    """``AnagramIndex`` walking the mapped anagram table, limited to words up to ``max_length`` letters.
+
+    A trie node is its (sorted letters, record offset) pair.
+    """
+
+    def __init__(self, table, max_length, letter_scores):
+        self.table = table
+        self.max_length = max_length
+        self.letter_scores = letter_scores
+        self.root = ("", table.find(b""))
+        self.count = None
+
+    def __len__(self):
+        if self.count is None:
+            self.count = sum(1 for key in self.table.keys() if self.anagrams(key))
+        return self.count
+
+    def anagrams(self, letters):
+        """Words using exactly ``letters``."""
+        key = ''.join(sorted(letters))
+        record = self.table.find(key.encode()) if len(key) <= self.max_length else 0
+        return self._words((key, record)) if record else []
+
+    def _words(self, node):
+        words = bytes(self.table.value(node[1])).split(b"\0", 1)[1]
+        return words.decode().split(",") if words else []
+
+    def _children(self, node):
+        key, record = node
+        if len(key) >= self.max_length:
+            return []
+        letters = bytes(self.table.value(record)).split(b"\0", 1)[0].decode()
+        return [(letter, (key + letter, self.table.find((key + letter).encode()))) for letter in letters]
+
+    def _child(self, node, letter):
+        key = node[0] + letter
+        if len(key) > self.max_length:
+            return None
+        record = self.table.find(key.encode())
+        return (key, record) if record else None
+
+
+class Lexicon:
+    """A mapped lexicon file: ``words``, ``patterns`` and anagrams for the engine."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buf) < _HEADER.size or self.buf[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a Word Crush lexicon")
+        (version,) = struct.unpack_from("<H", self.buf, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(f"Unsupported lexicon version {version}")
+        _, _, max_length, words, patterns, heads, anagrams, self.source = _HEADER.unpack_from(self.buf, 0)
+        self.path = path
+        self.max_length = max_length
+        self.words = MappedLexicon(MappedTable(self.buf, words))
+        self.patterns = MappedPatternIndex(MappedTable(self.buf, patterns),
+                                           MappedTable(self.buf, heads), max_length)
+        self.anagram_table = MappedTable(self.buf, anagrams)
+
+    def anagram_index(self, max_length, letter_scores):
+        """The mapped anagram index for words up to ``max_length`` (at most the built length) letters."""
+        return MappedAnagramIndex(self.anagram_table, min(max_length, self.max_length), letter_scores)
+
+
+def open_lexicon(path):
+    """The ``Lexicon`` at ``path``, or None if there is no file there."""
+    if not os.path.exists(path):
+        return None
+    return Lexicon(path)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("build", "info"):
+        print("Usage: python lexicon.py build [OUTPUT] | info PATH")
+        return 2
+
+    if argv[0] == "build":
+        # Compile from the word source, not from an existing mapped file
+        os.environ["WORDCRUSH_LEXICON"] = ""
+        import engine
+        path = argv[1] if len(argv) > 1 else DEFAULT_PATH
+        build_lexicon(engine.word_list, engine.LETTER_SCORES, path, engine.PATTERN_INDEX_MAX_LENGTH,
+                      engine.word_source_digest())
+    else:
+        path = argv[1] if len(argv) > 1 else None
+        if path is None:
+            print("Usage: python lexicon.py info PATH")
+            return 2
+
+    lexicon = Lexicon(path)
+    print(f"{path}: {len(lexicon.words)} words, {len(lexicon.patterns)} patterns "
+          f"(up to {lexicon.max_length} letters), {lexicon.patterns.heads.count} heads, "
+          f"{lexicon.anagram_table.count} anagram nodes, source {lexicon.source.hex()}, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
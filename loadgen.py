@@ -0,0 +1,166 @@
+"""Load generator for the Word Crush game server.
+
+Opens ``--connections`` TCP connections and plays ``--sessions`` games
+spread across them, each session making random adjacent swaps until its
+moves run out. Requests are pipelined per session (one in flight at a
+time), so a connection carries many sessions at once. At the end it
+prints the move latency distribution, throughput, and the CPU time the
+server workers spent, from which sessions per core follow.
+
+Usage:
+    python server.py --port 8765 &
+    python loadgen.py --port 8765 --connections 16 --sessions 2000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from server import HOST, PORT, encode
+
+
+class Connection:
+    """One client connection multiplexing many sessions by request id."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending = {}  # request id -> future
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+        return cls(reader, writer)
+
+    async def receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.pending.pop(response.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, **request):
+        request_id = request["id"] = next(self.ids)
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(encode(request))
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        self.receiver.cancel()
+
+
+def adjacent_swap(rng, size):
+    r, c = rng.randrange(size), rng.randrange(size)
+    if rng.random() < 0.5:
+        c = min(c, size - 2)
+        return [r, c], [r, c + 1]
+    r = min(r, size - 2)
+    return [r, c], [r + 1, c]
+
+
+async def play_session(connection, seed, grid_size, latencies, errors, hint_every, player=None):
+    rng = random.Random(seed)
+    options = {"player": player} if player is not None else {}
+    started = await connection.request(op="new", seed=seed, grid_size=grid_size, **options)
+    if "error" in started:
+        errors.append(started["error"])
+        return
+    session = started["session"]
+    moves = started["moves"]
+    while moves > 0:
+        if hint_every and moves % hint_every == 0:
+            await connection.request(op="hint", session=session)
+        pos1, pos2 = adjacent_swap(rng, grid_size)
+        start = time.perf_counter()
+        response = await connection.request(op="move", session=session, **{"from": pos1, "to": pos2})
+        latencies.append(time.perf_counter() - start)
+        if "error" in response:
+            errors.append(response["error"])
+            break
+        moves = response["moves"]
+        if response["over"]:
+            break
+    await connection.request(op="close", session=session)
+
+
+async def server_stats(connections):
+    """Latest stats of each distinct server worker reached through ``connections``."""
+    workers = {}
+    for connection in connections:
+        stats = await connection.request(op="stats")
+        workers[stats["pid"]] = stats
+    return workers
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+async def run(args):
+    connections = [await Connection.open(args.host, args.port) for _ in range(args.connections)]
+    before = await server_stats(connections)
+
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            player = f"bot{i % args.players}" if args.players else None
+            await play_session(connections[i % len(connections)], args.seed + i, args.grid_size,
+                               latencies, errors, args.hint_every, player)
+
+    await asyncio.gather(*(bounded(i) for i in range(args.sessions)))
+    wall = time.perf_counter() - start
+
+    after = await server_stats(connections)
+    for connection in connections:
+        await connection.close()
+
+    latencies.sort()
+    cpu = sum(stats["cpu"] - before.get(pid, {"cpu": stats["cpu"]})["cpu"]
+              for pid, stats in after.items())
+    print(f"Sessions: {args.sessions} ({args.concurrency} concurrent)  Connections: {args.connections}  "
+          f"Server workers seen: {len(after)}")
+    print(f"Moves: {len(latencies)} in {wall:.2f}s ({len(latencies) / wall:.0f} moves/s)  Errors: {len(errors)}")
+    print(f"Move latency ms: p50 {percentile(latencies, 0.5) * 1000:.2f}  "
+          f"p90 {percentile(latencies, 0.9) * 1000:.2f}  p99 {percentile(latencies, 0.99) * 1000:.2f}  "
+          f"max {percentile(latencies, 1.0) * 1000:.2f}")
+    if cpu > 0:
+        print(f"Server CPU: {cpu:.2f}s  ->  {len(latencies) / cpu:.0f} moves per core-second, "
+              f"{args.sessions / cpu:.0f} full games per core-second")
+    if errors:
+        print(f"First error: {errors[0]}")
+    return 0 if not errors else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the Word Crush game server")
+    parser.add_argument("--host", default=HOST, help="server address")
+    parser.add_argument("--port", type=int, default=PORT, help="server TCP port")
+    parser.add_argument("--connections", type=int, default=8, help="TCP connections to open")
+    parser.add_argument("--sessions", type=int, default=1000, help="games to play in total")
+    parser.add_argument("--concurrency", type=int, default=1000, help="games in progress at once")
+    parser.add_argument("--grid-size", type=int, default=6, help="board width and height")
+    parser.add_argument("--hint-every", type=int, default=0, help="ask for a hint every N moves (0: never)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--players", type=int, default=0,
+                        help="submit scores to the leaderboard under this many bot names (0: don't)")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
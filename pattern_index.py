@@ -0,0 +1,52 @@
+"""Wildcard index over the dictionary.
+
+For every word, each of its letters is replaced in turn by ``?`` to form
+a pattern, e.g. CAT gives ``?AT``, ``C?T`` and ``CA?``. The index maps
+each pattern to the letters that complete it and the score of the
+resulting word, so "which letters can go in this slot" is a single dict
+lookup instead of trying every letter against the dictionary.
+
+The index also keeps every pattern cut off right after its slot (``C?``
+for ``C?T``), so a scan can drop a window as soon as the letters before
+the slot cannot start any word.
+"""
+
+WILDCARD = '?'
+
+
+class PatternIndex:
+    """Maps one-slot patterns to ``{letter: word score}``."""
+
+    def __init__(self, words, max_length, letter_scores):
+        self.max_length = max_length
+        self.patterns = {}
+        self.heads = set()
+        for word in words:
+            if not 3 <= len(word) <= max_length:
+                continue
+            score = sum(letter_scores.get(letter, 0) for letter in word)
+            for i, letter in enumerate(word):
+                pattern = word[:i] + WILDCARD + word[i+1:]
+                self.heads.add(pattern[:i+1])
+                completions = self.patterns.get(pattern)
+                if completions is None:
+                    completions = self.patterns[pattern] = {}
+                completions[letter] = score
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def completions(self, pattern):
+        """Letters that complete ``pattern`` into a word, with that word's score."""
+        return self.patterns.get(pattern, {})
+
+    def has_head(self, head):
+        """True if some pattern starts with ``head``, which ends at its slot."""
+        return head in self.heads
+
+    def best_completion(self, pattern):
+        """The highest scoring (letter, score) for ``pattern``, or None."""
+        completions = self.patterns.get(pattern)
+        if not completions:
+            return None
+        return max(completions.items(), key=lambda item: item[1])
@@ -0,0 +1,148 @@
+"""Developer profiling overlay: frame times and hot-path counters.
+
+Functions to measure are registered up front with ``watch`` (timed, as
+game logic or rendering) or ``count`` (calls counted per frame, e.g.
+dictionary lookups or surfaces created). Nothing is wrapped until the
+profiler is enabled: ``enable`` swaps each registered function for an
+instrumented one and ``disable`` puts the original back, so a disabled
+profiler adds no work to any call.
+
+Logic and render time are exclusive: when a logic function calls a draw
+function (a cascade playing its animations), the time inside the draw
+call counts as rendering only. Time outside every watched function (the
+idle wait, event handling) is neither.
+
+Usage:
+    python wordcrush.py --profile      # start with the overlay shown; F3 toggles it
+"""
+import functools
+import time
+from collections import Counter, deque
+
+FRAME_WINDOW = 120  # Frames the overlay statistics cover
+KINDS = ("logic", "render")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Profiler:
+    """Per-frame timings and counters for the functions registered with it."""
+
+    def __init__(self, window=FRAME_WINDOW):
+        self.enabled = False
+        self.watched = []  # (owner, attribute name, wrapper factory, original)
+        self.counter_names = []
+        self.frames = deque(maxlen=window)  # (frame seconds, {kind: seconds}, Counter) per frame
+        self.last = {}  # label -> seconds the last call took
+        self.reset()
+
+    def reset(self):
+        self.frame_start = None
+        self.split = dict.fromkeys(KINDS, 0.0)
+        self.counters = Counter()
+        self.stack = []  # Kinds of the watched calls in progress, innermost last
+        self.mark = 0.0  # When time was last charged to the innermost kind
+
+    def watch(self, owner, name, kind, label=None):
+        """Time calls to ``owner.name`` as ``kind``; ``label`` keeps the duration of the last call."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}")
+        self._register(owner, name, lambda func: self._timed(func, kind, label))
+
+    def count(self, owner, name, counter):
+        """Count calls to ``owner.name`` per frame under ``counter``."""
+        if counter not in self.counter_names:
+            self.counter_names.append(counter)
+        self._register(owner, name, lambda func: self._counted(func, counter))
+
+    def _register(self, owner, name, factory):
+        original = getattr(owner, name)
+        self.watched.append((owner, name, factory, original))
+        if self.enabled:
+            setattr(owner, name, factory(original))
+
+    def enable(self):
+        if not self.enabled:
+            for owner, name, factory, original in self.watched:
+                setattr(owner, name, factory(original))
+            self.enabled = True
+            self.frames.clear()
+            self.reset()
+
+    def disable(self):
+        if self.enabled:
+            for owner, name, _, original in self.watched:
+                setattr(owner, name, original)
+            self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def _timed(self, func, kind, label):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            if self.stack:
+                self.split[self.stack[-1]] += start - self.mark
+            self.stack.append(kind)
+            self.mark = start
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                self.split[self.stack.pop()] += end - self.mark
+                self.mark = end
+                if label:
+                    self.last[label] = end - start
+        return wrapper
+
+    def _counted(self, func, counter):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.counters[counter] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    def frame(self):
+        """Mark the start of a frame, closing the previous one."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frames.append((now - self.frame_start, self.split, self.counters.copy()))
+        self.frame_start = now
+        self.split = dict.fromkeys(KINDS, 0.0)
+        self.counters.clear()
+
+    def summary(self):
+        """Overlay text: one line per statistic, averaged over the frame window."""
+        frames = self.frames
+        count = max(1, len(frames))
+        times = [frame_time * 1000 for frame_time, _, _ in frames]
+        total = sum(times)
+        counters = Counter()
+        for _, _, frame_counters in frames:
+            counters.update(frame_counters)
+        lines = [
+            f"FPS {1000 * len(times) / total if total else 0.0:.1f}",
+            f"frame p50 {percentile(times, 0.5):.1f}  p95 {percentile(times, 0.95):.1f}  "
+            f"p99 {percentile(times, 0.99):.1f} ms",
+            "  ".join(f"{kind} {sum(split[kind] for _, split, _ in frames) * 1000 / count:.1f}"
+                      for kind in KINDS) + " ms/frame",
+        ]
+        lines += [f"{counter} {counters[counter] / count:.1f}/frame" for counter in self.counter_names]
+        lines += [f"last {label} {seconds * 1000:.1f} ms" for label, seconds in sorted(self.last.items())]
+        return lines
+
+
+# Shared by the game loop and everything it instruments
+profiler = Profiler()
@@ -0,0 +1,322 @@
+"""Daily-challenge puzzles with precomputed target scores.
+
+``build`` generates seeded boards and runs a beam search solver on each
+across a process pool. Refills come from the seeded engine RNG, so a
+board and a list of moves always play out the same way, and the best
+move list found for a board can be replayed to the exact same score.
+Boards are kept if the gap between the greedy hint player and the solver
+falls within the difficulty band (a board greedy play already maxes out
+is too easy). Kept boards are assigned to consecutive dates.
+
+The solver keeps the ``--beam`` best positions after every move and
+expands the ``--branching`` best swaps of each. Its score is the best
+known for the board, not a proven optimum (that would mean searching all
+60**10 move lists). Every kept board is checked by replaying its moves.
+
+Puzzles are written to a file of fixed-size records ordered by date, so
+serving the puzzle of a day is one seek into the file. A seed only
+stands for a board under the dictionary and letter config it was solved
+with, so the header keeps a digest of both and the file is refused once
+either changes (rebuild it after retuning or switching word source).
+
+Usage:
+    python puzzles.py build --start 2026-11-01 --days 365 --band 0.15 0.5
+    python puzzles.py show 2026-11-01
+    python wordcrush.py --daily                 # today's puzzle
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from multiprocessing import Pool
+
+from engine import (GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE, TOTAL_MOVES,
+                    load_letter_config, word_list)
+from replay import SELECTION_CODES
+from simulate import greedy_policy
+
+PUZZLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzles.wcd")
+BEAM_WIDTH = 16  # Positions kept after each move
+BRANCHING = 8  # Swaps expanded per position
+DIFFICULTY_BAND = (0.15, 0.5)  # Allowed 1 - greedy score / best score
+
+MAGIC = b"WCDP"
+VERSION = 3  # Also bumped when an engine change alters how a seeded board plays out
+
+# magic, version, moves per puzzle, grid size, first day (proleptic ordinal), puzzle count,
+# dictionary digest, letter config digest
+_HEADER = struct.Struct("<4sBBBII8s8s")
+# seed, grid size, selection rule, best score, greedy score, moves in the best line
+_PUZZLE = struct.Struct("<QBBHHB")
+
+
+def record_struct(moves):
+    """A puzzle record: ``_PUZZLE`` plus two flat cell indices per move, padded to ``moves``."""
+    return struct.Struct(_PUZZLE.format + f"{2 * moves}H")
+
+
+class Puzzle:
+    """One daily puzzle: the board seed and the best known line of play."""
+
+    def __init__(self, seed, grid_size, selection, best_score, greedy_score, best_moves):
+        self.seed = seed
+        self.grid_size = grid_size
+        self.selection = selection
+        self.best_score = best_score
+        self.greedy_score = greedy_score
+        self.best_moves = best_moves  # [(pos1, pos2), ...]
+
+    def difficulty(self):
+        return 1 - self.greedy_score / self.best_score if self.best_score else 0.0
+
+    def engine(self, **options):
+        """A fresh session on this puzzle's board."""
+        return GameEngine(seed=self.seed, grid_size=self.grid_size, selection=self.selection, **options)
+
+
+_dictionary_digest = None
+
+
+def dictionary_digest():
+    """Digest of the words the engine accepts (computed once per process)."""
+    global _dictionary_digest
+    if _dictionary_digest is None:
+        _dictionary_digest = hashlib.sha256("\n".join(sorted(word_list)).encode()).digest()[:8]
+    return _dictionary_digest
+
+
+def letter_config_digest(grid_size):
+    """Digest of the letter generation parameters the engine uses for ``grid_size``."""
+    return hashlib.sha256(json.dumps(load_letter_config(grid_size), sort_keys=True).encode()).digest()[:8]
+
+
+def play_moves(engine, moves):
+    for pos1, pos2 in moves:
+        engine.make_move(pos1, pos2)
+    return engine
+
+
+def greedy_score(seed, grid_size, selection):
+    engine = GameEngine(seed=seed, clock=ManualClock(), grid_size=grid_size, selection=selection)
+    while engine.moves_left > 0:
+        engine.make_move(*greedy_policy(engine, None))
+    return engine.score
+
+
+def solve(engine, beam_width=BEAM_WIDTH, branching=BRANCHING):
+    """Best (score, moves) found by beam search from ``engine`` to the end of its moves.
+
+    Positions are ranked by their score plus the best immediate gain of
+    their next move, which is also the list of swaps they expand.
+    """
+    beam = [(engine, [], engine.find_best_swaps(branching))]
+    best = (engine.score, [])
+    while beam:
+        children = {}
+        for state, moves, swaps in beam:
+            for _, pos1, pos2 in swaps:
+                child = state.copy()
+                child.make_move(pos1, pos2)
+                line = moves + [(pos1, pos2)]
+                if child.score > best[0]:
+                    best = (child.score, line)
+                if child.moves_left <= 0:
+                    continue
+                # Transpositions: the same board and score reached by another line
+                key = (child.score, child.moves_left, tuple(map(tuple, child.grid)))
+                if key not in children:
+                    children[key] = (child, line, child.find_best_swaps(branching))
+        ranked = sorted(children.values(), key=lambda node: node[0].score + node[2][0][0], reverse=True)
+        beam = ranked[:beam_width]
+    return best
+
+
+def evaluate_seed(task):
+    """Pool worker: solve the board of one seed; returns a ``Puzzle``."""
+    seed, grid_size, selection, beam_width, branching = task
+    engine = GameEngine(seed=seed, clock=ManualClock(), grid_size=grid_size, selection=selection)
+    best_score, best_moves = solve(engine, beam_width, branching)
+    return Puzzle(seed, grid_size, selection, best_score, greedy_score(seed, grid_size, selection), best_moves)
+
+
+def verify(puzzle):
+    """True if replaying the puzzle's best line reaches its best score."""
+    engine = puzzle.engine(clock=ManualClock())
+    return play_moves(engine, puzzle.best_moves).score == puzzle.best_score
+
+
+def find_puzzles(count, base_seed=0, grid_size=GRID_SIZE, selection=DEFAULT_SELECTION,
+                 band=DIFFICULTY_BAND, beam_width=BEAM_WIDTH, branching=BRANCHING,
+                 workers=None, max_candidates=None, progress=None):
+    """The first ``count`` seeds from ``base_seed`` on whose boards fall in ``band``.
+
+    Candidates are solved in parallel but accepted in seed order, so the
+    result does not depend on the number of workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_candidates = max_candidates or count * 50
+    tasks = ((seed, grid_size, selection, beam_width, branching)
+             for seed in range(base_seed, base_seed + max_candidates))
+    low, high = band
+    kept = []
+    tried = 0
+    with Pool(workers) as pool:
+        for puzzle in pool.imap(evaluate_seed, tasks, chunksize=1):
+            tried += 1
+            if puzzle.best_score > 0 and low <= puzzle.difficulty() <= high and verify(puzzle):
+                kept.append(puzzle)
+                if progress:
+                    progress(len(kept), tried)
+                if len(kept) == count:
+                    break
+    return kept, tried
+
+
+def write_puzzles(path, first_day, puzzles, moves=TOTAL_MOVES):
+    grid_size = puzzles[0].grid_size if puzzles else GRID_SIZE
+    if any(puzzle.grid_size != grid_size for puzzle in puzzles):
+        raise ValueError("All puzzles in a file must share one grid size")
+    record = record_struct(moves)
+    with open(path + ".tmp", "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, moves, grid_size, first_day.toordinal(), len(puzzles),
+                             dictionary_digest(), letter_config_digest(grid_size)))
+        for puzzle in puzzles:
+            size = puzzle.grid_size
+            cells = [cell for pos1, pos2 in puzzle.best_moves
+                     for cell in (pos1[0] * size + pos1[1], pos2[0] * size + pos2[1])]
+            cells += [0] * (2 * moves - len(cells))
+            f.write(record.pack(puzzle.seed, size, SELECTION_CODES.index(puzzle.selection),
+                                puzzle.best_score, puzzle.greedy_score, len(puzzle.best_moves), *cells))
+    os.replace(path + ".tmp", path)
+
+
+class PuzzleFile:
+    """Read access to a puzzle file; ``puzzle(date)`` is one seek and one read.
+
+    Raises ValueError if the file was built under another dictionary or
+    letter config, whose seeds would deal different boards.
+    """
+
+    def __init__(self, path=PUZZLES_PATH):
+        self.file = open(path, "rb")
+        try:
+            header = self.file.read(_HEADER.size)
+            if header[:4] != MAGIC:
+                raise ValueError(f"{path} is not a Word Crush puzzle file")
+            if len(header) < _HEADER.size:
+                raise ValueError(f"{path} is truncated")
+            if header[4] != VERSION:
+                raise ValueError(f"Unsupported puzzle file version {header[4]}; rebuild {path}")
+            (_, _, self.moves, self.grid_size, first_day, self.count,
+             dictionary, letters) = _HEADER.unpack(header)
+            if dictionary != dictionary_digest():
+                raise ValueError(f"{path} was built with another dictionary; rebuild it")
+            if letters != letter_config_digest(self.grid_size):
+                raise ValueError(f"{path} was built with another letter config; rebuild it")
+        except Exception:
+            self.file.close()
+            raise
+        self.first_day = datetime.date.fromordinal(first_day)
+        self.record = record_struct(self.moves)
+
+    def last_day(self):
+        return self.first_day + datetime.timedelta(days=self.count - 1)
+
+    def puzzle(self, date):
+        """The puzzle for ``date``, or None if the file does not cover it."""
+        index = (date - self.first_day).days
+        if not 0 <= index < self.count:
+            return None
+        self.file.seek(_HEADER.size + index * self.record.size)
+        seed, size, selection, best, greedy, count, *cells = self.record.unpack(self.file.read(self.record.size))
+        moves = [(divmod(cells[2 * i], size), divmod(cells[2 * i + 1], size)) for i in range(count)]
+        return Puzzle(seed, size, SELECTION_CODES[selection], best, greedy, moves)
+
+    def close(self):
+        self.file.close()
+
+
+def daily_puzzle(date=None, path=PUZZLES_PATH):
+    """The puzzle for ``date`` (default today) from ``path``, or None."""
+    puzzles = PuzzleFile(path)
+    try:
+        return puzzles.puzzle(date or datetime.date.today())
+    finally:
+        puzzles.close()
+
+
+def command_build(args):
+    start = time.perf_counter()
+
+    def progress(kept, tried):
+        print(f"\r{kept}/{args.days} puzzles from {tried} boards "
+              f"({time.perf_counter() - start:.0f}s)", end="", flush=True)
+
+    puzzles, tried = find_puzzles(args.days, args.base_seed, args.grid_size, args.selection,
+                                  tuple(args.band), args.beam, args.branching, args.workers,
+                                  progress=progress)
+    print()
+    if len(puzzles) < args.days:
+        print(f"Only {len(puzzles)} of {tried} boards fell in the band {args.band}; widen it or raise --base-seed")
+        return 1
+    write_puzzles(args.output, args.start, puzzles)
+    print(f"Wrote {len(puzzles)} puzzles for {args.start} to "
+          f"{args.start + datetime.timedelta(days=len(puzzles) - 1)} to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def command_show(args):
+    try:
+        puzzles = PuzzleFile(args.puzzles)
+    except ValueError as e:
+        print(e)
+        return 1
+    start = time.perf_counter()
+    puzzle = puzzles.puzzle(args.date)
+    lookup = time.perf_counter() - start
+    if puzzle is None:
+        print(f"No puzzle for {args.date} (file covers {puzzles.first_day} to {puzzles.last_day()})")
+        return 1
+    print(f"{args.date}: seed {puzzle.seed}  Grid: {puzzle.grid_size}x{puzzle.grid_size}  "
+          f"Selection: {puzzle.selection}")
+    print(f"Target: {puzzle.best_score}  Greedy: {puzzle.greedy_score}  Difficulty: {puzzle.difficulty():.2f}  "
+          f"(lookup {lookup * 1e6:.0f} us)")
+    if args.solution:
+        print("Best line: " + "  ".join(f"{pos1}{pos2}" for pos1, pos2 in puzzle.best_moves))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily-challenge puzzle pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="solve boards and write a puzzle file")
+    build.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                       help="date of the first puzzle (YYYY-MM-DD)")
+    build.add_argument("--days", type=int, default=30, help="number of daily puzzles")
+    build.add_argument("--band", type=float, nargs=2, default=DIFFICULTY_BAND, metavar=("LOW", "HIGH"),
+                       help="allowed difficulty, 1 - greedy score / best score")
+    build.add_argument("--base-seed", type=int, default=0, help="first candidate seed")
+    build.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    build.add_argument("--selection", choices=SELECTION_CODES, default=DEFAULT_SELECTION)
+    build.add_argument("--beam", type=int, default=BEAM_WIDTH, help="solver beam width")
+    build.add_argument("--branching", type=int, default=BRANCHING, help="swaps expanded per position")
+    build.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    build.add_argument("--output", default=PUZZLES_PATH, help="puzzle file to write")
+
+    show = commands.add_parser("show", help="print the puzzle of a date")
+    show.add_argument("date", type=datetime.date.fromisoformat, nargs="?", default=datetime.date.today())
+    show.add_argument("--puzzles", default=PUZZLES_PATH, help="puzzle file")
+    show.add_argument("--solution", action="store_true", help="also print the best known line")
+
+    args = parser.parse_args(argv)
+    return {"build": command_build, "show": command_show}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Record and replay Word Crush sessions.
+
+A replay is the engine seed plus the list of player inputs (swaps, hint
+presses, undo and redo) stamped with the game time at which they
+happened. Because all randomness comes from the seeded engine RNG,
+re-applying the inputs reproduces the session exactly.
+
+Each swap also carries the ``undo.MoveDiff`` of the move as it was
+played. Replaying checks its own diffs against them, so a replay
+recorded before a change to the rules or letter generation shows the
+first move that now plays out differently.
+
+Usage:
+    python replay.py session.wcr            # replay headless at full speed and check its diffs
+    python wordcrush.py --replay session.wcr  # replay rendered in real time
+"""
+import struct
+import sys
+import time
+
+from engine import GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE
+from segments import DEFAULT_SCAN_MODE
+from undo import MoveDiff, UndoStack
+
+MAGIC = b"WCRP"
+VERSION = 7  # Bump whenever the engine draws letters differently
+
+# Selection rules by their code in the header; only ever append
+SELECTION_CODES = ("greedy", "optimal")
+# Scan modes by their code in the header; only ever append
+SCAN_CODES = ("classic", "reversed", "diagonal", "all")
+
+EVENT_SWAP = 0
+EVENT_HINT = 1
+EVENT_UNDO = 2
+EVENT_REDO = 3
+
+# magic, version, grid size, selection rule, scan mode, seed
+_HEADER = struct.Struct("<4sBBBBQ")
+# kind, game time in milliseconds
+_EVENT = struct.Struct("<BI")
+# the two swapped cells as flat indices, whether a move diff follows
+_SWAP = struct.Struct("<HHB")
+
+
+class ReplayLog:
+    """Compact log of the inputs of one session."""
+
+    def __init__(self, seed, grid_size=GRID_SIZE, events=None, selection=DEFAULT_SELECTION,
+                 scan=DEFAULT_SCAN_MODE, diffs=None):
+        self.seed = seed
+        self.grid_size = grid_size
+        self.selection = selection
+        self.scan = scan
+        # Each event is (kind, elapsed_ms, pos1, pos2); only swaps have positions
+        self.events = events if events is not None else []
+        # The MoveDiff of each swap, in order; a swap still resolving when recording stopped has none
+        self.diffs = diffs if diffs is not None else []
+
+    def record_swap(self, elapsed, pos1, pos2):
+        self.events.append((EVENT_SWAP, int(elapsed * 1000), tuple(pos1), tuple(pos2)))
+
+    def record_move(self, diff):
+        self.diffs.append(diff)
+
+    def record_hint(self, elapsed):
+        self.events.append((EVENT_HINT, int(elapsed * 1000), None, None))
+
+    def record_undo(self, elapsed):
+        self.events.append((EVENT_UNDO, int(elapsed * 1000), None, None))
+
+    def record_redo(self, elapsed):
+        self.events.append((EVENT_REDO, int(elapsed * 1000), None, None))
+
+    def to_bytes(self):
+        size = self.grid_size
+        parts = [_HEADER.pack(MAGIC, VERSION, size, SELECTION_CODES.index(self.selection),
+                              SCAN_CODES.index(self.scan), self.seed)]
+        swaps = 0
+        for kind, elapsed_ms, pos1, pos2 in self.events:
+            parts.append(_EVENT.pack(kind, elapsed_ms))
+            if kind == EVENT_SWAP:
+                has_diff = swaps < len(self.diffs)
+                parts.append(_SWAP.pack(pos1[0] * size + pos1[1], pos2[0] * size + pos2[1], has_diff))
+                if has_diff:
+                    parts.append(self.diffs[swaps].to_bytes(size))
+                swaps += 1
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, size, selection, scan, seed = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a Word Crush replay")
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        if selection >= len(SELECTION_CODES):
+            raise ValueError(f"Unknown selection rule {selection}")
+        if scan >= len(SCAN_CODES):
+            raise ValueError(f"Unknown scan mode {scan}")
+
+        events = []
+        diffs = []
+        offset = _HEADER.size
+        while offset < len(data):
+            kind, elapsed_ms = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            if kind == EVENT_SWAP:
+                cell1, cell2, has_diff = _SWAP.unpack_from(data, offset)
+                offset += _SWAP.size
+                events.append((kind, elapsed_ms, divmod(cell1, size), divmod(cell2, size)))
+                if has_diff:
+                    diff, offset = MoveDiff.from_bytes(data, offset, size)
+                    diffs.append(diff)
+            elif kind in (EVENT_HINT, EVENT_UNDO, EVENT_REDO):
+                events.append((kind, elapsed_ms, None, None))
+            else:
+                raise ValueError(f"Unknown replay event {kind}")
+        return cls(seed, size, events, SELECTION_CODES[selection], SCAN_CODES[scan], diffs)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def apply_event(engine, event):
+    """Apply one recorded input to ``engine``; undo and redo need its ``history``."""
+    kind, _, pos1, pos2 = event
+    if kind == EVENT_SWAP:
+        engine.make_move(pos1, pos2)
+    elif kind == EVENT_HINT:
+        engine.use_hint()
+    elif kind == EVENT_UNDO:
+        engine.history.undo()
+    elif kind == EVENT_REDO:
+        engine.history.redo()
+
+
+def replay_headless(log, recorder=None):
+    """Re-run a replay without rendering, as fast as possible.
+
+    The engine clock is jumped to each event's recorded game time, so
+    timer expiry behaves exactly as it did in the recorded session.
+    ``recorder`` records the session again, e.g. to compare its diffs.
+    """
+    clock = ManualClock()
+    engine = GameEngine(seed=log.seed, clock=clock, grid_size=log.grid_size, selection=log.selection,
+                        scan=log.scan, recorder=recorder)
+    UndoStack(engine)
+    for event in log.events:
+        clock.set(engine.start_time + engine.paused_time + event[1] / 1000)
+        if engine.is_game_over():
+            break
+        apply_event(engine, event)
+    return engine
+
+
+def first_divergence(recorded, replayed):
+    """Index of the first move whose diffs differ, or None if all recorded moves match."""
+    for i, diff in enumerate(recorded):
+        if i >= len(replayed) or replayed[i] != diff:
+            return i
+    return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python replay.py REPLAY_FILE")
+        return 2
+
+    log = ReplayLog.load(argv[0])
+    check = ReplayLog(log.seed, log.grid_size, selection=log.selection, scan=log.scan)
+    start = time.perf_counter()
+    engine = replay_headless(log, check)
+    duration = time.perf_counter() - start
+
+    print(f"Seed: {log.seed}  Grid: {log.grid_size}x{log.grid_size}  Selection: {log.selection}  "
+          f"Scan: {log.scan}  Events: {len(log.events)}")
+    print(f"Final score: {engine.score}  Moves left: {engine.moves_left}  Hints used: {engine.hints_used}")
+    print(f"Replayed in {duration * 1000:.2f} ms")
+    move = first_divergence(log.diffs, check.diffs)
+    if move is not None:
+        print(f"Move {move + 1} plays out differently than when it was recorded")
+        return 1
+    print(f"All {len(log.diffs)} recorded moves play out the same")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Cascade-aware Monte Carlo evaluation of swaps.
+
+``find_best_swaps`` scores a swap by the words it forms straight away,
+but most points come from what follows: pops, gravity, refills drawn by
+``get_new_letter`` and the chain reactions they trigger. Here each
+candidate swap is played out on copies of the engine with sampled
+refills, and the hint ranks swaps by the mean score gain over those
+rollouts, with a confidence interval.
+
+Every candidate is played with the same refill seeds (common random
+numbers), so differences between swaps are not swamped by sampling
+noise. Sampling runs in rounds until each swap has ``samples`` rollouts
+or the time budget runs out; swaps whose interval falls clearly below
+the leaders are dropped between rounds. Rounds can be spread over a
+process pool.
+
+Usage:
+    python rollouts.py --seed 42 --samples 200 --budget 0.2
+    python rollouts.py --seed 42 --workers 4
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from engine import GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES
+from selection import SELECTION_RULES
+from simulate import adjacent_swaps
+
+SAMPLES = 64  # Rollouts per swap when the budget allows
+TIME_BUDGET = 0.1  # Seconds per evaluation
+ROUND_SIZE = 8  # Rollouts per swap per round
+CONFIDENCE_Z = 1.96  # 95% normal confidence interval
+
+
+class SwapEstimate:
+    """Running mean and variance of the score gain of one swap."""
+
+    def __init__(self, pos1, pos2):
+        self.pos1 = pos1
+        self.pos2 = pos2
+        self.samples = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+
+    def add(self, gain):
+        self.samples += 1
+        delta = gain - self.mean
+        self.mean += delta / self.samples
+        self.m2 += delta * (gain - self.mean)
+
+    def merge(self, other):
+        """Fold in the samples of ``other`` (parallel variance formula)."""
+        if not other.samples:
+            return
+        total = self.samples + other.samples
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.samples * other.samples / total
+        self.mean += delta * other.samples / total
+        self.samples = total
+
+    def stdev(self):
+        return math.sqrt(self.m2 / (self.samples - 1)) if self.samples > 1 else 0.0
+
+    def half_width(self):
+        """Half the width of the confidence interval around ``mean``."""
+        if self.samples < 2:
+            return math.inf
+        return CONFIDENCE_Z * self.stdev() / math.sqrt(self.samples)
+
+    def interval(self):
+        half = self.half_width()
+        return self.mean - half, self.mean + half
+
+
+def rollout_gain(engine, pos1, pos2, rng):
+    """Score gained by playing ``pos1``/``pos2`` and its cascade, with refills drawn from ``rng``."""
+    clone = engine.copy(rng=rng)
+    clone.swap_tiles(pos1, pos2)
+    clone.resolve_cascades()
+    return clone.score - engine.score
+
+
+def run_rollouts(engine, swaps, seeds):
+    """One ``SwapEstimate`` per swap, each sampled once per seed."""
+    # Seeding is slower than restoring a saved state, so seed once per round
+    states = [random.Random(seed).getstate() for seed in seeds]
+    rng = random.Random()
+    estimates = []
+    for pos1, pos2 in swaps:
+        estimate = SwapEstimate(pos1, pos2)
+        for state in states:
+            rng.setstate(state)
+            estimate.add(rollout_gain(engine, pos1, pos2, rng))
+        estimates.append(estimate)
+    return estimates
+
+
+def board_state(engine):
+    """What a pool worker needs to rebuild ``engine``'s board."""
+    return (engine.grid, engine.grid_size, engine.letter_config, engine.selection, engine.scan)
+
+
+def _run_rollouts_remote(task):
+    (grid, grid_size, letter_config, selection, scan), swaps, seeds = task
+    engine = GameEngine(seed=0, clock=ManualClock(), grid_size=grid_size,
+                        letter_config=letter_config, selection=selection, grid=grid, scan=scan)
+    return run_rollouts(engine, swaps, seeds)
+
+
+def estimate_swaps(engine, swaps=None, samples=SAMPLES, time_budget=TIME_BUDGET,
+                   keep=3, round_size=ROUND_SIZE, pool=None, workers=None, seed=None):
+    """Estimate the expected score gain of ``swaps`` (default: all of them).
+
+    Returns ``SwapEstimate`` objects sorted by mean gain, best first. At
+    least one round always runs, so the budget can be overshot by one
+    round. After each round, swaps whose interval lies wholly below the
+    lower bound of the ``keep``-th best are no longer sampled. ``seed``
+    fixes the refill seeds; by default they follow from the session seed
+    and the move number, so the engine's own RNG is never touched.
+    ``workers`` is the size of ``pool`` (default ``os.cpu_count()``, as
+    for ``Pool()``).
+    """
+    if swaps is None:
+        swaps = adjacent_swaps(engine.grid_size)
+    if seed is None:
+        seed = engine.seed * 1000003 + engine.moves_left
+    seed_rng = random.Random(seed)
+    deadline = time.perf_counter() + time_budget
+
+    estimates = {swap: SwapEstimate(*swap) for swap in swaps}
+    live = list(swaps)
+    done = 0
+    while live and done < samples:
+        seeds = [seed_rng.getrandbits(64) for _ in range(min(round_size, samples - done))]
+        if pool is None:
+            results = run_rollouts(engine, live, seeds)
+        else:
+            # Split the swaps into a few chunks per worker
+            state = board_state(engine)
+            chunk = max(1, len(live) // (4 * (workers or os.cpu_count() or 1)))
+            tasks = [(state, live[i:i + chunk], seeds) for i in range(0, len(live), chunk)]
+            results = [estimate for part in pool.map(_run_rollouts_remote, tasks) for estimate in part]
+        for result in results:
+            estimates[(result.pos1, result.pos2)].merge(result)
+        done += len(seeds)
+
+        if time.perf_counter() >= deadline:
+            break
+
+        # Racing: drop swaps that cannot reach the top ``keep``
+        ranked = sorted((estimates[swap] for swap in live), key=lambda e: e.mean, reverse=True)
+        if len(ranked) > keep:
+            cutoff = ranked[keep - 1].interval()[0]
+            live = [swap for swap in live if estimates[swap].interval()[1] >= cutoff]
+
+    return sorted(estimates.values(), key=lambda e: e.mean, reverse=True)
+
+
+def rank_swaps(engine, count=3, **kwargs):
+    """Hint search for ``GameEngine(hint_search=...)``: best swaps by expected gain.
+
+    Returns (expected gain, pos1, pos2) like ``find_best_swaps``, with the
+    gain rounded to one decimal for display.
+    """
+    estimates = estimate_swaps(engine, keep=count, **kwargs)
+    return [(round(e.mean, 1), e.pos1, e.pos2) for e in estimates[:count]]
+
+
+def expected_hints(samples=SAMPLES, time_budget=TIME_BUDGET, pool=None, workers=None):
+    """A ``hint_search`` callable using ``rank_swaps`` with these settings."""
+    return partial(rank_swaps, samples=samples, time_budget=time_budget, pool=pool, workers=workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo evaluation of every swap on a board")
+    parser.add_argument("--seed", type=int, default=0, help="session seed of the board")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                        help="rule for overlapping words")
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                        help="game mode: directions words are read in")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="rollouts per swap")
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET, help="time budget in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (1 runs inline)")
+    parser.add_argument("--top", type=int, default=10, help="swaps to list")
+    args = parser.parse_args(argv)
+
+    engine = GameEngine(seed=args.seed, clock=ManualClock(), grid_size=args.grid_size,
+                        selection=args.selection, scan=args.scan)
+    immediate = {(pos1, pos2): score for score, pos1, pos2 in engine.find_best_swaps(count=None)}
+
+    pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        start = time.perf_counter()
+        estimates = estimate_swaps(engine, samples=args.samples, time_budget=args.budget,
+                                   keep=args.top, pool=pool, workers=args.workers)
+        duration = time.perf_counter() - start
+    finally:
+        if pool is not None:
+            pool.close()
+
+    rollouts = sum(e.samples for e in estimates)
+    print(f"Seed: {args.seed}  Grid: {args.grid_size}x{args.grid_size}  Scan: {args.scan}  "
+          f"Rollouts: {rollouts} in {duration * 1000:.1f} ms ({rollouts / duration:.0f}/s)")
+    print(f"{'swap':<16} {'now':>4} {'expected':>9} {'95% CI':>17} {'n':>5}")
+    for e in estimates[:args.top]:
+        low, high = e.interval()
+        print(f"{str(e.pos1) + str(e.pos2):<16} {immediate[(e.pos1, e.pos2)]:>4} {e.mean:>9.2f} "
+              f"{f'[{low:.2f}, {high:.2f}]':>17} {e.samples:>5}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
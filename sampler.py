@@ -0,0 +1,162 @@
+"""Precomputed letter samplers for tile generation.
+
+``get_new_letter`` picks from one of three distributions depending on the
+letters around the new tile:
+
+- vowel-heavy surroundings (two or more vowels) draw a consonant,
+- surroundings that already contain a common bigram draw a rare consonant,
+- everything else draws from the base distribution, which mixes the
+  forced-vowel chance with the letter pool.
+
+Each distribution is compiled once into a Walker/Vose alias table so a
+draw costs one random number and two list lookups, and the context of a
+given set of neighbours is memoized so classifying it is a dict lookup.
+"""
+import json
+
+# Vowels the forced-vowel draw picks from (Y only counts as a vowel neighbour)
+FORCED_VOWELS = ['A', 'E', 'I', 'O', 'U']
+
+CONTEXT_BASE = 0
+CONTEXT_VOWEL_HEAVY = 1
+CONTEXT_BIGRAM_RISK = 2
+
+
+class AliasTable:
+    """O(1) sampling from a fixed discrete distribution (Vose's alias method)."""
+
+    def __init__(self, weights):
+        items = [(letter, weight) for letter, weight in weights.items() if weight > 0]
+        if not items:
+            raise ValueError("AliasTable needs at least one positive weight")
+        n = len(items)
+        total = sum(weight for _, weight in items)
+
+        self.letters = [letter for letter, _ in items]
+        self.size = n
+        self.prob = [0.0] * n
+        self.alias = list(self.letters)
+
+        scaled = [weight * n / total for _, weight in items]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = self.letters[l]
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        for i in small + large:
+            # Leftovers are 1.0 up to floating point error
+            self.prob[i] = 1.0
+
+    def sample(self, rng):
+        u = rng.random() * self.size
+        i = int(u)
+        return self.letters[i] if u - i < self.prob[i] else self.alias[i]
+
+    def sample_many(self, rng, k):
+        """Draw ``k`` letters at once."""
+        size, letters, prob, alias = self.size, self.letters, self.prob, self.alias
+        rand = rng.random
+        out = []
+        append = out.append
+        for _ in range(k):
+            u = rand() * size
+            i = int(u)
+            append(letters[i] if u - i < prob[i] else alias[i])
+        return out
+
+    def probabilities(self):
+        """The distribution the table samples from, as {letter: probability}."""
+        result = dict.fromkeys(self.letters, 0.0)
+        for i, letter in enumerate(self.letters):
+            result[letter] += self.prob[i] / self.size
+            result[self.alias[i]] += (1.0 - self.prob[i]) / self.size
+        return result
+
+
+class LetterSampler:
+    """Alias tables for every adjacency context of one letter config.
+
+    ``vowels`` is the set of letters that count towards a vowel-heavy
+    neighbourhood (``LETTER_GROUPS['VOWELS']`` in the engine).
+    """
+
+    def __init__(self, letter_config, vowels):
+        self.vowels = vowels = frozenset(vowels)
+        distribution = letter_config["letter_distribution"]
+        vowel_chance = letter_config["vowel_chance"]
+        rare = letter_config["rare_consonants"]
+
+        pool_total = sum(distribution.values())
+        vowel_total = sum(distribution.get(v, 0) for v in FORCED_VOWELS)
+        if not vowel_total:
+            vowel_chance = 0.0
+
+        # Forced vowel with probability vowel_chance, otherwise the whole pool
+        base = {}
+        for letter, count in distribution.items():
+            base[letter] = (1 - vowel_chance) * count / pool_total
+        for vowel in FORCED_VOWELS:
+            if distribution.get(vowel, 0):
+                base[vowel] = base.get(vowel, 0.0) + vowel_chance * distribution[vowel] / vowel_total
+
+        consonants = {letter: count for letter, count in distribution.items() if letter not in vowels}
+
+        self.tables = {
+            CONTEXT_BASE: AliasTable(base),
+            CONTEXT_VOWEL_HEAVY: AliasTable(consonants) if consonants else AliasTable(base),
+        }
+        if rare:
+            # The fallback picks uniformly from the rare consonant list
+            rare_weights = {}
+            for letter in rare:
+                rare_weights[letter] = rare_weights.get(letter, 0) + 1
+            self.tables[CONTEXT_BIGRAM_RISK] = AliasTable(rare_weights)
+
+        # Letters b such that a + b is a common bigram, for each a
+        self.bigram_partners = {}
+        for bigram in letter_config["common_bigrams"]:
+            self.bigram_partners.setdefault(bigram[0], set()).add(bigram[1])
+        self._contexts = {}
+
+    def context(self, adjacent_letters):
+        """Classify the neighbours of a new tile into one of the CONTEXT_* tables."""
+        key = tuple(adjacent_letters)
+        context = self._contexts.get(key)
+        if context is None:
+            context = CONTEXT_BASE
+            if sum(1 for letter in key if letter in self.vowels) >= 2:
+                context = CONTEXT_VOWEL_HEAVY
+            elif CONTEXT_BIGRAM_RISK in self.tables and any(
+                    b in self.bigram_partners.get(a, ()) for a in key for b in key):
+                context = CONTEXT_BIGRAM_RISK
+            self._contexts[key] = context
+        return context
+
+    def sample(self, rng, adjacent_letters=None):
+        if adjacent_letters:
+            return self.tables[self.context(adjacent_letters)].sample(rng)
+        return self.tables[CONTEXT_BASE].sample(rng)
+
+    def sample_many(self, rng, k, adjacent_letters=None):
+        """Draw ``k`` letters that all share the same neighbours (or none)."""
+        context = self.context(adjacent_letters) if adjacent_letters else CONTEXT_BASE
+        return self.tables[context].sample_many(rng, k)
+
+
+_samplers = {}
+
+
+def get_sampler(letter_config, vowels):
+    """Shared ``LetterSampler`` for ``letter_config`` (built once per distinct config)."""
+    key = json.dumps([letter_config, sorted(vowels)], sort_keys=True)
+    sampler = _samplers.get(key)
+    if sampler is None:
+        sampler = _samplers[key] = LetterSampler(letter_config, vowels)
+    return sampler
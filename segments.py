@@ -0,0 +1,190 @@
+"""Precomputed line segment tables for a square board.
+
+Cell (r, c) of an ``size`` x ``size`` board is bit ``r * size + c`` of an
+int, so a set of cells is a single integer: overlap is ``a & b``, union
+is ``a | b`` and emptiness is ``not a``. For every row and column (a
+"line") the table holds the bitmask of each contiguous segment, so the
+scanner turns a (line, start, end) match into its cells with two list
+lookups instead of building position tuples.
+
+Which lines exist depends on the scan directions (see ``SCAN_MODES``).
+Rows and columns always come first (0 .. size-1 and size .. 2*size-1),
+which is the order the engine has always scanned them in; extra
+directions such as diagonals or reversed rows follow. Every line is just
+a sequence of cell indices, so the engine walks one loop over the table
+whatever the mode, and a mode with more directions only costs its extra
+lines.
+"""
+
+
+def _rows(size):
+    return [[r * size + c for c in range(size)] for r in range(size)]
+
+
+def _columns(size):
+    return [[r * size + c for r in range(size)] for c in range(size)]
+
+
+def _diagonals(size):
+    """Down-right diagonals, top-right corner first."""
+    return [[r * size + r + offset for r in range(size) if 0 <= r + offset < size]
+            for offset in range(size - 1, -size, -1)]
+
+
+def _anti_diagonals(size):
+    """Down-left diagonals, top-left corner first."""
+    return [[r * size + total - r for r in range(size) if 0 <= total - r < size]
+            for total in range(2 * size - 1)]
+
+
+# Direction name -> function listing that direction's lines of a board size
+DIRECTIONS = {
+    "across": _rows,
+    "down": _columns,
+    "back": lambda size: [line[::-1] for line in _rows(size)],
+    "up": lambda size: [line[::-1] for line in _columns(size)],
+    "diagonal": _diagonals,
+    "anti-diagonal": _anti_diagonals,
+}
+
+# Game modes: the directions words are read in, rows and columns first
+SCAN_MODES = {
+    "classic": ("across", "down"),
+    "reversed": ("across", "down", "back", "up"),
+    "diagonal": ("across", "down", "diagonal", "anti-diagonal"),
+    "all": ("across", "down", "back", "up", "diagonal", "anti-diagonal"),
+}
+DEFAULT_SCAN_MODE = "classic"
+LINE_NAMES = {"across": "row", "down": "column"}  # Other lines are named after their direction
+MIN_LINE_LENGTH = 3  # Shorter lines (diagonal corners) cannot hold a word
+
+
+class SegmentTable:
+    """Cell indices, line masks and segment masks for one board size and scan mode."""
+
+    def __init__(self, size, mode=DEFAULT_SCAN_MODE):
+        if mode not in SCAN_MODES:
+            raise ValueError(f"Unknown scan mode {mode!r}")
+        self.size = size
+        self.mode = mode
+        self.cell_count = size * size
+        self.full_mask = (1 << self.cell_count) - 1
+        self.cell_positions = [(i // size, i % size) for i in range(self.cell_count)]
+
+        # Cell indices of each line, in reading order, and a name for it
+        self.lines = []
+        self.line_names = []
+        for direction in SCAN_MODES[mode]:
+            for k, cells in enumerate(DIRECTIONS[direction](size)):
+                if len(cells) >= MIN_LINE_LENGTH:
+                    self.lines.append(tuple(cells))
+                    self.line_names.append(f"{LINE_NAMES.get(direction, direction)} {k}")
+        self.line_masks = [sum(1 << i for i in cells) for cells in self.lines]
+        # (r, c) positions of each line, for reading its letters off the grid
+        self.line_positions = [tuple(self.cell_positions[i] for i in cells) for cells in self.lines]
+        # cell_lines[cell] -> [(line, index of the cell in it)]
+        self.cell_lines = [[] for _ in range(self.cell_count)]
+        for line, cells in enumerate(self.lines):
+            for index, cell in enumerate(cells):
+                self.cell_lines[cell].append((line, index))
+
+        # segments[line][start][end] -> bitmask of cells start..end (inclusive)
+        self.segments = []
+        # Position tuples of every segment mask, for callers that want (r, c).
+        # A mask has no direction, so these run forwards (the first line
+        # holding the segment); see ``reading_positions``.
+        self.positions = {}
+        for cells in self.lines:
+            table = []
+            n = len(cells)
+            for start in range(n):
+                row = [0] * n
+                mask = 0
+                for end in range(start, n):
+                    mask |= 1 << cells[end]
+                    row[end] = mask
+                    if mask not in self.positions:
+                        self.positions[mask] = tuple(self.cell_positions[i] for i in cells[start:end + 1])
+                table.append(row)
+            self.segments.append(table)
+
+        # Every adjacent swap in board order (each cell's right, then lower
+        # neighbour), with the lines it changes:
+        # (cell1, cell2, shared, crossing1, crossing2). ``shared`` lists
+        # (line, lower index) for lines holding both cells; ``crossing1``
+        # lists (line, index) for lines through cell1 only, and likewise
+        # ``crossing2``. ``swap_lines`` looks the lines up by cell pair,
+        # in either order.
+        self.swaps = []
+        self.swap_lines = {}
+        for cell in range(self.cell_count):
+            r, c = self.cell_positions[cell]
+            for other, legal in ((cell + 1, c + 1 < size), (cell + size, r + 1 < size)):
+                if not legal:
+                    continue
+                lines1 = dict(self.cell_lines[cell])
+                lines2 = dict(self.cell_lines[other])
+                shared = [(line, min(index, lines2[line])) for line, index in self.cell_lines[cell]
+                          if line in lines2]
+                crossing1 = [(line, index) for line, index in self.cell_lines[cell] if line not in lines2]
+                crossing2 = [(line, index) for line, index in self.cell_lines[other] if line not in lines1]
+                self.swaps.append((cell, other, shared, crossing1, crossing2))
+                self.swap_lines[cell, other] = (shared, crossing1, crossing2)
+                self.swap_lines[other, cell] = (shared, crossing2, crossing1)
+
+    def column_line(self, c):
+        return self.size + c
+
+    def cell_mask(self, pos):
+        return 1 << (pos[0] * self.size + pos[1])
+
+    def dirty_lines(self, dirty):
+        """Ids of the lines that contain at least one cell of ``dirty``."""
+        return [line for line, mask in enumerate(self.line_masks) if mask & dirty]
+
+    def mask_cells(self, mask):
+        """Cell indices set in ``mask``, lowest first."""
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(low.bit_length() - 1)
+            mask ^= low
+        return cells
+
+    def mask_positions(self, mask):
+        """(r, c) positions of the cells in ``mask``."""
+        positions = self.positions.get(mask)
+        if positions is not None:
+            return positions
+        cell_positions = self.cell_positions
+        return tuple(cell_positions[i] for i in self.mask_cells(mask))
+
+    def reading_positions(self, mask, word, grid):
+        """(r, c) positions of the cells in ``mask`` in the order ``word`` reads them on ``grid``.
+
+        A word read backwards or upwards covers the same cells as one read
+        forwards, so its positions are the forward ones reversed.
+        """
+        positions = self.mask_positions(mask)
+        if ''.join([grid[r][c] for r, c in positions]) != word:
+            positions = positions[::-1]
+        return positions
+
+    def positions_mask(self, positions):
+        """Bitmask of an iterable of (r, c) positions."""
+        size = self.size
+        mask = 0
+        for r, c in positions:
+            mask |= 1 << (r * size + c)
+        return mask
+
+
+_tables = {}  # (size, scan mode) -> SegmentTable
+
+
+def get_segment_table(size, mode=DEFAULT_SCAN_MODE):
+    """Shared ``SegmentTable`` for ``size`` x ``size`` boards (built once per size and mode)."""
+    table = _tables.get((size, mode))
+    if table is None:
+        table = _tables[size, mode] = SegmentTable(size, mode)
+    return table
@@ -0,0 +1,325 @@
+"""Rules for choosing which of the words found on the board get popped.
+
+Words found in the same scan may share cells, and a cell can only be
+popped for one word. Each rule takes the scan's (word, cell bitmask)
+pairs (see ``segments``) plus a scoring function and returns the
+non-overlapping subset to pop.
+
+- ``greedy`` keeps the longest words first, skipping any that overlap a
+  word already kept. This is the original rule.
+- ``optimal`` keeps the subset with the highest total score, e.g. two
+  crossing words whose letters are worth more than the one long word
+  that blocks them both. Words cross between lines, so this is a
+  general packing problem. The search is capped at
+  ``MAX_SEARCH_BRANCHES`` per scan. Past the cap it returns the best
+  packing found so far, which is never worse than ``greedy``. On the
+  rare boards dense enough to reach the cap, "optimal" is therefore
+  best-effort. ``max_score_packing`` says whether a result is exact,
+  and ``packing_stats`` counts the searches cut short in this process.
+"""
+from bisect import bisect_left
+
+# Branches the exact search may explore per scan before settling for the
+# best packing found so far (only dense, word-packed boards get near it)
+MAX_SEARCH_BRANCHES = 2000
+
+
+class PackingStats:
+    """Max-score searches run in this process, and how many ran out of budget."""
+
+    def __init__(self):
+        self.searches = 0
+        self.truncated = 0
+
+
+# Shared by every caller in the process
+packing_stats = PackingStats()
+
+
+def select_longest(words, word_score=None):
+    """Longest words first, skipping any that share a cell with one already kept."""
+    words = sorted(words, key=lambda x: len(x[0]), reverse=True)
+    selected = []
+    covered = 0
+    for word, mask in words:
+        if not mask & covered:
+            selected.append((word, mask))
+            covered |= mask
+    return selected
+
+
+def select_max_score(words, word_score):
+    """The non-overlapping subset of ``words`` with the highest total score.
+
+    Best-effort past the search budget; see ``max_score_packing``.
+    """
+    return max_score_packing(words, word_score)[0]
+
+
+def max_score_packing(words, word_score):
+    """(subset, exact): the non-overlapping subset of ``words`` with the highest total score.
+
+    Solves the weighted packing exactly (see ``Packing``) unless the
+    search runs out of budget. Then ``exact`` is False and the subset is
+    the better of the best packing found so far and ``select_longest``.
+    Words are sorted longest first, so boards without overlaps pick the
+    same words as ``select_longest``.
+    """
+    words = sorted(words, key=lambda x: len(x[0]), reverse=True)
+    count = len(words)
+    if count < 2:
+        return words, True
+
+    masks = [mask for _, mask in words]
+    conflicts = [0] * count  # word index -> bitmask of the word indices it overlaps
+    for i in range(count):
+        mask = masks[i]
+        for j in range(i + 1, count):
+            if mask & masks[j]:
+                conflicts[i] |= 1 << j
+                conflicts[j] |= 1 << i
+
+    scores = [word_score(word) for word, _ in words]
+    packing = Packing(conflicts, scores, masks)
+    value, chosen = packing.solve((1 << count) - 1)
+    packing_stats.searches += 1
+    if not packing.exact:
+        packing_stats.truncated += 1
+        # Out of budget: never do worse than the greedy rule
+        longest = select_longest(words)
+        if sum(word_score(word) for word, _ in longest) > value:
+            return longest, False
+    return [words[i] for i in range(count) if chosen >> i & 1], packing.exact
+
+
+class Packing:
+    """Max-score packing over words given as bitmasks of word indices.
+
+    ``conflicts[i]`` is the bitmask of words that overlap word ``i`` and
+    ``masks[i]`` the bitmask of its cells, which lie on a straight line
+    (evenly spaced bits). The search keeps words that cannot lose outright, splits what is left
+    into groups that do not overlap each other, and solves each group by
+    branch and bound: branch on the most-overlapping word (keep it and
+    drop its neighbours, or drop it) and abandon any branch whose upper
+    bound cannot beat the best packing found so far. Group results are
+    memoized, so a group reached through different branches is solved
+    once.
+
+    The search stops after ``budget`` branches; groups still unsolved by
+    then keep the best packing found so far, which is never worse than
+    the per-group greedy one it starts from. ``exact`` is False once that has
+    happened, and a search cut short is not memoized, so it is never
+    reused as if it were exact.
+    """
+
+    def __init__(self, conflicts, scores, masks, budget=MAX_SEARCH_BRANCHES):
+        self.conflicts = conflicts
+        self.scores = scores
+        self.budget = budget
+        self.exact = True  # False once the budget ran out before a search finished
+        self.memo = {}  # group bitmask -> (best score, chosen word bitmask)
+
+        # Words grouped by the line they lie on, for the bound. A word's
+        # cells are evenly spaced bits, so words with the same spacing
+        # that overlap share a line; each line is kept sorted by last cell
+        # with, per word, how many words end before it starts.
+        spacing = {}
+        for i, mask in enumerate(masks):
+            first = mask & -mask
+            second = mask ^ first
+            spacing[i] = (second & -second).bit_length() - first.bit_length()
+        self.lines = []
+        unseen = (1 << len(masks)) - 1
+        while unseen:
+            low = unseen & -unseen
+            i = low.bit_length() - 1
+            line = [i]
+            group = frontier = low
+            while frontier:
+                low = frontier & -frontier
+                frontier ^= low
+                j = low.bit_length() - 1
+                new = conflicts[j] & unseen & ~group
+                while new:
+                    bit = new & -new
+                    new ^= bit
+                    k = bit.bit_length() - 1
+                    if spacing[k] == spacing[i]:
+                        group |= bit
+                        frontier |= bit
+                        line.append(k)
+            unseen &= ~group
+            line.sort(key=lambda k: masks[k].bit_length())
+            ends = [masks[k].bit_length() - 1 for k in line]
+            previous = [bisect_left(ends, (masks[k] & -masks[k]).bit_length() - 1) for k in line]
+            self.lines.append((line, ends, previous))
+        self.line_members = [sum(1 << k for k in line) for line, _, _ in self.lines]
+
+    def solve(self, remaining):
+        """(best score, chosen word bitmask) over the words in ``remaining``."""
+        value, chosen, rest = self.reduce(remaining)
+        for group in self.groups(rest):
+            if group & (group - 1) == 0:
+                group_value, group_chosen = self.scores[group.bit_length() - 1], group
+            else:
+                found = self.memo.get(group)
+                if found is None:
+                    found = self.search(group)
+                    if self.exact:
+                        self.memo[group] = found
+                group_value, group_chosen = found
+            value += group_value
+            chosen |= group_chosen
+        return value, chosen
+
+    def beats_rivals(self, i, rivals):
+        """True if word ``i`` is in some best packing of itself plus ``rivals``.
+
+        That holds when its rivals all overlap each other (so a packing
+        keeps at most one of them) and none of them scores more.
+        """
+        conflicts = self.conflicts
+        score = self.scores[i]
+        bits = rivals
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            j = low.bit_length() - 1
+            if self.scores[j] > score or rivals & ~conflicts[j] != low:
+                return False
+        return True
+
+    def reduce(self, remaining, changed=None):
+        """Keep the words that cannot lose (see ``beats_rivals``).
+
+        A word can only start to qualify once one of its rivals is gone, so
+        only the words in ``changed`` (all of ``remaining`` by default) and
+        the neighbours of words removed on the way are checked. Callers
+        that reduced a superset of ``remaining`` pass the neighbours of
+        what they took out.
+
+        Returns (score kept, words kept, words still undecided).
+        """
+        conflicts = self.conflicts
+        scores = self.scores
+        value = chosen = 0
+        pending = remaining if changed is None else changed & remaining
+        while pending:
+            low = pending & -pending
+            pending ^= low
+            i = low.bit_length() - 1
+            rivals = conflicts[i] & remaining
+            if self.beats_rivals(i, rivals):
+                value += scores[i]
+                chosen |= low
+                remaining &= ~(low | rivals)
+                pending |= self.neighbours(rivals)
+                pending &= remaining
+        return value, chosen, remaining
+
+    def neighbours(self, words):
+        """Bitmask of the words overlapping any word in ``words``."""
+        conflicts = self.conflicts
+        found = 0
+        while words:
+            low = words & -words
+            words ^= low
+            found |= conflicts[low.bit_length() - 1]
+        return found
+
+    def groups(self, remaining):
+        """Split ``remaining`` into connected groups of the overlap graph, as bitmasks."""
+        conflicts = self.conflicts
+        groups = []
+        while remaining:
+            group = frontier = remaining & -remaining
+            while frontier:
+                low = frontier & -frontier
+                frontier ^= low
+                new = conflicts[low.bit_length() - 1] & remaining & ~group
+                group |= new
+                frontier |= new
+            remaining &= ~group
+            groups.append(group)
+        return groups
+
+    def bound(self, remaining):
+        """Upper bound on the best packing of ``remaining``.
+
+        A packing restricted to one line is a set of non-overlapping
+        intervals, so it scores at most the best interval packing of that
+        line's words. Adding up the best of every line bounds the whole.
+        """
+        scores = self.scores
+        total = 0
+        for (order, ends, previous), members in zip(self.lines, self.line_members):
+            if not remaining & members:
+                continue
+            best = [0] * (len(order) + 1)  # best[k]: best packing of the first k words by end
+            for k, i in enumerate(order):
+                best[k + 1] = best[k]
+                if remaining >> i & 1:
+                    keep = scores[i] + best[previous[k]]
+                    if keep > best[k + 1]:
+                        best[k + 1] = keep
+            total += best[-1]
+        return total
+
+    def search(self, group):
+        """Best packing of one connected group, by branch and bound."""
+        # Start from the greedy packing so the bound prunes from the first branch
+        value = chosen = 0
+        covered = 0
+        bits = group
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            if not covered & low:
+                i = low.bit_length() - 1
+                value += self.scores[i]
+                chosen |= low
+                covered |= low | self.conflicts[i]
+        best = [value, chosen]
+        self.branch(group, 0, 0, best)
+        return best[0], best[1]
+
+    def branch(self, remaining, value, chosen, best, changed=None):
+        if self.budget <= 0:
+            self.exact = False
+            return
+        self.budget -= 1
+        kept_value, kept, remaining = self.reduce(remaining, changed)
+        value += kept_value
+        chosen |= kept
+        if remaining and value + self.bound(remaining) > best[0]:
+            groups = self.groups(remaining)
+            if len(groups) > 1:
+                # Independent groups: solve each exactly and add them up
+                rest_value, rest_chosen = self.solve(remaining)
+                value += rest_value
+                chosen |= rest_chosen
+                remaining = 0
+            else:
+                conflicts = self.conflicts
+                pick, best_degree = 0, -1
+                bits = remaining
+                while bits:
+                    low = bits & -bits
+                    bits ^= low
+                    degree = bin(conflicts[low.bit_length() - 1] & remaining).count("1")
+                    if degree > best_degree:
+                        pick, best_degree = low, degree
+                i = pick.bit_length() - 1
+                dropped = pick | conflicts[i] & remaining
+                self.branch(remaining & ~dropped, value + self.scores[i], chosen | pick, best,
+                            self.neighbours(dropped))
+                self.branch(remaining & ~pick, value, chosen, best, conflicts[i])
+                return
+        if not remaining and value > best[0]:
+            best[0], best[1] = value, chosen
+
+
+SELECTION_RULES = {
+    "greedy": select_longest,
+    "optimal": select_max_score,
+}
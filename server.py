@@ -0,0 +1,339 @@
+"""Asyncio game server hosting many independent Word Crush sessions.
+
+Every session is a headless ``GameEngine``; all sessions in a process
+share the one dictionary and the line/pattern caches loaded by
+``engine``. Clients talk newline-delimited JSON over TCP. A connection
+may open any number of sessions and pipeline requests; replies come back
+in request order, each echoing the request's ``id``.
+
+Requests (``op`` plus fields):
+    new    seed?, grid_size?, selection?, scan?, player?  -> session, grid, moves, score, time
+    move   session, from [r, c], to [r, c] -> gained, words, grid, moves, score, over
+    hint   session                         -> swaps [[score, [r, c], [r, c]], ...], hints
+    state  session                         -> grid, moves, score, time, hints, over
+    close  session                         -> closed
+    save   session                         -> snapshot (base64, see ``snapshot``)
+    resume snapshot, player?               -> session, grid, moves, score, time
+    top    grid_size?, limit?              -> games [[player, score], ...], players [[player, best], ...]
+    rank   player, grid_size?              -> rank, best, players (null fields if unranked)
+    stats                                  -> pid, sessions, requests, moves, cpu
+
+Errors come back as ``{"id": ..., "error": "..."}``. Sessions end when
+closed or when the connection that opened them goes away. Sessions
+started with a ``player`` name submit their score to the leaderboard
+when the game ends; the writes are batched off the event loop.
+
+With ``--workers`` the dictionary is loaded once before the worker
+processes fork, so they share its pages instead of each building one.
+
+Usage:
+    python server.py --port 8765
+    python server.py --port 8765 --workers 4    # one process per core, shared port
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import struct
+import sys
+import time
+from multiprocessing import Process
+
+from engine import GameEngine, DEFAULT_SELECTION, GRID_SIZE
+from leaderboard import Leaderboard, LEADERBOARD_PATH
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES
+from selection import SELECTION_RULES
+import snapshot
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_SESSIONS = 100000  # Per worker process
+MAX_GRID_SIZE = 20
+MAX_SEED = 2 ** 63  # Seeds must fit a snapshot and a leaderboard INTEGER column
+MAX_TOP = 100  # Longest leaderboard list a client may ask for
+WRITE_BUFFER_LIMIT = 64 * 1024  # Bytes queued before a connection waits for the client
+
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def grid_rows(engine):
+    return [''.join(row) for row in engine.grid]
+
+
+class ProtocolError(Exception):
+    """A request the server cannot serve; the message goes back to the client."""
+
+
+class GameServer:
+    """Sessions of one worker process and the request handlers that drive them."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, grid_size=GRID_SIZE,
+                 selection=DEFAULT_SELECTION, leaderboard=None, scan=DEFAULT_SCAN_MODE):
+        self.max_sessions = max_sessions
+        self.grid_size = grid_size
+        self.selection = selection
+        self.scan = scan
+        self.leaderboard = Leaderboard(leaderboard) if leaderboard else None
+        self.sessions = {}  # session id -> GameEngine
+        self.players = {}  # session id -> player name, for sessions on the leaderboard
+        self.next_session = 1
+        self.requests = 0
+        self.moves = 0
+        self.handlers = {
+            "new": self.handle_new,
+            "move": self.handle_move,
+            "hint": self.handle_hint,
+            "state": self.handle_state,
+            "close": self.handle_close,
+            "save": self.handle_save,
+            "resume": self.handle_resume,
+            "top": self.handle_top,
+            "rank": self.handle_rank,
+            "stats": self.handle_stats,
+        }
+
+    def session(self, request, owned):
+        sid = request.get("session")
+        if not isinstance(sid, int) or sid not in owned:
+            raise ProtocolError(f"unknown session {sid!r}")
+        return self.sessions[sid]
+
+    def handle(self, request, owned):
+        """Serve one decoded request for a connection owning the sessions in ``owned``."""
+        self.requests += 1
+        op = request.get("op")
+        handler = self.handlers.get(op) if isinstance(op, str) else None
+        if handler is None:
+            raise ProtocolError(f"unknown op {request.get('op')!r}")
+        return handler(request, owned)
+
+    def handle_new(self, request, owned):
+        if len(self.sessions) >= self.max_sessions:
+            raise ProtocolError("server full")
+        grid_size = request.get("grid_size", self.grid_size)
+        selection = request.get("selection", self.selection)
+        scan = request.get("scan", self.scan)
+        seed = request.get("seed")
+        if not isinstance(grid_size, int) or not 3 <= grid_size <= MAX_GRID_SIZE:
+            raise ProtocolError(f"bad grid_size {grid_size!r}")
+        if not isinstance(selection, str) or selection not in SELECTION_RULES:
+            raise ProtocolError(f"bad selection {selection!r}")
+        if not isinstance(scan, str) or scan not in SCAN_MODES:
+            raise ProtocolError(f"bad scan {scan!r}")
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)
+                                 or not 0 <= seed < MAX_SEED):
+            raise ProtocolError(f"bad seed {seed!r}")
+        player = self.player(request)
+        engine = GameEngine(seed=seed, grid_size=grid_size, selection=selection, scan=scan)
+        return self.add_session(engine, player, owned)
+
+    def player(self, request):
+        player = request.get("player")
+        if player is not None and not (isinstance(player, str) and 0 < len(player) <= 64):
+            raise ProtocolError(f"bad player {player!r}")
+        return player
+
+    def add_session(self, engine, player, owned):
+        sid = self.next_session
+        self.next_session += 1
+        self.sessions[sid] = engine
+        if player is not None and self.leaderboard is not None:
+            self.players[sid] = player
+        owned.add(sid)
+        return {"session": sid, "seed": engine.seed, "grid": grid_rows(engine),
+                "moves": engine.moves_left, "score": engine.score, "time": engine.remaining_time()}
+
+    def handle_move(self, request, owned):
+        engine = self.session(request, owned)
+        try:
+            pos1 = tuple(request["from"])
+            pos2 = tuple(request["to"])
+            size = engine.grid_size
+            if (len(pos1) != 2 or len(pos2) != 2
+                    or not all(isinstance(x, int) and 0 <= x < size for x in pos1 + pos2)):
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ProtocolError("move needs from and to as [row, col] on the board")
+        before = engine.score
+        steps = engine.make_move(pos1, pos2)
+        if steps is None:
+            raise ProtocolError("move not allowed")
+        self.moves += 1
+        over = engine.is_game_over()
+        if over:
+            self.submit_score(request["session"], engine)
+        return {"gained": engine.score - before, "words": [[word for word, _ in step] for step in steps],
+                "grid": grid_rows(engine), "moves": engine.moves_left, "score": engine.score,
+                "over": over}
+
+    def submit_score(self, sid, engine):
+        """Queue a finished session's score, once, if it was started with a player name."""
+        player = self.players.pop(sid, None)
+        if player is not None:
+            self.leaderboard.submit(player, engine.score, engine.grid_size, engine.seed, engine.selection)
+
+    def handle_hint(self, request, owned):
+        engine = self.session(request, owned)
+        swaps = engine.use_hint()
+        if swaps is None:
+            raise ProtocolError("no hints left")
+        return {"swaps": [[score, list(pos1), list(pos2)] for score, pos1, pos2 in swaps],
+                "hints": engine.hints_used}
+
+    def handle_state(self, request, owned):
+        engine = self.session(request, owned)
+        return {"grid": grid_rows(engine), "moves": engine.moves_left, "score": engine.score,
+                "time": engine.remaining_time(), "hints": engine.hints_used,
+                "over": engine.is_game_over()}
+
+    def handle_close(self, request, owned):
+        self.session(request, owned)
+        sid = request["session"]
+        owned.discard(sid)
+        engine = self.sessions.pop(sid)
+        if engine.is_game_over():
+            self.submit_score(sid, engine)  # Timed out without a final move
+        self.players.pop(sid, None)
+        return {"closed": sid}
+
+    def handle_save(self, request, owned):
+        engine = self.session(request, owned)
+        return {"snapshot": base64.b64encode(snapshot.to_bytes(engine)).decode()}
+
+    def handle_resume(self, request, owned):
+        """Continue a session saved by ``save``, possibly on another worker."""
+        if len(self.sessions) >= self.max_sessions:
+            raise ProtocolError("server full")
+        player = self.player(request)
+        try:
+            data = base64.b64decode(request["snapshot"], validate=True)
+            engine = snapshot.from_bytes(data, max_grid_size=MAX_GRID_SIZE)
+        except (KeyError, TypeError, ValueError, binascii.Error, struct.error) as e:
+            raise ProtocolError(f"bad snapshot ({e})")
+        return self.add_session(engine, player, owned)
+
+    def board_size(self, request):
+        grid_size = request.get("grid_size", self.grid_size)
+        if not isinstance(grid_size, int):
+            raise ProtocolError(f"bad grid_size {grid_size!r}")
+        if self.leaderboard is None:
+            raise ProtocolError("no leaderboard on this server")
+        return grid_size
+
+    def handle_top(self, request, owned):
+        grid_size = self.board_size(request)
+        limit = request.get("limit", 10)
+        if not isinstance(limit, int) or not 0 < limit <= MAX_TOP:
+            raise ProtocolError(f"bad limit {limit!r}")
+        games = self.leaderboard.top_games(limit, grid_size)
+        players = self.leaderboard.top_players(limit, grid_size)
+        return {"games": [[player, score] for player, score, _, _ in games],
+                "players": [[player, best] for player, best, _ in players]}
+
+    def handle_rank(self, request, owned):
+        grid_size = self.board_size(request)
+        player = request.get("player")
+        if not isinstance(player, str):
+            raise ProtocolError(f"bad player {player!r}")
+        rank, best, players = self.leaderboard.rank(player, grid_size) or (None, None, None)
+        return {"rank": rank, "best": best, "players": players}
+
+    def handle_stats(self, request, owned):
+        return {"pid": os.getpid(), "sessions": len(self.sessions), "requests": self.requests,
+                "moves": self.moves, "cpu": time.process_time()}
+
+    async def serve_connection(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    try:
+                        response = self.handle(request, owned)
+                    except ProtocolError as e:
+                        response = {"error": str(e)}
+                    except Exception as e:
+                        # A bug serving one request must not take the connection's sessions with it
+                        print(f"Error serving {request.get('op')!r}: {type(e).__name__}: {e}", file=sys.stderr)
+                        response = {"error": f"internal error ({type(e).__name__})"}
+                else:
+                    request = {}
+                    response = {"error": "request must be a JSON object"}
+                if "id" in request:
+                    response["id"] = request["id"]
+                writer.write(encode(response))
+                # Only wait on slow readers; draining every reply costs a context switch
+                if writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                    await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # Client went away, or sent a line longer than the read limit
+        finally:
+            for sid in owned:
+                self.sessions.pop(sid, None)
+                self.players.pop(sid, None)
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT, reuse_port=False, **kwargs):
+    game_server = GameServer(**kwargs)
+    server = await asyncio.start_server(game_server.serve_connection, host, port,
+                                        reuse_port=reuse_port or None, limit=1 << 16)
+    print(f"Worker {os.getpid()} listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(host, port, reuse_port, kwargs):
+    try:
+        asyncio.run(serve(host, port, reuse_port, **kwargs))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word Crush multi-session game server")
+    parser.add_argument("--host", default=HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="TCP port")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port (SO_REUSEPORT)")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS, help="sessions per worker")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="default board size")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                        help="default rule for overlapping words")
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                        help="default game mode: directions words are read in")
+    parser.add_argument("--leaderboard", metavar="PATH", default=LEADERBOARD_PATH,
+                        help="leaderboard database ('' for none)")
+    args = parser.parse_args(argv)
+
+    kwargs = {"max_sessions": args.max_sessions, "grid_size": args.grid_size,
+              "selection": args.selection, "leaderboard": args.leaderboard, "scan": args.scan}
+    if args.workers == 1:
+        run_worker(args.host, args.port, False, kwargs)
+        return 0
+
+    workers = [Process(target=run_worker, args=(args.host, args.port, True, kwargs))
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Headless self-play simulator for Word Crush.
+
+Plays many games without rendering, spread over a process pool, and
+reports throughput and game statistics. Used to balance the letter
+distribution and to load-test the engine.
+
+A reshuffle plants a word the board's letters can spell one swap away
+(see ``GameEngine.plant_word``) instead of testing random shuffles, and
+the hint search keeps the words of each line string in the shared line
+caches, so dead boards stay cheap. The report counts reshuffles per game
+so their cost shows. Games are independent, so throughput grows with
+``--workers`` up to the core count.
+
+Usage:
+    python simulate.py --games 20000 --policy greedy
+    python simulate.py --games 2000 --policy lookahead --workers 8
+    python simulate.py --games 20000 --selection optimal
+    python simulate.py --games 2000 --scan diagonal
+    python simulate.py --games 2000 --compare-scans   # benchmark every scan mode on the same seeds
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from engine import GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE, line_matches
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES, get_segment_table
+from selection import SELECTION_RULES, packing_stats
+
+LOOKAHEAD_WIDTH = 5  # How many greedy candidates the lookahead policy plays out
+PHASES = ("generate", "policy", "cascade")
+
+
+# ----------------------------------------------------------------------
+# Policies: each takes (engine, rng) and returns the swap to play
+# ----------------------------------------------------------------------
+
+def adjacent_swaps(size):
+    """Every legal swap on a ``size`` x ``size`` board."""
+    swaps = []
+    for r in range(size):
+        for c in range(size):
+            if c + 1 < size:
+                swaps.append(((r, c), (r, c + 1)))
+            if r + 1 < size:
+                swaps.append(((r, c), (r + 1, c)))
+    return swaps
+
+
+def random_policy(engine, rng):
+    """Play a uniformly random adjacent swap."""
+    return rng.choice(adjacent_swaps(engine.grid_size))
+
+
+def greedy_policy(engine, rng):
+    """Play the swap the hint system ranks first."""
+    _, pos1, pos2 = engine.find_best_swaps(1)[0]
+    return pos1, pos2
+
+
+def lookahead_policy(engine, rng):
+    """Play out the top hint candidates, cascades included, and keep the best.
+
+    Each candidate is scored by the points its full cascade earns plus the
+    best immediate follow-up move on the resulting board.
+    """
+    best = None
+    score = engine.score
+    for _, pos1, pos2 in engine.find_best_swaps(LOOKAHEAD_WIDTH):
+        # Play the candidate on the engine itself and back out of it again
+        diff = engine.try_move(pos1, pos2)
+        value = engine.score - score
+        if engine.moves_left > 0:
+            value += engine.find_best_swaps(1)[0][0]
+        engine.revert_move(diff)
+        if best is None or value > best[0]:
+            best = (value, pos1, pos2)
+    return best[1], best[2]
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "lookahead": lookahead_policy,
+}
+
+
+# ----------------------------------------------------------------------
+# Statistics
+# ----------------------------------------------------------------------
+
+class SimStats:
+    """Aggregated results of a batch of games; batches merge into a total."""
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.words = 0
+        self.reshuffles = 0  # Dead boards reshuffled after a move
+        self.scores = Counter()  # score -> number of games
+        self.cascade_depths = Counter()  # cascade steps per move -> count
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.line_cache_hits = 0
+        self.line_cache_misses = 0
+        self.packing_searches = 0  # Optimal selections solved by search
+        self.packing_truncated = 0  # ... of which ran out of budget
+
+    def merge(self, other):
+        self.games += other.games
+        self.moves += other.moves
+        self.words += other.words
+        self.reshuffles += other.reshuffles
+        self.scores.update(other.scores)
+        self.cascade_depths.update(other.cascade_depths)
+        for phase in PHASES:
+            self.phase_time[phase] += other.phase_time[phase]
+        self.line_cache_hits += other.line_cache_hits
+        self.line_cache_misses += other.line_cache_misses
+        self.packing_searches += other.packing_searches
+        self.packing_truncated += other.packing_truncated
+
+    def to_dict(self):
+        """JSON-friendly form, used to cache results on disk."""
+        return {
+            "games": self.games,
+            "moves": self.moves,
+            "words": self.words,
+            "reshuffles": self.reshuffles,
+            "scores": {str(score): count for score, count in self.scores.items()},
+            "cascade_depths": {str(depth): count for depth, count in self.cascade_depths.items()},
+            "phase_time": dict(self.phase_time),
+            "line_cache_hits": self.line_cache_hits,
+            "line_cache_misses": self.line_cache_misses,
+            "packing_searches": self.packing_searches,
+            "packing_truncated": self.packing_truncated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.games = data["games"]
+        stats.moves = data["moves"]
+        stats.words = data["words"]
+        stats.reshuffles = data.get("reshuffles", 0)
+        stats.scores = Counter({int(score): count for score, count in data["scores"].items()})
+        stats.cascade_depths = Counter({int(depth): count for depth, count in data["cascade_depths"].items()})
+        stats.phase_time.update(data["phase_time"])
+        stats.line_cache_hits = data.get("line_cache_hits", 0)
+        stats.line_cache_misses = data.get("line_cache_misses", 0)
+        stats.packing_searches = data.get("packing_searches", 0)
+        stats.packing_truncated = data.get("packing_truncated", 0)
+        return stats
+
+    def mean_score(self):
+        return sum(score * count for score, count in self.scores.items()) / max(1, self.games)
+
+    def hit_rate(self):
+        """Fraction of moves that formed at least one word."""
+        return 1 - self.cascade_depths[0] / max(1, self.moves)
+
+    def score_percentile(self, fraction):
+        """Score at the given fraction (0..1) of the sorted score distribution."""
+        target = fraction * (self.games - 1)
+        seen = 0
+        for score in sorted(self.scores):
+            seen += self.scores[score]
+            if seen > target:
+                return score
+        return 0
+
+
+def play_game(seed, policy, grid_size=GRID_SIZE, stats=None, letter_config=None,
+              selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+    """Play one headless game to the end and add its results to ``stats``."""
+    stats = stats if stats is not None else SimStats()
+    phase_time = stats.phase_time
+    rng = random.Random(seed ^ 0x5EED)
+
+    start = time.perf_counter()
+    engine = GameEngine(seed=seed, clock=ManualClock(), grid_size=grid_size,
+                        letter_config=letter_config, selection=selection, scan=scan)
+    phase_time["generate"] += time.perf_counter() - start
+
+    while engine.moves_left > 0:
+        start = time.perf_counter()
+        pos1, pos2 = policy(engine, rng)
+        mid = time.perf_counter()
+        steps = engine.make_move(pos1, pos2)
+        phase_time["policy"] += mid - start
+        phase_time["cascade"] += time.perf_counter() - mid
+
+        stats.moves += 1
+        stats.cascade_depths[len(steps)] += 1
+        stats.words += sum(len(words) for words in steps)
+
+    stats.games += 1
+    stats.reshuffles += engine.reshuffles
+    stats.scores[engine.score] += 1
+    return stats
+
+
+def run_batch(args):
+    """Pool worker: play the games for ``seeds`` and return their combined stats."""
+    policy_name, seeds, grid_size, letter_config, selection, scan = args
+    policy = POLICIES[policy_name]
+    stats = SimStats()
+    hits, misses = line_matches.hits, line_matches.misses
+    searches, truncated = packing_stats.searches, packing_stats.truncated
+    for seed in seeds:
+        play_game(seed, policy, grid_size, stats, letter_config, selection, scan)
+    stats.line_cache_hits = line_matches.hits - hits
+    stats.line_cache_misses = line_matches.misses - misses
+    stats.packing_searches = packing_stats.searches - searches
+    stats.packing_truncated = packing_stats.truncated - truncated
+    return stats
+
+
+def make_batches(games, policy_name, base_seed=0, grid_size=GRID_SIZE,
+                 batch_size=500, letter_config=None, selection=DEFAULT_SELECTION,
+                 scan=DEFAULT_SCAN_MODE):
+    """Split ``games`` seeded games into ``run_batch`` tasks."""
+    return [(policy_name, range(base_seed + start, base_seed + min(games, start + batch_size)),
+             grid_size, letter_config, selection, scan)
+            for start in range(0, games, batch_size)]
+
+
+def run_simulation(games, policy_name="greedy", workers=None, base_seed=0,
+                   grid_size=GRID_SIZE, batch_size=None, letter_config=None,
+                   selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+    """Play ``games`` games across a process pool and return the merged stats."""
+    workers = workers or os.cpu_count() or 1
+    if batch_size is None:
+        # A few batches per worker keeps the pool balanced without much IPC
+        batch_size = max(1, min(500, math.ceil(games / (workers * 4))))
+
+    batches = make_batches(games, policy_name, base_seed, grid_size, batch_size, letter_config,
+                           selection, scan)
+
+    total = SimStats()
+    if workers == 1:
+        for batch in batches:
+            total.merge(run_batch(batch))
+    else:
+        with Pool(workers) as pool:
+            for stats in pool.imap_unordered(run_batch, batches):
+                total.merge(stats)
+    return total
+
+
+def print_report(stats, wall_time, workers):
+    games = max(1, stats.games)
+    moves = max(1, stats.moves)
+    mean = stats.mean_score()
+    variance = sum(count * (score - mean) ** 2 for score, count in stats.scores.items()) / games
+
+    print(f"Games: {stats.games}  Workers: {workers}  Wall time: {wall_time:.2f}s")
+    print(f"Throughput: {stats.games / wall_time:.1f} games/s ({stats.games / wall_time * 60:.0f} games/min)")
+    print()
+    print("Score distribution:")
+    print(f"  mean {mean:.2f}  stdev {math.sqrt(variance):.2f}  min {min(stats.scores, default=0)}  "
+          f"p50 {stats.score_percentile(0.5)}  p90 {stats.score_percentile(0.9)}  "
+          f"p99 {stats.score_percentile(0.99)}  max {max(stats.scores, default=0)}")
+    print(f"Words per game: {stats.words / games:.2f}  Scoring moves: {100 * stats.hit_rate():.1f}%  "
+          f"Reshuffles per game: {stats.reshuffles / games:.2f}")
+    if stats.packing_searches:
+        print(f"Optimal selections cut short by the search budget: {stats.packing_truncated} "
+              f"of {stats.packing_searches} searches (best found kept)")
+    print()
+    print("Cascade depth per move:")
+    for depth in sorted(stats.cascade_depths):
+        count = stats.cascade_depths[depth]
+        bar = "#" * max(1, int(40 * count / moves)) if count else ""
+        print(f"  {depth:>3}: {count:>9} ({100 * count / moves:5.1f}%) {bar}")
+    print()
+    lookups = max(1, stats.line_cache_hits + stats.line_cache_misses)
+    print(f"Line match cache: {stats.line_cache_hits} hits / {stats.line_cache_misses} misses "
+          f"({100 * stats.line_cache_hits / lookups:.1f}% hit rate)")
+    print()
+    print("Per-phase CPU time (summed over workers):")
+    for phase in PHASES:
+        seconds = stats.phase_time[phase]
+        print(f"  {phase:<9} {seconds:8.2f}s  {seconds / games * 1000:8.3f} ms/game")
+
+
+def compare_scans(args):
+    """Play the same seeds in every scan mode and report the cost of each."""
+    print(f"{'Mode':<10} {'Lines':>5} {'Games/s':>8} {'generate':>9} {'policy':>9} {'cascade':>9} "
+          f"{'Mean':>7} {'Scoring':>8}")
+    for scan in SCAN_MODES:
+        start = time.perf_counter()
+        stats = run_simulation(args.games, args.policy, args.workers, args.seed, args.grid_size,
+                               args.batch_size, selection=args.selection, scan=scan)
+        wall_time = time.perf_counter() - start
+        games = max(1, stats.games)
+        phases = " ".join(f"{stats.phase_time[phase] / games * 1000:7.2f}ms" for phase in PHASES)
+        print(f"{scan:<10} {len(get_segment_table(args.grid_size, scan).lines):>5} "
+              f"{stats.games / wall_time:>8.1f} {phases} {stats.mean_score():>7.2f} "
+              f"{100 * stats.hit_rate():>7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Word Crush self-play simulator")
+    parser.add_argument("--games", type=int, default=1000, help="number of games to play")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy", help="move selection policy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    parser.add_argument("--batch-size", type=int, help="games per pool task")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                        help="rule for choosing between overlapping words")
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                        help="game mode: directions words are read in")
+    parser.add_argument("--compare-scans", action="store_true",
+                        help="play the same games in every scan mode and compare their cost")
+    args = parser.parse_args(argv)
+
+    if args.compare_scans:
+        compare_scans(args)
+        return 0
+    start = time.perf_counter()
+    stats = run_simulation(args.games, args.policy, args.workers, args.seed,
+                           args.grid_size, args.batch_size, selection=args.selection, scan=args.scan)
+    print_report(stats, time.perf_counter() - start, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,639 @@
+"""Delta-compressed state streaming for spectators and remote renderers.
+
+A ``StreamEncoder`` observes a ``GameEngine`` and turns every state change
+into a small binary frame: the swapped cells, the words scored (with the
+new total), the cells that changed after tiles dropped or the board was
+reshuffled, timer pauses and hints. A viewer's first frame carries the
+whole board, as does any update that changes most of it. A ``StateMirror`` applies the frames and exposes the
+attributes the renderer reads from an engine (``grid``, ``score``,
+``moves_left``, ``hints_used``, ``remaining_time()``), so the pygame
+frontend can draw a game running in another process.
+
+Frames travel over a pipe (any binary file) or a socket. ``StreamHub``
+encodes each frame once and fans it out to any number of spectators
+from an asyncio loop on a background thread. A spectator that falls too
+far behind is dropped rather than slowing the game down. When it
+reconnects it gets a fresh keyframe of the current board.
+
+Frame layout (little-endian): payload length u16, kind u8, game time in
+ms u32, send time in us u32 (wall clock modulo 2**32, for latency), then
+the payload of that kind (see the ``_*`` structs below). Cells are flat
+indices ``row * size + col``; word cells are bitmasks as in ``segments``.
+
+Usage:
+    python stream.py play --seed 42 --output - | python stream.py watch -
+    python stream.py play --seed 42 --listen 127.0.0.1:8770 --delay 1
+    python stream.py watch 127.0.0.1:8770
+    python stream.py bench --spectators 200 --games 20
+    python wordcrush.py --stream 127.0.0.1:8770          # then: python wordcrush.py --watch 127.0.0.1:8770
+"""
+import argparse
+import asyncio
+import os
+import random
+import selectors
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Pipe, Process
+
+from engine import GameEngine, ManualClock, DEFAULT_SELECTION, GRID_SIZE, TIMER_START
+from selection import SELECTION_RULES
+
+FRAME_KEY = 0  # Whole board and status
+FRAME_SWAP = 1  # Two cells swapped, a move spent
+FRAME_WORDS = 2  # Words scored; their cells pop
+FRAME_CELLS = 3  # Cells changed (drops, refills, reshuffles)
+FRAME_TIMER = 4  # Timer paused or resumed
+FRAME_HINT = 5  # Hint used, with the recommended swaps
+FRAME_NAMES = ("key", "swap", "words", "cells", "timer", "hint")
+
+# payload length, kind, game time ms, send time us
+_FRAME = struct.Struct("<HBII")
+# grid size, score, moves left, hints used, time limit s, paused
+_KEY = struct.Struct("<BIHBIB")
+# two cells, moves left
+_SWAP = struct.Struct("<HHH")
+# new total score, word count; each word is length u8, letters, cell bitmask
+_WORDS = struct.Struct("<IB")
+_CELL = struct.Struct("<HB")  # cell, letter (0 = empty)
+_COUNT = struct.Struct("<H")
+# hints used, swap count; each swap is score f32, two cells
+_HINT = struct.Struct("<BB")
+_HINT_SWAP = struct.Struct("<fHH")
+
+MAX_MOVES = 0xFFFF  # Largest move count the frames carry
+MAX_TIME_LIMIT = 0xFFFFFFFF  # Largest time limit (s) the frames carry
+
+WRITE_BUFFER_LIMIT = 256 * 1024  # Bytes queued for a spectator before it is dropped
+STREAM_PORT = 8770
+
+
+def send_time():
+    return int(time.time() * 1e6) & 0xFFFFFFFF
+
+
+def pack_frame(kind, game_ms, payload):
+    return _FRAME.pack(len(payload), kind, game_ms & 0xFFFFFFFF, send_time()) + payload
+
+
+def pack_keyframe(game_ms, size, score, moves, hints, time_limit, paused, letters):
+    """A KEY frame; ``letters`` is the flat board with None for empty cells."""
+    payload = _KEY.pack(size, score, moves, hints, time_limit, paused)
+    return pack_frame(FRAME_KEY, game_ms, payload + bytes(ord(letter) if letter else 0 for letter in letters))
+
+
+def mask_bytes(size):
+    return (size * size + 7) // 8
+
+
+class StreamEncoder:
+    """Engine observer that writes each state change as a frame to ``sink(bytes)``.
+
+    It keeps a shadow copy of the board as viewers see it, so dropped and
+    refilled tiles go out as the cells that actually differ. Drops are
+    batched: the changed cells are sent once the next event, or the end of
+    the move, comes along.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.shadow = []
+        self.pending_cells = False
+
+    def attach(self, engine):
+        """Start observing ``engine``, beginning with a keyframe of its board."""
+        if not 0 <= engine.moves_left <= MAX_MOVES:
+            raise ValueError(f"Cannot stream a game of {engine.moves_left} moves (at most {MAX_MOVES})")
+        if not 0 <= engine.time_limit <= MAX_TIME_LIMIT:
+            raise ValueError(f"Cannot stream a game of {engine.time_limit} s (at most {MAX_TIME_LIMIT})")
+        engine.observers.append(self)
+        self.keyframe(engine)
+
+    def game_ms(self, engine):
+        return int(engine.elapsed_time() * 1000)
+
+    def keyframe(self, engine):
+        self.shadow = [letter for row in engine.grid for letter in row]
+        self.pending_cells = False
+        self.sink(pack_keyframe(self.game_ms(engine), engine.grid_size, engine.score, engine.moves_left,
+                                engine.hints_used, engine.time_limit, engine.is_paused, self.shadow))
+
+    def flush_cells(self, engine):
+        if not self.pending_cells:
+            return
+        self.pending_cells = False
+        shadow = self.shadow
+        changes = []
+        i = 0
+        for row in engine.grid:
+            for letter in row:
+                if shadow[i] != letter:
+                    shadow[i] = letter
+                    changes.append(_CELL.pack(i, ord(letter) if letter else 0))
+                i += 1
+        if len(changes) * _CELL.size > _KEY.size + len(shadow):
+            self.keyframe(engine)  # Most of the board changed (a reshuffle); a keyframe is smaller
+        elif changes:
+            self.sink(pack_frame(FRAME_CELLS, self.game_ms(engine), _COUNT.pack(len(changes)) + b"".join(changes)))
+
+    def on_swap(self, engine, pos1, pos2):
+        self.flush_cells(engine)
+        size = engine.grid_size
+        cell1 = pos1[0] * size + pos1[1]
+        cell2 = pos2[0] * size + pos2[1]
+        self.shadow[cell1], self.shadow[cell2] = self.shadow[cell2], self.shadow[cell1]
+        self.sink(pack_frame(FRAME_SWAP, self.game_ms(engine), _SWAP.pack(cell1, cell2, engine.moves_left)))
+
+    def on_words(self, engine, words):
+        self.flush_cells(engine)
+        nbytes = mask_bytes(engine.grid_size)
+        parts = [_WORDS.pack(engine.score, len(words))]
+        for word, mask in words:
+            parts.append(bytes([len(word)]) + word.encode() + mask.to_bytes(nbytes, "little"))
+            for i in range(engine.grid_size * engine.grid_size):
+                if mask >> i & 1:
+                    self.shadow[i] = None
+        self.sink(pack_frame(FRAME_WORDS, self.game_ms(engine), b"".join(parts)))
+
+    def on_cells(self, engine):
+        self.pending_cells = True
+
+    def on_timer(self, engine):
+        self.flush_cells(engine)
+        self.sink(pack_frame(FRAME_TIMER, self.game_ms(engine), bytes([engine.is_paused])))
+
+    def on_hint(self, engine, swaps):
+        self.flush_cells(engine)
+        size = engine.grid_size
+        parts = [_HINT.pack(engine.hints_used, len(swaps))]
+        for score, pos1, pos2 in swaps:
+            parts.append(_HINT_SWAP.pack(score, pos1[0] * size + pos1[1], pos2[0] * size + pos2[1]))
+        self.sink(pack_frame(FRAME_HINT, self.game_ms(engine), b"".join(parts)))
+
+    def on_settled(self, engine):
+        self.flush_cells(engine)
+
+    def on_restore(self, engine):
+        # Undo and redo change the score and moves as well as cells
+        self.keyframe(engine)
+
+
+class StateMirror:
+    """A viewer's copy of the game, rebuilt from frames.
+
+    Reads like a ``GameEngine`` to the renderer. Between frames the timer
+    runs on the local ``clock`` from the game time of the last frame.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or time.monotonic
+        self.grid_size = 0
+        self.grid = []
+        self.score = 0
+        self.moves_left = 0
+        self.hints_used = 0
+        self.time_limit = TIMER_START
+        self.is_paused = False
+        self.synced = False  # Set by the first keyframe; deltas before it are skipped
+        self.game_time = 0.0  # Game time of the last frame, in seconds
+        self.received_at = self.clock()
+        self.hint_swaps = []  # (score, pos1, pos2) of the last hint
+        self.popped = []  # (word, positions) of the last words frame
+
+    def elapsed_time(self):
+        if self.is_paused:
+            return self.game_time
+        return self.game_time + self.clock() - self.received_at
+
+    def remaining_time(self):
+        return max(0, self.time_limit - int(self.elapsed_time()))
+
+    def next_tick(self):
+        if self.is_paused:
+            return None
+        return 1 - self.elapsed_time() % 1
+
+    def is_time_over(self):
+        return int(self.elapsed_time()) >= self.time_limit
+
+    def is_game_over(self):
+        return self.synced and (self.moves_left <= 0 or self.is_time_over())
+
+    def cell(self, i):
+        return divmod(i, self.grid_size)
+
+    def apply(self, kind, game_ms, payload):
+        """Apply one frame. Returns False for a delta received before any keyframe."""
+        if kind == FRAME_KEY:
+            size, self.score, self.moves_left, self.hints_used, self.time_limit, paused = \
+                _KEY.unpack_from(payload)
+            letters = payload[_KEY.size:]
+            self.grid_size = size
+            self.grid = [[chr(b) if b else None for b in letters[r * size:(r + 1) * size]] for r in range(size)]
+            self.is_paused = bool(paused)
+            self.synced = True
+        elif not self.synced:
+            return False
+        elif kind == FRAME_SWAP:
+            cell1, cell2, self.moves_left = _SWAP.unpack_from(payload)
+            (r1, c1), (r2, c2) = self.cell(cell1), self.cell(cell2)
+            self.grid[r1][c1], self.grid[r2][c2] = self.grid[r2][c2], self.grid[r1][c1]
+            self.hint_swaps = []
+        elif kind == FRAME_WORDS:
+            self.score, count = _WORDS.unpack_from(payload)
+            offset = _WORDS.size
+            nbytes = mask_bytes(self.grid_size)
+            self.popped = []
+            for _ in range(count):
+                length = payload[offset]
+                word = payload[offset + 1:offset + 1 + length].decode()
+                offset += 1 + length
+                mask = int.from_bytes(payload[offset:offset + nbytes], "little")
+                offset += nbytes
+                positions = [self.cell(i) for i in range(self.grid_size * self.grid_size) if mask >> i & 1]
+                for r, c in positions:
+                    self.grid[r][c] = None
+                self.popped.append((word, positions))
+        elif kind == FRAME_CELLS:
+            (count,) = _COUNT.unpack_from(payload)
+            for i, letter in _CELL.iter_unpack(payload[_COUNT.size:_COUNT.size + count * _CELL.size]):
+                r, c = self.cell(i)
+                self.grid[r][c] = chr(letter) if letter else None
+        elif kind == FRAME_TIMER:
+            self.is_paused = bool(payload[0])
+        elif kind == FRAME_HINT:
+            self.hints_used, count = _HINT.unpack_from(payload)
+            self.hint_swaps = [(round(score, 1), self.cell(cell1), self.cell(cell2))
+                               for score, cell1, cell2 in
+                               _HINT_SWAP.iter_unpack(payload[_HINT.size:_HINT.size + count * _HINT_SWAP.size])]
+        self.game_time = game_ms / 1000
+        self.received_at = self.clock()
+        return True
+
+    def keyframe(self):
+        """A KEY frame of the mirrored state, for a viewer joining now."""
+        letters = [letter for row in self.grid for letter in row]
+        return pack_keyframe(int(self.elapsed_time() * 1000), self.grid_size, self.score, self.moves_left,
+                             self.hints_used, self.time_limit, self.is_paused, letters)
+
+
+class StreamStats:
+    """Frame counts, bytes and delivery latency seen by one viewer."""
+
+    def __init__(self):
+        self.frames = [0] * len(FRAME_NAMES)
+        self.bytes = [0] * len(FRAME_NAMES)
+        self.latencies = []  # Seconds from send to receipt
+        self.grid_size = 0
+
+    def add(self, kind, size, sent_us, received_us):
+        self.frames[kind] += 1
+        self.bytes[kind] += size
+        self.latencies.append(((received_us - sent_us) & 0xFFFFFFFF) / 1e6)
+
+    def total_frames(self):
+        return sum(self.frames)
+
+    def total_bytes(self):
+        return sum(self.bytes)
+
+    def report(self):
+        lines = []
+        frames = self.total_frames()
+        total = self.total_bytes()
+        if not frames:
+            return "No frames received"
+        # What sending the whole board with every update would have cost
+        keyframe = _FRAME.size + _KEY.size + self.grid_size * self.grid_size
+        lines.append(f"Frames: {frames}  Bytes: {total} ({total / frames:.1f}/frame, "
+                     f"{keyframe * frames / total:.1f}x smaller than full boards)")
+        lines.append("  " + "  ".join(f"{name} {count}/{size}B" for name, count, size
+                                      in zip(FRAME_NAMES, self.frames, self.bytes) if count))
+        latencies = sorted(self.latencies)
+        lines.append(f"Latency ms: p50 {percentile(latencies, 0.5) * 1000:.3f}  "
+                     f"p99 {percentile(latencies, 0.99) * 1000:.3f}  max {latencies[-1] * 1000:.3f}")
+        return "\n".join(lines)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+class FrameReader:
+    """Splits a byte stream into frames and applies them to a mirror."""
+
+    def __init__(self, mirror=None, stats=None):
+        self.mirror = mirror if mirror is not None else StateMirror()
+        self.stats = stats if stats is not None else StreamStats()
+        self.buffer = b""
+
+    def feed(self, data):
+        """Apply every complete frame in ``data`` (plus earlier leftovers). Returns their kinds."""
+        received_us = send_time()
+        buffer = self.buffer + data
+        kinds = []
+        offset = 0
+        while len(buffer) - offset >= _FRAME.size:
+            length, kind, game_ms, sent_us = _FRAME.unpack_from(buffer, offset)
+            end = offset + _FRAME.size + length
+            if end > len(buffer):
+                break
+            if kind >= len(FRAME_NAMES):
+                raise ValueError(f"Unknown stream frame {kind}")
+            if self.mirror.apply(kind, game_ms, buffer[offset + _FRAME.size:end]):
+                self.stats.grid_size = self.mirror.grid_size
+                self.stats.add(kind, end - offset, sent_us, received_us)
+                kinds.append(kind)
+            offset = end
+        self.buffer = buffer[offset:]
+        return kinds
+
+
+# ----------------------------------------------------------------------
+# Transports
+# ----------------------------------------------------------------------
+
+def parse_address(address):
+    """``unix:/path`` or ``host:port`` -> (family, address)."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class StreamHub:
+    """Fans frames out to spectators connecting to ``address``.
+
+    ``publish`` may be called from any thread; the frame is applied to a
+    mirror (for keyframes to late joiners) and written to every spectator
+    from the hub's own event loop thread.
+    """
+
+    def __init__(self, address, write_buffer_limit=WRITE_BUFFER_LIMIT):
+        self.family, self.address = parse_address(address)
+        self.write_buffer_limit = write_buffer_limit
+        self.mirror = StateMirror()
+        self.reader = FrameReader(self.mirror)
+        self.writers = set()
+        self.frames = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            server = asyncio.start_unix_server(self.serve_spectator, self.address)
+        else:
+            server = asyncio.start_server(self.serve_spectator, *self.address)
+        self.server = self.loop.run_until_complete(server)
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def serve_spectator(self, reader, writer):
+        if self.mirror.synced:
+            writer.write(self.mirror.keyframe())
+        self.writers.add(writer)
+        try:
+            await reader.read()  # Spectators only listen; wait for them to leave
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def publish(self, frame):
+        self.loop.call_soon_threadsafe(self.broadcast, frame)
+
+    def broadcast(self, frame):
+        self.reader.feed(frame)
+        self.frames += 1
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > self.write_buffer_limit:
+                # Too far behind; it gets a fresh keyframe if it reconnects
+                self.writers.discard(writer)
+                writer.close()
+                self.dropped += 1
+                continue
+            writer.write(frame)
+            self.bytes_sent += len(frame)
+
+    async def shutdown(self):
+        self.server.close()
+        writers = list(self.writers)
+        for writer in writers:
+            writer.close()  # Sends what is still buffered, then closes
+        await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+class Spectator:
+    """Client side of a hub connection, polled without blocking (e.g. once per rendered frame)."""
+
+    def __init__(self, address, mirror=None):
+        family, target = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(target)
+        self.sock.setblocking(False)
+        self.frames = FrameReader(mirror)
+        self.mirror = self.frames.mirror
+        self.closed = False
+
+    def poll(self):
+        """Apply whatever frames have arrived; returns their kinds."""
+        kinds = []
+        while not self.closed:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            if not data:
+                self.closed = True
+                break
+            kinds.extend(self.frames.feed(data))
+        return kinds
+
+    def close(self):
+        self.sock.close()
+        self.closed = True
+
+
+def read_frames(stream, reader, chunk_size=65536):
+    """Feed ``reader`` from a binary file until EOF, yielding frame kinds as they arrive."""
+    while True:
+        data = stream.read1(chunk_size) if hasattr(stream, "read1") else stream.read(chunk_size)
+        if not data:
+            return
+        yield from reader.feed(data)
+
+
+# ----------------------------------------------------------------------
+# Command line
+# ----------------------------------------------------------------------
+
+def play_streamed(engine, sink, rng, delay=0.0):
+    """Play ``engine`` with the greedy policy, streaming every change to ``sink``."""
+    from simulate import POLICIES
+    policy = POLICIES["greedy"]
+    StreamEncoder(sink).attach(engine)
+    while not engine.is_game_over():
+        pos1, pos2 = policy(engine, rng)
+        if engine.hints_used == 0 and rng.random() < 0.2:
+            engine.use_hint()
+        engine.make_move(pos1, pos2)
+        if delay:
+            time.sleep(delay)
+
+
+def print_board(mirror):
+    for row in mirror.grid:
+        print(" ".join(letter or "." for letter in row))
+    print(f"Score: {mirror.score}  Moves: {mirror.moves_left}  Time: {mirror.remaining_time()}s\n")
+
+
+def command_play(args):
+    engine = GameEngine(seed=args.seed, grid_size=args.grid_size, selection=args.selection)
+    rng = random.Random(engine.seed)
+    if args.listen:
+        hub = StreamHub(args.listen).start()
+        print(f"Streaming seed {engine.seed} on {args.listen}", file=sys.stderr)
+        time.sleep(args.wait)  # Give spectators a moment to join before the first move
+        play_streamed(engine, hub.publish, rng, args.delay)
+        time.sleep(0.1)
+        print(f"Frames: {hub.frames}  Bytes sent: {hub.bytes_sent}  Spectators dropped: {hub.dropped}",
+              file=sys.stderr)
+        hub.close()
+    else:
+        out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+
+        def sink(frame):
+            out.write(frame)
+            out.flush()
+
+        try:
+            play_streamed(engine, sink, rng, args.delay)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    return 0
+
+
+def command_watch(args):
+    if args.source == "-" or os.path.exists(args.source):
+        stream = sys.stdin.buffer if args.source == "-" else open(args.source, "rb")
+        reader = FrameReader()
+        for kind in read_frames(stream, reader):
+            if args.verbose or kind in (FRAME_KEY, FRAME_CELLS):
+                print_board(reader.mirror)
+        stats = reader.stats
+    else:
+        spectator = Spectator(args.source)
+        while not spectator.closed:
+            for kind in spectator.poll():
+                if args.verbose or kind in (FRAME_KEY, FRAME_CELLS):
+                    print_board(spectator.mirror)
+            time.sleep(0.01)
+        stats = spectator.frames.stats
+    print(stats.report())
+    return 0
+
+
+def watch_spectators(address, count, conn):
+    """Spectator process for ``bench``: follow the hub with ``count`` connections until it closes."""
+    spectators = [Spectator(address) for _ in range(count)]
+    conn.send("ready")
+    selector = selectors.DefaultSelector()
+    for spectator in spectators:
+        selector.register(spectator.sock, selectors.EVENT_READ, spectator)
+    open_count = count
+    while open_count:
+        for key, _ in selector.select():
+            spectator = key.data
+            spectator.poll()
+            if spectator.closed:
+                selector.unregister(spectator.sock)
+                open_count -= 1
+    stats = spectators[0].frames.stats
+    for spectator in spectators[1:]:
+        stats.latencies.extend(spectator.frames.stats.latencies)
+    conn.send((stats, [(s.mirror.grid, s.mirror.score) for s in spectators]))
+
+
+def command_bench(args):
+    """Stream games through a hub to ``--spectators`` viewers in another process and report what they saw."""
+    address = args.listen or f"unix:{os.path.join(tempfile.mkdtemp(), 'stream.sock')}"
+    hub = StreamHub(address).start()
+    conn, child_conn = Pipe()
+    viewers = Process(target=watch_spectators, args=(address, args.spectators, child_conn))
+    viewers.start()
+    conn.recv()
+
+    start = time.perf_counter()
+    engine = None
+    for i in range(args.games):
+        engine = GameEngine(seed=args.seed + i, clock=ManualClock(), grid_size=args.grid_size,
+                            selection=args.selection)
+        play_streamed(engine, hub.publish, random.Random(args.seed + i), args.delay)
+    duration = time.perf_counter() - start
+    hub.close()
+    stats, final = conn.recv()
+    viewers.join()
+
+    in_sync = sum(grid == engine.grid and score == engine.score for grid, score in final)
+    print(f"Games: {args.games} in {duration:.2f}s  Spectators: {args.spectators} "
+          f"({in_sync} in sync at the end, {hub.dropped} dropped)")
+    print(f"Hub sent {hub.bytes_sent} bytes ({hub.bytes_sent / max(1, args.spectators) / args.games:.0f} "
+          f"per spectator per game)")
+    print(stats.report())
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream Word Crush state deltas to spectators")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    play = commands.add_parser("play", help="play a greedy game and stream it")
+    play.add_argument("--seed", type=int, help="session seed")
+    play.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    play.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION)
+    play.add_argument("--output", default="-", help="file or - (stdout) to write frames to")
+    play.add_argument("--listen", metavar="ADDR", help="serve spectators on host:port or unix:PATH instead")
+    play.add_argument("--delay", type=float, default=0.0, help="seconds between moves")
+    play.add_argument("--wait", type=float, default=1.0, help="seconds to wait for spectators (--listen)")
+
+    watch = commands.add_parser("watch", help="follow a stream and print the board")
+    watch.add_argument("source", help="host:port, unix:PATH, a frame file, or - (stdin)")
+    watch.add_argument("--verbose", action="store_true", help="print the board after every frame")
+
+    bench = commands.add_parser("bench", help="measure bandwidth and latency with many spectators")
+    bench.add_argument("--spectators", type=int, default=100, help="local spectator connections")
+    bench.add_argument("--games", type=int, default=10, help="games to stream one after another")
+    bench.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    bench.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    bench.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION)
+    bench.add_argument("--delay", type=float, default=0.05, help="seconds between moves")
+    bench.add_argument("--listen", metavar="ADDR", help="hub address (default: a temporary unix socket)")
+
+    args = parser.parse_args(argv)
+    return {"play": command_play, "watch": command_watch, "bench": command_bench}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
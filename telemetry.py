@@ -0,0 +1,434 @@
+"""Structured telemetry: game events as JSON lines, written off the frame loop.
+
+``TelemetryWriter.emit`` only queues an event. A background thread
+encodes queued events in batches, appends them to the log and rotates
+it once it grows past ``max_bytes`` (``telemetry.jsonl`` becomes
+``telemetry.jsonl.1`` and so on, keeping ``backups`` old files). If the
+queue is full the event is dropped and counted rather than waiting for
+the disk, so the game never stalls on telemetry. Events that cannot be
+encoded or written are dropped and counted the same way, so the writer
+keeps running.
+
+Each line is one event: ``{"t": wall time, "event": kind, ...}``. Kinds:
+
+    session     seed, grid_size, selection, scan, words, attempts, fallback
+    move        session, swap, gained, depth, words, score, moves_left, elapsed
+    hint        session, hints_used, best
+    reshuffle   session, reshuffles, attempts (0 if the letters were only shuffled), fallback
+    restore     session, score, moves_left (after a move is undone or redone)
+    frames      frames, p50, p95, max (milliseconds)
+    game_over   session, score, moves_left, hints_used, reshuffles, elapsed
+
+``GameTelemetry`` observes an engine (see ``GameEngine.notify``) and
+emits the session, move, hint, reshuffle and restore events.
+``summary`` folds any number of logs, rotated files included, into
+totals across a process pool.
+
+Usage:
+    python wordcrush.py --telemetry telemetry.jsonl
+    python telemetry.py summary telemetry.jsonl
+    python telemetry.py generate --games 2000 --output /tmp/telemetry.jsonl   # headless games, for testing
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from engine import GameEngine, ManualClock, word_list
+from profiler import percentile
+
+TELEMETRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry.jsonl")
+ROTATE_BYTES = 64 * 1024 * 1024  # Log size that triggers a rotation
+BACKUPS = 5  # Rotated files kept
+MAX_PENDING = 100000  # Queued events before new ones are dropped
+BATCH_SIZE = 1000  # Most events encoded per write
+FLUSH_INTERVAL = 0.5  # Seconds a queued event may wait for more to batch with
+FRAME_SUMMARY_INTERVAL = 10.0  # Seconds of frames folded into each frames event
+READ_CHUNK = 8 * 1024 * 1024  # Bytes of lines parsed per json.loads call when aggregating
+
+
+class TelemetryWriter:
+    """Background thread appending queued events to a rotating JSONL log.
+
+    ``emit`` never blocks; ``flush`` waits until everything emitted so far
+    is written (or dropped) and ``close`` flushes and stops the thread.
+    ``dropped`` counts events lost to a full queue, to a field that is not
+    JSON-encodable or to a failed write.
+    """
+
+    def __init__(self, path, max_bytes=ROTATE_BYTES, backups=BACKUPS, max_pending=MAX_PENDING,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_pending)
+        self.dropped = 0
+        self.written = 0
+        self.rotations = 0
+        self.file = open(path, "ab")
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def emit(self, event, **fields):
+        try:
+            self.queue.put_nowait({"t": round(time.time(), 3), "event": event, **fields})
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                self.queue.task_done()
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            try:
+                self.write_batch(batch)
+            finally:
+                # Whatever went wrong, ``flush`` must return
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                break
+        if self.file is not None:
+            self.file.close()
+
+    def write_batch(self, batch):
+        """Encode and append ``batch``, dropping and counting the events that fail.
+
+        Never raises, so one bad event or a failed write cannot stop the thread.
+        """
+        lines = []
+        for record in batch:
+            try:
+                lines.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            except Exception as e:
+                self.dropped += 1
+                print(f"Could not encode telemetry event {record.get('event')!r} ({type(e).__name__}: {e})",
+                      file=sys.stderr)
+        if not lines:
+            return
+        try:
+            self.write(b"".join(lines))
+            self.written += len(lines)
+        except Exception as e:
+            self.dropped += len(lines)
+            print(f"Could not write {len(lines)} telemetry events ({type(e).__name__}: {e})", file=sys.stderr)
+
+    def write(self, data):
+        if self.file is None:
+            # The last rotation could not reopen the log; try again
+            self.file = open(self.path, "ab")
+        if self.file.tell() and self.file.tell() + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+
+    def rotate(self):
+        """Shift ``path.N`` to ``path.N+1`` (dropping the oldest) and start a new ``path``."""
+        self.file.close()
+        self.file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "ab")
+        self.rotations += 1
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class GameTelemetry:
+    """Engine observer emitting one event per move, hint and reshuffle."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.move = None  # (swap, score before) of the move in progress
+        self.steps = []  # Words popped at each cascade step of that move
+        self.reshuffles = 0
+
+    def attach(self, engine):
+        engine.observers.append(self)
+        self.reshuffles = engine.reshuffles
+        self.writer.emit("session", seed=engine.seed, grid_size=engine.grid_size, selection=engine.selection,
+                         scan=engine.scan, words=len(word_list), attempts=engine.generation_attempts,
+                         fallback=engine.generation_fallback)
+
+    def on_swap(self, engine, pos1, pos2):
+        self.move = ([list(pos1), list(pos2)], engine.score)
+        self.steps = []
+
+    def on_words(self, engine, words):
+        self.steps.append([word for word, _ in words])
+
+    def on_cells(self, engine):
+        pass
+
+    def on_timer(self, engine):
+        pass
+
+    def on_hint(self, engine, swaps):
+        self.writer.emit("hint", session=engine.seed, hints_used=engine.hints_used,
+                         best=swaps[0][0] if swaps else 0)
+
+    def on_settled(self, engine):
+        if engine.reshuffles != self.reshuffles:
+            self.reshuffles = engine.reshuffles
+            self.writer.emit("reshuffle", session=engine.seed, reshuffles=engine.reshuffles,
+                             attempts=engine.generation_attempts, fallback=engine.generation_fallback)
+        if self.move is not None:
+            swap, score = self.move
+            self.writer.emit("move", session=engine.seed, swap=swap, gained=engine.score - score,
+                             depth=len(self.steps), words=[word for step in self.steps for word in step],
+                             score=engine.score, moves_left=engine.moves_left,
+                             elapsed=round(engine.elapsed_time(), 3))
+            self.move = None
+
+    def on_restore(self, engine):
+        self.writer.emit("restore", session=engine.seed, score=engine.score, moves_left=engine.moves_left)
+
+    def game_over(self, engine):
+        self.writer.emit("game_over", session=engine.seed, score=engine.score, moves_left=engine.moves_left,
+                         hints_used=engine.hints_used, reshuffles=engine.reshuffles,
+                         elapsed=round(engine.elapsed_time(), 3))
+
+
+class FrameTimes:
+    """Collects frame durations and emits a ``frames`` summary every ``interval`` seconds."""
+
+    def __init__(self, writer, interval=FRAME_SUMMARY_INTERVAL, clock=time.perf_counter):
+        self.writer = writer
+        self.interval = interval
+        self.clock = clock
+        self.times = []
+        self.last = None
+        self.started = clock()
+
+    def tick(self):
+        """Call once per frame."""
+        now = self.clock()
+        if self.last is not None:
+            self.times.append((now - self.last) * 1000)
+        self.last = now
+        if now - self.started >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.times:
+            self.writer.emit("frames", frames=len(self.times), p50=round(percentile(self.times, 0.5), 2),
+                             p95=round(percentile(self.times, 0.95), 2), max=round(max(self.times), 2))
+        self.times = []
+        self.started = self.clock()
+
+
+# ----------------------------------------------------------------------
+# Offline aggregation
+# ----------------------------------------------------------------------
+
+class TelemetrySummary:
+    """Totals over a set of events; partial summaries merge into one."""
+
+    def __init__(self):
+        self.events = Counter()  # kind -> count
+        self.bad_lines = 0
+        self.gained = 0
+        self.depths = Counter()  # cascade depth -> moves
+        self.words = Counter()  # word -> times scored
+        self.scores = Counter()  # final score -> games
+        self.hints = Counter()  # hints used -> games
+        self.attempts = Counter()  # generation attempts -> grids
+        self.fallbacks = 0
+        self.frames = 0
+        self.frame_p50 = 0.0  # Sum of p50 weighted by frames
+        self.frame_p95 = []  # p95 of each frames event
+        self.frame_max = 0.0
+
+    def add(self, record):
+        kind = record.get("event")
+        self.events[kind] += 1
+        if kind == "move":
+            self.gained += record["gained"]
+            self.depths[record["depth"]] += 1
+            self.words.update(record["words"])
+        elif kind == "game_over":
+            self.scores[record["score"]] += 1
+            self.hints[record["hints_used"]] += 1
+        elif kind in ("session", "reshuffle") and record["attempts"]:
+            self.attempts[record["attempts"]] += 1
+            self.fallbacks += record["fallback"]
+        elif kind == "frames":
+            self.frames += record["frames"]
+            self.frame_p50 += record["p50"] * record["frames"]
+            self.frame_p95.append(record["p95"])
+            self.frame_max = max(self.frame_max, record["max"])
+
+    def merge(self, other):
+        self.events.update(other.events)
+        self.bad_lines += other.bad_lines
+        self.gained += other.gained
+        self.depths.update(other.depths)
+        self.words.update(other.words)
+        self.scores.update(other.scores)
+        self.hints.update(other.hints)
+        self.attempts.update(other.attempts)
+        self.fallbacks += other.fallbacks
+        self.frames += other.frames
+        self.frame_p50 += other.frame_p50
+        self.frame_p95 += other.frame_p95
+        self.frame_max = max(self.frame_max, other.frame_max)
+
+    def report(self):
+        moves = max(1, self.events["move"])
+        games = max(1, sum(self.scores.values()))
+        grids = max(1, sum(self.attempts.values()))
+        lines = [f"Events: {sum(self.events.values())}  "
+                 + "  ".join(f"{kind}: {count}" for kind, count in sorted(self.events.items(), key=str))
+                 + (f"  unreadable lines: {self.bad_lines}" if self.bad_lines else "")]
+        lines.append(f"Moves: {self.events['move']}  mean gain {self.gained / moves:.2f}  "
+                     f"scoring {100 * (1 - self.depths[0] / moves):.1f}%")
+        lines.append("Cascade depth: " + "  ".join(f"{depth}: {count}" for depth, count in sorted(self.depths.items())))
+        if self.scores:
+            mean = sum(score * count for score, count in self.scores.items()) / games
+            lines.append(f"Games: {games}  mean score {mean:.2f}  max {max(self.scores)}  "
+                         f"hints per game {sum(h * c for h, c in self.hints.items()) / games:.2f}")
+        lines.append(f"Grids generated: {sum(self.attempts.values())}  mean attempts "
+                     f"{sum(a * c for a, c in self.attempts.items()) / grids:.2f}  fallbacks {self.fallbacks}")
+        if self.frames:
+            lines.append(f"Frames: {self.frames}  mean p50 {self.frame_p50 / self.frames:.1f} ms  "
+                         f"median p95 {percentile(self.frame_p95, 0.5):.1f} ms  max {self.frame_max:.1f} ms")
+        if self.words:
+            lines.append("Top words: " + "  ".join(f"{word} {count}" for word, count in self.words.most_common(10)))
+        return "\n".join(lines)
+
+
+def log_files(path):
+    """``path`` and its rotated backups, oldest first."""
+    backups = sorted(glob.glob(glob.escape(path) + ".[0-9]*"), key=lambda name: -int(name.rsplit(".", 1)[1]))
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def summarize_file(path):
+    """Pool worker: the summary of one log file.
+
+    Lines are parsed a chunk at a time as one JSON array, which is about
+    twice as fast as one ``json.loads`` per line; a chunk holding a bad
+    line (e.g. one cut short by a crash) is parsed line by line instead.
+    """
+    summary = TelemetrySummary()
+    with open(path, "rb") as f:
+        while True:
+            lines = f.readlines(READ_CHUNK)
+            if not lines:
+                break
+            try:
+                records = json.loads(b"[" + b",".join(lines) + b"]")
+            except ValueError:
+                records = []
+                for line in lines:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        summary.bad_lines += 1
+            for record in records:
+                try:
+                    summary.add(record)
+                except (KeyError, TypeError, AttributeError):
+                    summary.bad_lines += 1
+    return summary
+
+
+def summarize(paths, workers=None):
+    """Summary of every event in ``paths`` (rotated backups included), one file per worker."""
+    files = [name for path in paths for name in log_files(path)]
+    total = TelemetrySummary()
+    if len(files) <= 1 or workers == 1:
+        for name in files:
+            total.merge(summarize_file(name))
+    else:
+        with Pool(min(len(files), workers or os.cpu_count() or 1)) as pool:
+            for summary in pool.imap_unordered(summarize_file, files):
+                total.merge(summary)
+    return total, files
+
+
+def generate(writer, games, base_seed=0):
+    """Play ``games`` headless games with random hint-ranked moves, logging their telemetry."""
+    for seed in range(base_seed, base_seed + games):
+        rng = random.Random(seed)
+        engine = GameEngine(seed=seed, clock=ManualClock())
+        telemetry = GameTelemetry(writer)
+        telemetry.attach(engine)
+        while engine.moves_left > 0:
+            if engine.hints_used < 3 and rng.random() < 0.1:
+                engine.use_hint()
+            _, pos1, pos2 = rng.choice(engine.find_best_swaps(5))
+            engine.make_move(pos1, pos2)
+            engine.clock.advance(rng.uniform(1, 10))
+        telemetry.game_over(engine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word Crush telemetry tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summary", help="aggregate telemetry logs")
+    summary.add_argument("paths", nargs="*", default=[TELEMETRY_PATH], help="logs (rotated backups are included)")
+    summary.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    generate_parser = commands.add_parser("generate", help="log headless games")
+    generate_parser.add_argument("--games", type=int, default=1000)
+    generate_parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    generate_parser.add_argument("--output", default=TELEMETRY_PATH)
+    generate_parser.add_argument("--max-bytes", type=int, default=ROTATE_BYTES, help="rotate past this size")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "generate":
+        writer = TelemetryWriter(args.output, max_bytes=args.max_bytes)
+        generate(writer, args.games, args.seed)
+        writer.close()
+        print(f"Wrote {writer.written} events ({writer.dropped} dropped, {writer.rotations} rotations) "
+              f"in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    total, files = summarize(args.paths, args.workers)
+    if not files:
+        print("No telemetry logs found")
+        return 1
+    duration = time.perf_counter() - start
+    events = sum(total.events.values())
+    print(total.report())
+    print(f"Read {events} events from {len(files)} files in {duration:.2f}s "
+          f"({events / duration if duration else 0:.0f} events/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
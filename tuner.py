@@ -0,0 +1,275 @@
+"""Offline tuner for the letter generation parameters.
+
+Searches over the letter distribution, the common bigram list, the
+forced-vowel chance and the rare-consonant fallback with batched
+self-play simulations, then writes the best parameter set to
+letter_config.json, which the engine loads at startup.
+
+The targets are the mean final score under ``--policy`` and the hit
+rate (fraction of moves that form a word) under ``--hit-policy``. Dead
+boards are reshuffled, so the greedy hint player scores on every move
+whatever the letters; the hit rate is therefore measured on a weaker
+player, random swaps by default, for whom it still depends on the
+config.
+
+Each round mutates the current best parameters into a set of candidates
+and races them with successive halving: every surviving candidate plays
+another batch of games on the same seeds and the worse half is dropped,
+so weak candidates stop early. Simulation results are cached on disk per
+candidate and seed block. The cache key also covers the dictionary, the
+selection rule, the scan mode and ``CACHE_VERSION``, so results from
+another word source or game mode are never reused. Bump
+``CACHE_VERSION`` whenever a change to the engine alters how games play
+out.
+
+Usage:
+    python tuner.py --target-hit-rate 0.2 --target-score 40
+    python tuner.py --grid-size 8 --rounds 20 --policy lookahead
+"""
+import argparse
+import copy
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from engine import (GRID_SIZE, COMMON_BIGRAMS, DEFAULT_SELECTION, LETTER_CONFIG_PATH,
+                    load_letter_config, save_letter_config)
+from puzzles import dictionary_digest
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES
+from selection import SELECTION_RULES
+from simulate import POLICIES, SimStats, make_batches, run_batch
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tuner_cache.jsonl")
+CACHE_VERSION = 3  # Part of every cache key; bump when engine changes alter simulated games
+
+# Extra frequent English pairs the tuner may add to the bigram list
+BIGRAM_CANDIDATES = sorted(COMMON_BIGRAMS | {
+    'ST', 'NG', 'IT', 'IS', 'OU', 'HA', 'EA', 'LE', 'NT', 'SE',
+    'ME', 'VE', 'OF', 'ED', 'LL', 'AS', 'HI', 'RI', 'NE', 'IO'
+})
+# Letters the tuner may use as the "avoid common pairs" fallback
+FALLBACK_CANDIDATES = ['Q', 'X', 'Z', 'J', 'K', 'V', 'W', 'F', 'B']
+
+
+def config_key(config, grid_size, policy_name, seeds, selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+    """Stable cache key for one candidate evaluated on one block of seeds."""
+    payload = json.dumps([CACHE_VERSION, dictionary_digest().hex(), config, grid_size, policy_name,
+                          selection, scan, seeds.start, seeds.stop], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Append-only JSON-lines store of simulation results keyed by ``config_key``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Ignore a line cut short by an interrupted run
+                    self.results[entry["key"]] = SimStats.from_dict(entry["stats"])
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, key, stats):
+        self.results[key] = stats
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "stats": stats.to_dict()}) + "\n")
+
+
+def mutate(config, rng):
+    """Return a randomly perturbed copy of ``config``."""
+    new = copy.deepcopy(config)
+
+    distribution = new["letter_distribution"]
+    for letter in rng.sample(sorted(distribution), k=rng.randint(1, 4)):
+        distribution[letter] = max(1, distribution[letter] + rng.choice((-2, -1, 1, 2)))
+
+    if rng.random() < 0.5:
+        chance = new["vowel_chance"] + rng.uniform(-0.05, 0.05)
+        new["vowel_chance"] = round(min(0.6, max(0.05, chance)), 3)
+
+    if rng.random() < 0.3:
+        bigrams = set(new["common_bigrams"])
+        bigrams ^= {rng.choice(BIGRAM_CANDIDATES)}
+        new["common_bigrams"] = sorted(bigrams)
+
+    if rng.random() < 0.2:
+        rare = set(new["rare_consonants"])
+        letter = rng.choice(FALLBACK_CANDIDATES)
+        if letter in rare and len(rare) > 2:
+            rare.remove(letter)
+        else:
+            rare.add(letter)
+        new["rare_consonants"] = sorted(rare)
+
+    return new
+
+
+def loss(stats, hit_stats, target_hit_rate, target_score):
+    """Squared relative distance from the targets (0 means both are hit exactly).
+
+    The score comes from ``stats`` and the hit rate from ``hit_stats``,
+    the games of the hit policy.
+    """
+    hit_error = (hit_stats.hit_rate() - target_hit_rate) / target_hit_rate
+    score_error = (stats.mean_score() - target_score) / target_score
+    return hit_error ** 2 + score_error ** 2
+
+
+def _run_tagged(task):
+    index, batch = task
+    return index, run_batch(batch)
+
+
+class Tuner:
+    """Races candidate configs against each other with cached, parallel simulations."""
+
+    def __init__(self, pool, cache, grid_size=GRID_SIZE, policy_name="greedy",
+                 games_per_stage=200, stages=3, batch_size=50, base_seed=1_000_000,
+                 hit_policy_name="random", selection=DEFAULT_SELECTION, scan=DEFAULT_SCAN_MODE):
+        self.pool = pool
+        self.cache = cache
+        self.grid_size = grid_size
+        self.policy_name = policy_name
+        self.hit_policy_name = hit_policy_name
+        self.selection = selection
+        self.scan = scan
+        self.games_per_stage = games_per_stage
+        self.stages = stages
+        self.batch_size = batch_size
+        self.base_seed = base_seed
+        self.games_simulated = 0
+
+    def stage_seeds(self, stage):
+        start = self.base_seed + stage * self.games_per_stage
+        return range(start, start + self.games_per_stage)
+
+    def key(self, config, policy_name, seeds):
+        return config_key(config, self.grid_size, policy_name, seeds, self.selection, self.scan)
+
+    def evaluate_stage(self, configs, stage, policy_name):
+        """Simulate one stage of ``policy_name`` games for each config, reusing cached results."""
+        seeds = self.stage_seeds(stage)
+        results = {}
+        tasks = []
+        for index, config in enumerate(configs):
+            cached = self.cache.get(self.key(config, policy_name, seeds))
+            if cached is not None:
+                results[index] = cached
+                continue
+            results[index] = SimStats()
+            for batch in make_batches(len(seeds), policy_name, seeds.start, self.grid_size,
+                                      self.batch_size, config, self.selection, self.scan):
+                tasks.append((index, batch))
+
+        fresh = set()
+        mapper = self.pool.imap_unordered if self.pool else map
+        for index, stats in mapper(_run_tagged, tasks):
+            results[index].merge(stats)
+            fresh.add(index)
+
+        for index in fresh:
+            self.cache.put(self.key(configs[index], policy_name, seeds), results[index])
+            self.games_simulated += results[index].games
+        return [results[index] for index in range(len(configs))]
+
+    def race(self, configs, target_hit_rate, target_score):
+        """Successive halving: return (loss, config, stats, hit stats) of the surviving candidate."""
+        alive = [(config, SimStats(), SimStats()) for config in configs]
+        for stage in range(self.stages):
+            candidates = [config for config, _, _ in alive]
+            stage_stats = self.evaluate_stage(candidates, stage, self.policy_name)
+            stage_hits = self.evaluate_stage(candidates, stage, self.hit_policy_name)
+            for (_, total, hit_total), stats, hit_stats in zip(alive, stage_stats, stage_hits):
+                total.merge(stats)
+                hit_total.merge(hit_stats)
+            alive.sort(key=lambda entry: loss(entry[1], entry[2], target_hit_rate, target_score))
+            if stage < self.stages - 1:
+                alive = alive[:max(1, math.ceil(len(alive) / 2))]
+        config, stats, hit_stats = alive[0]
+        return loss(stats, hit_stats, target_hit_rate, target_score), config, stats, hit_stats
+
+
+def describe(stats, hit_stats):
+    return f"hit rate {hit_stats.hit_rate():.3f}  mean score {stats.mean_score():.2f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune letter generation parameters by simulation")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="board width and height")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy",
+                        help="self-play policy the mean score is measured on")
+    parser.add_argument("--hit-policy", choices=sorted(POLICIES), default="random",
+                        help="self-play policy the hit rate is measured on")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                        help="rule for choosing between overlapping words")
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                        help="game mode: directions words are read in")
+    parser.add_argument("--target-hit-rate", type=float, default=0.2,
+                        help="wanted fraction of hit-policy moves that form at least one word")
+    parser.add_argument("--target-score", type=float, default=40, help="wanted mean final score")
+    parser.add_argument("--rounds", type=int, default=10, help="maximum search rounds")
+    parser.add_argument("--candidates", type=int, default=8, help="new candidates per round")
+    parser.add_argument("--games", type=int, default=200, help="games per candidate per stage")
+    parser.add_argument("--stages", type=int, default=3, help="successive halving stages per round")
+    parser.add_argument("--patience", type=int, default=3, help="stop after this many rounds without improvement")
+    parser.add_argument("--tolerance", type=float, default=0.001, help="stop once the loss is this small")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed for candidate mutations")
+    parser.add_argument("--cache", default=CACHE_PATH, help="result cache file ('' to disable)")
+    parser.add_argument("--output", default=LETTER_CONFIG_PATH, help="config file the game loads")
+    parser.add_argument("--no-write", action="store_true", help="print the result without saving it")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    cache = ResultCache(args.cache)
+    start = time.perf_counter()
+    pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        tuner = Tuner(pool, cache, args.grid_size, args.policy, args.games, args.stages,
+                      hit_policy_name=args.hit_policy, selection=args.selection, scan=args.scan)
+        best_config = copy.deepcopy(load_letter_config(args.grid_size, args.output))
+        best_loss, _, best_stats, best_hits = tuner.race([best_config], args.target_hit_rate, args.target_score)
+        print(f"Starting point: loss {best_loss:.4f}  {describe(best_stats, best_hits)}")
+
+        stale_rounds = 0
+        for round_number in range(1, args.rounds + 1):
+            if best_loss <= args.tolerance or stale_rounds >= args.patience:
+                break
+            candidates = [best_config] + [mutate(best_config, rng) for _ in range(args.candidates)]
+            round_loss, round_config, round_stats, round_hits = tuner.race(
+                candidates, args.target_hit_rate, args.target_score)
+            if round_config is not best_config and round_loss < best_loss:
+                best_loss, best_config, best_stats, best_hits = round_loss, round_config, round_stats, round_hits
+                stale_rounds = 0
+            else:
+                stale_rounds += 1
+            print(f"Round {round_number}: loss {best_loss:.4f}  {describe(best_stats, best_hits)}  "
+                  f"({tuner.games_simulated} games simulated, {time.perf_counter() - start:.1f}s)")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    print()
+    print(json.dumps(best_config, indent=2, sort_keys=True))
+    if not args.no_write:
+        save_letter_config(best_config, args.grid_size, args.output)
+        print(f"Wrote tuned parameters for {args.grid_size}x{args.grid_size} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
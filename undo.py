@@ -0,0 +1,258 @@
+"""Compact per-move diffs, and undo/redo built on them.
+
+A ``MoveDiff`` holds what one move changed instead of a copy of the
+session: the two swapped cells, the cells popped by its cascade, the
+letters of every cell whose letter changed (before and after, in cell
+order) and the points it scored. Swapped, dropped, refilled and
+reshuffled tiles all show up as changed cells, so undoing or redoing a
+move writes those cells back and costs O(changed cells), never a board
+copy. A diff's size is bounded by the board, not by the length of the
+game.
+
+The same diffs serve three purposes:
+
+- ``UndoStack`` gives a session undo and redo, one diff per move.
+- Replays store the diff of every swap next to it (see ``replay``), so a
+  replay shows where a changed engine first plays out differently.
+- Searches back out of a move with ``revert`` instead of copying the
+  engine for every candidate. Their diffs are ``exact``: they also keep
+  the RNG, timer, line scan state and reshuffle counters, so the engine
+  is restored to exactly where it was, draws the same refills for the
+  next candidate and has no lines to rescan. Recorders and observers
+  never hear of a search move.
+
+Undo does not rewind the RNG. Redoing a move puts its own refills back;
+a different move played after an undo draws fresh letters.
+
+Usage:
+    python wordcrush.py                 # Ctrl+Z undoes a move, Ctrl+Y redoes it
+    python undo.py --seed 42            # undo and redo a whole game, with timings
+"""
+import argparse
+import struct
+import sys
+import time
+from collections import deque
+
+UNDO_LIMIT = 100  # Moves kept on an UndoStack; older ones can no longer be undone
+
+# swapped cells, points scored, changed cell count, flags
+_DIFF = struct.Struct("<HHIHB")
+FLAG_RESHUFFLED = 1
+
+
+def mask_bytes(grid_size):
+    return (grid_size * grid_size + 7) // 8
+
+
+class MoveDiff:
+    """What one move changed. See the module docstring."""
+
+    __slots__ = ("cell1", "cell2", "popped", "changed", "before", "after", "score", "reshuffled",
+                 "rng_state", "timer", "scan", "counters")
+
+    def __init__(self, cell1, cell2, popped=0, changed=0, before="", after="", score=0,
+                 reshuffled=False):
+        self.cell1 = cell1
+        self.cell2 = cell2
+        self.popped = popped  # Bitmask of the cells popped by the cascade
+        self.changed = changed  # Bitmask of the cells whose letter differs after the move
+        self.before = before  # Letters of the ``changed`` cells before the move, lowest cell first
+        self.after = after  # ... and after it
+        self.score = score  # Points the move scored
+        self.reshuffled = reshuffled
+        self.rng_state = None  # RNG state before the move, for exact diffs
+        self.timer = None  # (paused_time, is_paused, pause_start_time) before the move, for exact diffs
+        self.scan = None  # (line_words, dirty) before the move, for exact diffs
+        self.counters = None  # (reshuffles, generation_attempts, generation_fallback), for exact diffs
+
+    @classmethod
+    def begin(cls, engine, pos1, pos2, exact=False):
+        """Start the diff of a move on ``engine``, before its swap; ``finish`` it once it settles."""
+        size = engine.grid_size
+        diff = cls(pos1[0] * size + pos1[1], pos2[0] * size + pos2[1], score=engine.score)
+        # Until ``finish``, ``before`` holds the whole board
+        diff.before = "".join(letter for row in engine.grid for letter in row)
+        if exact:
+            diff.rng_state = engine.rng.getstate()
+            diff.timer = (engine.paused_time, engine.is_paused, engine.pause_start_time)
+            diff.scan = (list(engine.line_words), engine.dirty)
+            diff.counters = (engine.reshuffles, engine.generation_attempts, engine.generation_fallback)
+        return diff
+
+    def finish(self, engine, reshuffled=False):
+        board = self.before
+        changed = 0
+        before = []
+        after = []
+        i = 0
+        for row in engine.grid:
+            for letter in row:
+                if letter != board[i]:
+                    changed |= 1 << i
+                    before.append(board[i])
+                    after.append(letter)
+                i += 1
+        self.changed = changed
+        self.before = "".join(before)
+        self.after = "".join(after)
+        self.score = engine.score - self.score
+        self.reshuffled = reshuffled
+        return self
+
+    def positions(self, grid_size):
+        """The swapped cells as (row, col) pairs."""
+        return divmod(self.cell1, grid_size), divmod(self.cell2, grid_size)
+
+    def revert(self, engine):
+        """Put ``engine`` back as it was before the move."""
+        engine.write_cells(self.changed, self.before)
+        engine.score -= self.score
+        engine.moves_left += 1
+        if self.rng_state is not None:
+            engine.rng.setstate(self.rng_state)
+        if self.timer is not None:
+            engine.paused_time, engine.is_paused, engine.pause_start_time = self.timer
+        if self.scan is not None:
+            # The words found on the board before the move still hold; nothing needs rescanning
+            engine.line_words, engine.dirty = self.scan
+        if self.counters is not None:
+            engine.reshuffles, engine.generation_attempts, engine.generation_fallback = self.counters
+
+    def apply(self, engine):
+        """Play the move on ``engine`` again, as it was before ``revert``."""
+        engine.write_cells(self.changed, self.after)
+        engine.score += self.score
+        engine.moves_left -= 1
+
+    def to_bytes(self, grid_size):
+        nbytes = mask_bytes(grid_size)
+        return b"".join([
+            _DIFF.pack(self.cell1, self.cell2, self.score, len(self.before),
+                       FLAG_RESHUFFLED if self.reshuffled else 0),
+            self.popped.to_bytes(nbytes, "little"),
+            self.changed.to_bytes(nbytes, "little"),
+            self.before.encode(),
+            self.after.encode(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data, offset, grid_size):
+        """The diff packed at ``offset`` of ``data`` and the offset just past it."""
+        cell1, cell2, score, count, flags = _DIFF.unpack_from(data, offset)
+        offset += _DIFF.size
+        nbytes = mask_bytes(grid_size)
+        popped = int.from_bytes(data[offset:offset + nbytes], "little")
+        offset += nbytes
+        changed = int.from_bytes(data[offset:offset + nbytes], "little")
+        offset += nbytes
+        before = data[offset:offset + count].decode()
+        offset += count
+        after = data[offset:offset + count].decode()
+        offset += count
+        return cls(cell1, cell2, popped, changed, before, after, score, bool(flags & FLAG_RESHUFFLED)), offset
+
+    def __eq__(self, other):
+        return (isinstance(other, MoveDiff) and self.cell1 == other.cell1 and self.cell2 == other.cell2
+                and self.popped == other.popped and self.changed == other.changed
+                and self.before == other.before and self.after == other.after
+                and self.score == other.score and self.reshuffled == other.reshuffled)
+
+    def __repr__(self):
+        return (f"MoveDiff({self.cell1}, {self.cell2}, score={self.score}, "
+                f"changed={bin(self.changed).count('1')} cells)")
+
+
+class UndoStack:
+    """Undo and redo for the moves of ``engine``.
+
+    Attaching sets ``engine.history``, so the engine hands over the diff
+    of every move it plays. A new move clears the moves left to redo.
+    Undo and redo are recorded by the engine's recorder, if it has one.
+    """
+
+    def __init__(self, engine, limit=UNDO_LIMIT):
+        self.engine = engine
+        self.done = deque(maxlen=limit)
+        self.undone = []
+        engine.history = self
+
+    def record_move(self, diff):
+        self.done.append(diff)
+        self.undone.clear()
+
+    def can_undo(self):
+        return bool(self.done) and not self.engine.is_time_over()
+
+    def can_redo(self):
+        return bool(self.undone) and not self.engine.is_time_over()
+
+    def undo(self):
+        """Take back the last move. Returns its diff, or None if there is nothing to undo."""
+        if not self.can_undo():
+            return None
+        engine = self.engine
+        diff = self.done.pop()
+        if engine.recorder is not None:
+            engine.recorder.record_undo(engine.elapsed_time())
+        engine.revert_move(diff)
+        self.undone.append(diff)
+        return diff
+
+    def redo(self):
+        """Play the last undone move again. Returns its diff, or None if there is nothing to redo."""
+        if not self.can_redo():
+            return None
+        engine = self.engine
+        diff = self.undone.pop()
+        if engine.recorder is not None:
+            engine.recorder.record_redo(engine.elapsed_time())
+        engine.apply_move(diff)
+        self.done.append(diff)
+        return diff
+
+
+def main(argv=None):
+    import random
+    from engine import GameEngine, ManualClock
+
+    parser = argparse.ArgumentParser(description="Play a game, undo every move and redo them all")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--moves", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    engine = GameEngine(seed=args.seed, clock=ManualClock(), total_moves=args.moves)
+    history = UndoStack(engine)
+    rng = random.Random(args.seed)
+    boards = [(engine.score, [row[:] for row in engine.grid])]
+    while engine.moves_left > 0:
+        if rng.random() < 0.5:
+            _, pos1, pos2 = engine.find_best_swaps(1)[0]
+        else:
+            r, c = rng.randrange(engine.grid_size), rng.randrange(engine.grid_size - 1)
+            pos1, pos2 = (r, c), (r, c + 1)
+        engine.make_move(pos1, pos2)
+        boards.append((engine.score, [row[:] for row in engine.grid]))
+
+    moves = len(history.done)
+    cells = sum(len(diff.before) for diff in history.done)
+    size = sum(len(diff.to_bytes(engine.grid_size)) for diff in history.done)
+    start = time.perf_counter()
+    while history.undo() is not None:
+        pass
+    undo_time = time.perf_counter() - start
+    ok = (engine.score, engine.grid) == boards[-1 - moves]  # Only the last UNDO_LIMIT moves can be undone
+    start = time.perf_counter()
+    while history.redo() is not None:
+        pass
+    redo_time = time.perf_counter() - start
+    ok = ok and (engine.score, engine.grid) == boards[-1]
+
+    print(f"{moves} moves, {cells / max(1, moves):.1f} changed cells and {size / max(1, moves):.0f} bytes per diff")
+    print(f"undo {undo_time / max(1, moves) * 1e6:.1f} us/move, redo {redo_time / max(1, moves) * 1e6:.1f} us/move; "
+          f"boards {'match' if ok else 'do not match'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,32 @@
+import argparse
+import datetime
+import os
 import pygame
 import random
+import sys
 import time
 import math
 
+from leaderboard import Leaderboard, LEADERBOARD_PATH
+import engine as engine_module
+from engine_thread import EngineThread, SnapshotPlayer, TRANSITION_TIMES
+from engine import (GameEngine, GRID_SIZE, MAX_HINTS, LETTER_SCORES, DEFAULT_SELECTION,
+                    calculate_word_score)
+from replay import ReplayLog, EVENT_SWAP, EVENT_HINT, EVENT_UNDO, EVENT_REDO
+from rollouts import expected_hints
+import snapshot
+from profiler import profiler
+from puzzles import PuzzleFile, PUZZLES_PATH
+from segments import DEFAULT_SCAN_MODE, SCAN_MODES
+from selection import SELECTION_RULES
+from stream import Spectator, StreamEncoder, StreamHub
+from telemetry import FrameTimes, GameTelemetry, TelemetryWriter
+from undo import UndoStack
+
 pygame.init()
 
 # Game dimensions and layout
 WIDTH, HEIGHT = 600, 700
-GRID_SIZE = 6
 TILE_SIZE = 80
 GRID_WIDTH = GRID_SIZE * TILE_SIZE
 GRID_HEIGHT = GRID_SIZE * TILE_SIZE
@@ -18,38 +37,9 @@ GRID_X = GRID_MARGIN_X
 GRID_Y = GRID_MARGIN_Y
 PATTERN_SIZE = 40
 ANIMATION_SPEED = 15
-TOTAL_MOVES = 10  # Set initial move count
-TIMER_START = 180  # 3 minutes in seconds
-
-LETTER_SCORES = {
-    "A": 1, "B": 3, "C": 3, "D": 2, "E": 1, "F": 4, "G": 2, "H": 4, "I": 1,
-    "J": 8, "K": 5, "L": 1, "M": 3, "N": 1, "O": 1, "P": 3, "Q": 10, "R": 1,
-    "S": 1, "T": 1, "U": 1, "V": 4, "W": 4, "X": 8, "Y": 4, "Z": 10
-}
-
-LETTER_DISTRIBUTION = {
-    'A': 6, 'B': 3, 'C': 3, 'D': 4, 'E': 8, 'F': 3, 'G': 3, 'H': 3, 'I': 6,
-    'J': 2, 'K': 2, 'L': 4, 'M': 3, 'N': 4, 'O': 5, 'P': 3, 'Q': 2, 'R': 4,
-    'S': 4, 'T': 4, 'U': 3, 'V': 3, 'W': 3, 'X': 2, 'Y': 3, 'Z': 2
-}
-
-# Letter groups for grid generation strategy
-LETTER_GROUPS = {
-    'VOWELS': ['A', 'E', 'I', 'O', 'U', 'Y'],
-    'COMMON_CONSONANTS': ['R', 'S', 'T', 'N', 'L'],
-    'RARE_CONSONANTS': ['Q', 'X', 'Z', 'J', 'K'],
-    'SUFFIX_LETTERS': ['S', 'D', 'R']
-}
-
-# Common English letter pairs to avoid generating too many valid words
-COMMON_BIGRAMS = {
-    'TH', 'HE', 'IN', 'ER', 'AN', 'RE', 'ND', 'ON', 'EN', 'AT', 
-    'ES', 'OR', 'AR', 'AL', 'TE', 'CO', 'DE', 'TO', 'RA', 'ET'
-}
-
-LETTER_POOL = []
-for letter, count in LETTER_DISTRIBUTION.items():
-    LETTER_POOL.extend([letter] * count)
+FRAME_RATE = 60  # Frames per second while something on screen animates
+MAX_IDLE_WAIT = 1000  # Longest idle sleep in milliseconds, should a wake-up be missed
+SNAPSHOT_EVENT = pygame.USEREVENT + 1  # Posted by the engine thread when it has something to show
 
 # Colors
 WHITE = (255, 255, 255)
@@ -72,191 +62,26 @@ SELECTED_BORDER = (255, 220, 0)  # Bright yellow for selected tile border
 FONT = pygame.font.Font(None, 50)
 HEADER_FONT = pygame.font.Font(None, 40)
 SCORE_FONT = pygame.font.Font(None, 20)
+HINT_FONT = pygame.font.Font(None, 28)
 LARGE_FONT = pygame.font.Font(None, 80)
 
-# Load dictionary of valid English words using NLTK
-try:
-    import nltk
-    from nltk.corpus import words
-    
-    # Download words corpus if not already present
-    try:
-        nltk.data.find('corpora/words')
-    except LookupError:
-        nltk.download('words', quiet=True)
-    
-    # Get all words and convert to uppercase for case-insensitive matching
-    word_list = {word.upper() for word in words.words() if len(word) >= 3}
-    print(f"Loaded {len(word_list)} words from NLTK corpus")
-except ImportError:
-    print("NLTK not installed, using fallback dictionary")
-    # Minimal dictionary as fallback
-    word_list = {"CAT", "DOG", "PIG", "BAT", "HAT", "RUN", "SIT", "FLY", "BIG", 
-                "RED", "MAP", "PIN", "CUP", "BOX", "CAR", "BUS", "SUN", "AIR",
-                "SEA", "TOP", "LOW", "HOT", "ICE", "ONE", "TWO", "EAT", "TEN"}
-    
-def check_word(word):
-    """Checks if a string is a valid word in our dictionary."""
-    return word in word_list and len(word) >= 3
-
-def get_new_letter(adjacent_letters=None):
-    """Get a new letter based on strategic distribution to minimize word formation."""
-    vowels = ['A', 'E', 'I', 'O', 'U']
-    
-    # Apply strategic letter selection when we have adjacent letters
-    if adjacent_letters:
-        # Avoid placing vowels next to vowels
-        vowel_count = sum(1 for letter in adjacent_letters if letter in LETTER_GROUPS['VOWELS'])
-        if vowel_count >= 2:
-            # Too many vowels nearby, avoid adding another vowel
-            consonants = [l for l in LETTER_POOL if l not in LETTER_GROUPS['VOWELS']]
-            return random.choice(consonants)
-        
-        # Avoid placing common consonant pairs
-        for letter in adjacent_letters:
-            for adjacent in adjacent_letters:
-                if letter + adjacent in COMMON_BIGRAMS:
-                    # Avoid letters that would complete common pairs
-                    uncommon = LETTER_GROUPS['RARE_CONSONANTS']
-                    if uncommon:
-                        return random.choice(uncommon)
-    
-    # 30% chance to force a vowel (reduced from 40%)
-    if random.random() < 0.3:
-        # Weight vowels according to their frequency in the pool
-        vowel_weights = {v: LETTER_DISTRIBUTION[v] for v in vowels}
-        total = sum(vowel_weights.values())
-        r = random.random() * total
-        cumulative = 0
-        for vowel, weight in vowel_weights.items():
-            cumulative += weight
-            if r <= cumulative:
-                return vowel
-    
-    # Otherwise use the standard letter pool
-    return random.choice(LETTER_POOL)
-
-
-def generate_grid_without_words():
-    """Generate a grid with no valid words already formed."""
-    attempts = 0
-    max_attempts = 100  # Prevent infinite loop
-    
-    while attempts < max_attempts:
-        attempts += 1
-        
-        # Create initial random grid with smarter letter placement
-        new_grid = [[None for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-        
-        # Fill grid with strategic letter placement
-        for r in range(GRID_SIZE):
-            for c in range(GRID_SIZE):
-                # Get adjacent letters (that are already placed)
-                adjacent_letters = set()  # Using set for faster lookups
-                # Check left
-                if c > 0 and new_grid[r][c-1]:
-                    adjacent_letters.add(new_grid[r][c-1])
-                # Check above
-                if r > 0 and new_grid[r-1][c]:
-                    adjacent_letters.add(new_grid[r-1][c])
-                # Check diagonals if needed
-                if r > 0 and c > 0 and new_grid[r-1][c-1]:
-                    adjacent_letters.add(new_grid[r-1][c-1])
-                
-                # Get a new letter considering adjacent letters
-                new_grid[r][c] = get_new_letter(list(adjacent_letters))
-        
-        # Check if the grid has any valid words
-        valid_words_found = False
-        
-        # Check rows
-        for r in range(GRID_SIZE):
-            row_str = ''.join(new_grid[r])
-            for start in range(GRID_SIZE - 2):  # Minimum 3-letter word
-                for end in range(start + 2, GRID_SIZE):
-                    word = row_str[start:end+1]
-                    if check_word(word):
-                        valid_words_found = True
-                        break
-                if valid_words_found:
-                    break
-            if valid_words_found:
-                break
-        
-        if not valid_words_found:
-            # Check columns
-            for c in range(GRID_SIZE):
-                col_str = ''.join(new_grid[r][c] for r in range(GRID_SIZE))
-                for start in range(GRID_SIZE - 2):  # Minimum 3-letter word
-                    for end in range(start + 2, GRID_SIZE):
-                        word = col_str[start:end+1]
-                        if check_word(word):
-                            valid_words_found = True
-                            break
-                    if valid_words_found:
-                        break
-                if valid_words_found:
-                    break
-        
-        # If no valid words were found, use this grid
-        if not valid_words_found:
-            print(f"Found grid with no words after {attempts} attempts")
-            return new_grid
-    
-    # If we can't find a grid without words after max attempts,
-    # create a grid with minimal valid words by replacing problematic letters
-    print(f"Could not find grid with no words after {max_attempts} attempts")
-    print("Creating grid with manual fixes...")
-    
-    # Create an initial grid
-    fallback_grid = [[get_new_letter() for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-    
-    # Replace tiles that form words with less common letters (Q, Z, X)
-    uncommon = ['Q', 'Z', 'X', 'J', 'K']
-    
-    # Check and fix rows
-    for r in range(GRID_SIZE):
-        row_str = ''.join(fallback_grid[r])
-        for start in range(GRID_SIZE - 2):
-            for end in range(start + 2, GRID_SIZE):
-                word = row_str[start:end+1]
-                if check_word(word):
-                    # Replace middle letter with uncommon letter
-                    mid = start + (end - start) // 2
-                    fallback_grid[r][mid] = random.choice(uncommon)
-    
-    # Check and fix columns
-    for c in range(GRID_SIZE):
-        col_str = ''.join(fallback_grid[r][c] for r in range(GRID_SIZE))
-        for start in range(GRID_SIZE - 2):
-            for end in range(start + 2, GRID_SIZE):
-                word = col_str[start:end+1]
-                if check_word(word):
-                    # Replace middle letter with uncommon letter
-                    mid = start + (end - start) // 2
-                    fallback_grid[mid][c] = random.choice(uncommon)
-    
-    return fallback_grid
-
-
-# Initialize grid with weighted random letters
-grid = generate_grid_without_words()
 
 # Pygame setup
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Word Puzzle Game")
 
+# The running game session (created in main)
+engine = None
+# With --threaded: plays the engine thread's snapshots, and ``engine`` is its view
+player = None
+# Snapshot of the running session, rewritten after every move (see ``snapshot``)
+SAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "savegame.wcs")
+save_path = None
+
 selected_tile = None
-moves_left = TOTAL_MOVES
-score = 0
-hints_used = 0
 recommended_swaps = [] 
-start_time = time.time()
-
-# Timer pausing variables
-paused_time = 0  # Total time paused
-is_paused = False  # Is timer currently paused
-pause_start_time = 0  # When the current pause began
+hint_explanation = (None, "")  # (swap and board explained, text shown under the grid)
+HINT_WORDS = 5  # Words listed when explaining the top recommended swap
 
 
 def draw_gradient_tile(surface, x, y, width, height, color1, color2, opacity=255):
@@ -366,7 +191,7 @@ def draw_grid_tiles(empty_positions=None, fading_tiles=None):
                 draw_gradient_tile(temp_surface, 0, 0, TILE_SIZE, TILE_SIZE, 
                                  DARK_PURPLE, LIGHT_PURPLE, alpha)
                 
-                letter = grid[row][col]
+                letter = engine.grid[row][col]
                 if letter:
                     # Fade text along with tile
                     text_color = (TEXT_COLOR[0], TEXT_COLOR[1], TEXT_COLOR[2], alpha)
@@ -451,7 +276,7 @@ def draw_grid_tiles(empty_positions=None, fading_tiles=None):
                 pygame.draw.rect(screen, WHITE, (x + 1, y + 1, TILE_SIZE - 2, TILE_SIZE - 2), 2)
             
             # Draw the letter and score on the tile
-            letter = grid[row][col]
+            letter = engine.grid[row][col]
             if letter:
                 text_surface = FONT.render(letter, True, TEXT_COLOR)
                 score_surface = SCORE_FONT.render(str(LETTER_SCORES[letter]), True, WHITE)
@@ -469,6 +294,9 @@ def draw_grid():
     
     # Draw all grid tiles using our helper function
     draw_grid_tiles()
+
+    # Say why the top recommendation is worth making
+    draw_hint_explanation()
     
     # Get mouse position for hover effect
     mouse_x, mouse_y = pygame.mouse.get_pos()
@@ -528,7 +356,7 @@ def draw_grid():
             pygame.draw.rect(screen, WHITE, (x + 1, y + 1, TILE_SIZE - 2, TILE_SIZE - 2), 2)
 
             # Draw the letter and its score
-            letter = grid[row][col]
+            letter = engine.grid[row][col]
             text_surface = FONT.render(letter, True, TEXT_COLOR)
             score_surface = SCORE_FONT.render(str(LETTER_SCORES[letter]), True, WHITE)
 
@@ -586,8 +414,6 @@ def draw_grid():
                     
 def draw_header():
     """Displays the timer, moves left, score, and hint button."""
-    global moves_left, score, paused_time, is_paused, hints_used
-    
     # Draw header background directly to the screen first
     pygame.draw.rect(screen, WHITE, (0, 0, WIDTH, HEADER_HEIGHT))
     
@@ -595,14 +421,7 @@ def draw_header():
     pygame.draw.rect(screen, DARK_PURPLE, (0, 0, WIDTH, HEADER_HEIGHT), 3)
 
     # Calculate remaining time, accounting for pauses
-    if is_paused:
-        current_pause_duration = time.time() - pause_start_time
-        total_paused = paused_time + current_pause_duration
-    else:
-        total_paused = paused_time
-
-    elapsed_time = int(time.time() - start_time - total_paused)
-    remaining_time = max(0, TIMER_START - elapsed_time)
+    remaining_time = engine.remaining_time()
     minutes = remaining_time // 60
     seconds = remaining_time % 60
 
@@ -612,8 +431,8 @@ def draw_header():
 
     # Header labels
     headers = ["Time", "Moves", "Score", ""]
-    values = [timer_text, str(moves_left), str(score), f"{3 - hints_used}"]
-    colors = [timer_color, DARK_PURPLE, DARK_PURPLE, (0, 150, 0) if hints_used < 3 else (150, 0, 0)]
+    values = [timer_text, str(engine.moves_left), str(engine.score), f"{MAX_HINTS - engine.hints_used}"]
+    colors = [timer_color, DARK_PURPLE, DARK_PURPLE, (0, 150, 0) if engine.hints_used < MAX_HINTS else (150, 0, 0)]
     cell_width = WIDTH // len(headers)
 
     # Draw table structure
@@ -633,7 +452,7 @@ def draw_header():
     hint_button_y = HEADER_HEIGHT // 3 - hint_button_height // 2
 
     # Change button color based on availability
-    button_color = (0, 200, 0) if hints_used < 3 else (200, 0, 0)
+    button_color = (0, 200, 0) if engine.hints_used < MAX_HINTS else (200, 0, 0)
     pygame.draw.rect(screen, button_color, (hint_button_x, hint_button_y, hint_button_width, hint_button_height), 0, border_radius=8)
     pygame.draw.rect(screen, WHITE, (hint_button_x, hint_button_y, hint_button_width, hint_button_height), 2, border_radius=8)
 
@@ -644,7 +463,7 @@ def draw_header():
 
 def animate_swap(pos1, pos2):
     """Smoothly moves two tiles between positions."""
-    global grid, moves_left, score    
+    grid = engine.grid
     r1, c1 = pos1
     r2, c2 = pos2
     # Adjust x,y to account for grid centering
@@ -682,7 +501,7 @@ def animate_swap(pos1, pos2):
                 draw_gradient_tile(screen, tile_x, tile_y, TILE_SIZE, TILE_SIZE, DARK_PURPLE, LIGHT_PURPLE)
                 pygame.draw.rect(screen, WHITE, (tile_x + 1, tile_y + 1, TILE_SIZE - 2, TILE_SIZE - 2), 2)
                 
-                letter = grid[row][col]
+                letter = engine.grid[row][col]
                 if letter:  # Check if letter exists
                     text_surface = FONT.render(letter, True, TEXT_COLOR)
                     score_surface = SCORE_FONT.render(str(LETTER_SCORES[letter]), True, WHITE)
@@ -732,118 +551,132 @@ def animate_swap(pos1, pos2):
         pygame.time.delay(10)
 
     # Perform the actual swap
-    grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
-    moves_left -= 1  # Reduce move count
+    engine.swap_tiles(pos1, pos2)
     
     # Process valid words with animations
     process_valid_words()
-    
+
+    # Reshuffle if no swap can score any more
+    engine.ensure_playable()
+
+    # Checkpoint so a crash or a closed window does not lose the game
+    checkpoint()
+
     greedy_best_first_search_for_swaps()
 
 
-def get_words_and_positions():
-    """Check for valid words in rows and columns, returns words with their positions."""
-    all_words = []
-    
-    # Check rows - only left to right direction
-    for r in range(GRID_SIZE):
-        row_str = ''.join(grid[r])
-        for start in range(GRID_SIZE - 2):  # Minimum 3-letter word
-            for end in range(start + 2, GRID_SIZE):
-                word = row_str[start:end+1]
-                if check_word(word):
-                    # Store word and positions: (word, [(r,c), (r,c+1), ...])
-                    positions = [(r, start + i) for i in range(end - start + 1)]
-                    all_words.append((word, positions))
-    
-    # Check columns - only top to bottom direction
-    for c in range(GRID_SIZE):
-        col_chars = [grid[r][c] for r in range(GRID_SIZE)]
-        col_str = ''.join(col_chars)
-        for start in range(GRID_SIZE - 2):  # Minimum 3-letter word
-            for end in range(start + 2, GRID_SIZE):
-                word = col_str[start:end+1]
-                if check_word(word):
-                    # Store word and positions: (word, [(r,c), (r+1,c), ...])
-                    positions = [(start + i, c) for i in range(end - start + 1)]
-                    all_words.append((word, positions))
-    
-    # Filter out subwords - only keep the longest word when positions overlap
-    valid_words = []
-    
-    # Pre-sort words by length for better efficiency
-    all_words.sort(key=lambda x: len(x[0]), reverse=True)
-    
-    # Use set for faster position tracking
-    covered_positions = set()
-    
-    for word, positions in all_words:
-        pos_set = frozenset(positions)  # Immutable set for faster comparisons
-        if not pos_set.intersection(covered_positions):
-            valid_words.append((word, positions))
-            covered_positions.update(pos_set)
-    
-    return valid_words
+def draw_moving_tile(x, y, letter):
+    """Draws a tile with its letter at a pixel position, off the grid cells."""
+    draw_gradient_tile(screen, x, y, TILE_SIZE, TILE_SIZE, DARK_PURPLE, LIGHT_PURPLE)
+    pygame.draw.rect(screen, WHITE, (x + 1, y + 1, TILE_SIZE - 2, TILE_SIZE - 2), 2)
+    if letter:
+        text_surface = FONT.render(letter, True, TEXT_COLOR)
+        score_surface = SCORE_FONT.render(str(LETTER_SCORES[letter]), True, WHITE)
+        screen.blit(text_surface, (x + TILE_SIZE // 3, y + TILE_SIZE // 4))
+        screen.blit(score_surface, (x + TILE_SIZE - 20, y + TILE_SIZE - 25))
 
-def simulate_swap_and_evaluate(pos1, pos2):
-    """Simulate swap directly on the real grid and calculate score gain, then restore grid."""
-    global grid
-    r1, c1 = pos1
-    r2, c2 = pos2
 
-    # Swap directly
-    grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
+def draw_snapshot_frame(progress):
+    """Draws the board eased from ``player.previous`` to ``player.current`` by ``progress`` (0 to 1)."""
+    current = player.current
+    previous = player.previous
+    if progress >= 1 or previous is None or current.kind not in TRANSITION_TIMES:
+        draw_grid()
+        return
+
+    draw_background_and_header()
+    draw_grid_container()
+    if current.kind == "swap":
+        # Both tiles slide into each other's place
+        pos1, pos2 = current.swap
+        draw_grid_tiles(empty_positions={pos1, pos2})
+        for (from_row, from_col), (to_row, to_col) in ((pos1, pos2), (pos2, pos1)):
+            x = GRID_X + (from_col + (to_col - from_col) * progress) * TILE_SIZE
+            y = GRID_Y + (from_row + (to_row - from_row) * progress) * TILE_SIZE
+            draw_moving_tile(x, y, engine.grid[to_row][to_col])
+    elif current.kind == "words":
+        # The words about to pop fade out
+        alpha = int(255 * (1 - progress))
+        draw_grid_tiles(fading_tiles={pos: alpha for _, positions in current.words for pos in positions})
+    else:
+        # Every tile above the lowest changed (or popped) cell of a column drops one row into place
+        size = current.grid_size
+        lowest = {}
+        popped = [pos for _, positions in previous.words for pos in positions]
+        changed = [divmod(i, size) for i, (old, new) in enumerate(zip(previous.letters, current.letters))
+                   if old != new]
+        for row, col in popped + changed:
+            lowest[col] = max(lowest.get(col, row), row)
+        dropping = {(row, col) for col, bottom in lowest.items() for row in range(bottom + 1)}
+        draw_grid_tiles(empty_positions=dropping)
+        for row, col in sorted(dropping):
+            draw_moving_tile(GRID_X + col * TILE_SIZE, GRID_Y + (row - 1 + progress) * TILE_SIZE,
+                             engine.grid[row][col])
+
+
+def restore_move(redo=False):
+    """Undo the last move, or redo the last undone one."""
+    global recommended_swaps
+    if player is not None:
+        if redo:
+            player.game.redo()
+        else:
+            player.game.undo()
+        return
+    history = engine.history
+    if (history.redo() if redo else history.undo()) is not None:
+        recommended_swaps = []
+        checkpoint()
+
 
-    # Capture score before processing
-    initial_score = 0
-    temp_score = 0
-    temp_score += calculate_grid_total_score()
+def stop_engine_thread():
+    """Join the engine thread, if one runs, and make its engine the session drawn again."""
+    global engine, player
+    if player is not None:
+        engine = player.game.stop()
+        player = None
 
-    # Undo the swap back to original grid (restoring the grid)
-    grid[r1][c1], grid[r2][c2] = grid[r2][c2], grid[r1][c1]
 
-    # Return score gain
-    return temp_score - initial_score
+def checkpoint():
+    """Save the session to ``save_path``, if saving is on."""
+    if save_path:
+        snapshot.save(engine, save_path)
 
-def calculate_grid_total_score():
-    """Process all valid words, calculate total score, and return it (without animations or drops)."""
-    total_score = 0
-    valid_words = get_words_and_positions()
-    for word, positions in valid_words:
-        total_score += calculate_word_score(word)
-    return total_score
 
 def greedy_best_first_search_for_swaps():
     """Greedy Best-First Search: Recommend the best swaps ranked by potential score gain."""
     global recommended_swaps
-    moves = []
-
-    for r in range(GRID_SIZE):
-        for c in range(GRID_SIZE):
-            if c + 1 < GRID_SIZE:
-                score_gain = simulate_swap_and_evaluate((r, c), (r, c + 1))
-                moves.append((score_gain, (r, c), (r, c + 1)))
-            if r + 1 < GRID_SIZE:
-                score_gain = simulate_swap_and_evaluate((r, c), (r + 1, c))
-                moves.append((score_gain, (r, c), (r + 1, c)))
 
-    moves.sort(reverse=True, key=lambda x: x[0])
+    # Store the top 3 recommendations
+    recommended_swaps = engine.recommend_swaps(3)
+
+
+def explain_top_hint():
+    """Words within reach of the top recommended swap, as a line of text (cached per swap and board)."""
+    global hint_explanation
+    # Spectator and engine-thread views only hold snapshots; the engine they show cannot be asked
+    if not recommended_swaps or not isinstance(engine, GameEngine):
+        return ""
+    _, pos1, pos2 = recommended_swaps[0]
+    key = (pos1, pos2, tuple(map(tuple, engine.grid)))
+    if hint_explanation[0] != key:
+        words = []
+        for _, _, line_words in engine.explain_swap(pos1, pos2):
+            words.extend(word for word in line_words if word not in words)
+        words.sort(key=lambda word: -calculate_word_score(word))
+        text = f"Within reach: {', '.join(words[:HINT_WORDS])}" if words else ""
+        hint_explanation = (key, text)
+    return hint_explanation[1]
+
+
+def draw_hint_explanation():
+    """Show the words the top recommended swap brings within reach, below the grid."""
+    text = explain_top_hint()
+    if text:
+        surface = HINT_FONT.render(text, True, DARK_PURPLE)
+        screen.blit(surface, (WIDTH // 2 - surface.get_width() // 2,
+                              GRID_Y + GRID_HEIGHT + (HEIGHT - GRID_Y - GRID_HEIGHT) // 2 - surface.get_height() // 2))
 
-    # Store the top 5 recommendations
-    recommended_swaps = moves[:3]
-
-
-def calculate_word_score(word):
-    # Cache common word scores
-    if not hasattr(calculate_word_score, 'score_cache'):
-        calculate_word_score.score_cache = {}
-    
-    if word in calculate_word_score.score_cache:
-        return calculate_word_score.score_cache[word]
-    
-    score = sum(LETTER_SCORES[letter] for letter in word)
-    calculate_word_score.score_cache[word] = score
-    return score
 
 def highlight_words(words_positions):
     """Highlight valid words with animations showing the word and score."""
@@ -1055,42 +888,18 @@ def pop_tiles(positions):
                 return
     
     # Remove popped tiles from the grid
-    for row, col in positions:
-        grid[row][col] = None
+    engine.pop_tiles(positions)
 
 def drop_new_tiles():
     """Fill empty spaces by dropping tiles from above and adding new ones at the top."""
+    grid = engine.grid
     # Process each column individually
     for col in range(GRID_SIZE):
-        # Count how many empty spaces in this column
-        empty_spaces = []
-        for row in range(GRID_SIZE):
-            if grid[row][col] is None:
-                empty_spaces.append(row)
-        
-        if not empty_spaces:
+        # Step 1: Shift existing tiles down and add new letters at the top
+        empty_count = engine.drop_column(col)
+        if not empty_count:
             continue  # No empty spaces in this column
             
-        # Step 1: Shift existing tiles down
-        for empty_row in sorted(empty_spaces):
-            # Move all tiles above this empty space down
-            for row in range(empty_row, 0, -1):
-                grid[row][col] = grid[row-1][col]
-            
-            # Add new letter at the top using our smart algorithm
-            # Get adjacent letters to consider when placing the new one
-            adjacent_letters = []
-            # Check left and right neighbors for the top row
-            if col > 0 and grid[0][col-1]:
-                adjacent_letters.append(grid[0][col-1])
-            if col < GRID_SIZE - 1 and grid[0][col+1]:
-                adjacent_letters.append(grid[0][col+1])
-            # Check the tile below if it exists
-            if grid[1][col]:
-                adjacent_letters.append(grid[1][col])
-                
-            grid[0][col] = get_new_letter(adjacent_letters)
-            
         # Step 2: Animate the dropping with a simple smooth motion
         steps = 8
         for step in range(steps + 1):
@@ -1110,7 +919,7 @@ def drop_new_tiles():
             for r in range(GRID_SIZE):
                 for c in range(GRID_SIZE):
                     # Skip the column we're animating
-                    if c == col and r < len(empty_spaces):
+                    if c == col and r < empty_count:
                         # Calculate the drop position for animated tiles
                         source_y = GRID_Y + (r - 1) * TILE_SIZE
                         if r == 0:
@@ -1171,23 +980,17 @@ def drop_new_tiles():
 
 def process_valid_words():
     """Check for valid words, update score, and handle tile movements."""
-    global score, recommended_swaps, is_paused, pause_start_time, paused_time
+    global recommended_swaps
 
     # Step 1: Find valid words
-    valid_words = get_words_and_positions()
+    valid_words = engine.get_words_and_positions()
     if not valid_words:
         # If no words found and timer was paused, resume it
-        if is_paused:
-            # Calculate how long we were paused and add to total paused time
-            current_pause_duration = time.time() - pause_start_time
-            paused_time += current_pause_duration
-            is_paused = False
+        engine.resume_timer()
         return False  # No valid words found
 
     # If this is the start of a chain reaction, pause the timer
-    if not is_paused:
-        is_paused = True
-        pause_start_time = time.time()
+    engine.pause_timer()
 
     # Clear recommendations during animations
     recommended_swaps = []
@@ -1196,13 +999,7 @@ def process_valid_words():
     highlight_words(valid_words)
 
     # Step 3: Collect positions of tiles to be removed and update score
-    all_positions = set()
-    for word, positions in valid_words:
-        word_score = calculate_word_score(word)
-        score += word_score
-        # Only add positions of tiles that form valid words
-        for pos in positions:
-            all_positions.add(pos)
+    all_positions = engine.score_words(valid_words)
 
     # Step 4: Remove tiles and animate
     pop_tiles(all_positions)
@@ -1212,23 +1009,22 @@ def process_valid_words():
 
     # Step 6: Check for new valid words after dropping
     # Recursively call this function if new valid words are formed
-    if get_words_and_positions():
+    if engine.get_words_and_positions():
         pygame.time.delay(300)  # Brief delay before checking for new matches
         process_valid_words()
     else:
         # No more words found, chain reaction is over, resume timer
-        if is_paused:
-            # Calculate how long we were paused and add to total paused time
-            current_pause_duration = time.time() - pause_start_time
-            paused_time += current_pause_duration
-            is_paused = False
+        engine.resume_timer()
 
     if valid_words:
         return True
 
-def show_game_over_menu():
-    """Display an attractive game over screen with the final score."""
-    global score
+def show_game_over_menu(rank=None):
+    """Display an attractive game over screen with the final score.
+
+    ``rank`` is the player's (rank, best score, players) on the leaderboard.
+    """
+    score = engine.score
     
     # Create a semi-transparent overlay for the entire screen
     overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
@@ -1321,6 +1117,13 @@ def show_game_over_menu():
             
             screen.blit(score_label, (label_x, label_y))
             screen.blit(score_text, (score_x, score_y))
+
+        # Leaderboard rank
+        if i > 20 and rank is not None:
+            position, best, players = rank
+            rank_text = SCORE_FONT.render(f"Rank #{position} of {players}  (best {best})", True, WHITE)
+            rank_text.set_alpha(alpha)
+            screen.blit(rank_text, (WIDTH // 2 - rank_text.get_width() // 2, box_y + 235))
         
         # Continue text
         if i > 25:
@@ -1346,123 +1149,354 @@ def show_game_over_menu():
         pygame.time.delay(100)
     
     return False
-    
-    # If we can't find a grid without words after max attempts,
-    # create a grid with minimal valid words by replacing problematic letters
-    print(f"Could not find grid with no words after {max_attempts} attempts")
-    print("Creating grid with manual fixes...")
-    
-    # Create an initial grid
-    fallback_grid = [[get_new_letter() for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-    
-    # Replace tiles that form words with less common letters (Q, Z, X)
-    uncommon = ['Q', 'Z', 'X', 'J', 'K']
-    
-    # Check and fix rows
-    for r in range(GRID_SIZE):
-        row_str = ''.join(fallback_grid[r])
-        for start in range(GRID_SIZE - 2):
-            for end in range(start + 2, GRID_SIZE):
-                word = row_str[start:end+1]
-                if check_word(word):
-                    # Replace middle letter with uncommon letter
-                    mid = start + (end - start) // 2
-                    fallback_grid[r][mid] = random.choice(uncommon)
-    
-    # Check and fix columns
-    for c in range(GRID_SIZE):
-        col_str = ''.join(fallback_grid[r][c] for r in range(GRID_SIZE))
-        for start in range(GRID_SIZE - 2):
-            for end in range(start + 2, GRID_SIZE):
-                word = col_str[start:end+1]
-                if check_word(word):
-                    # Replace middle letter with uncommon letter
-                    mid = start + (end - start) // 2
-                    fallback_grid[mid][c] = random.choice(uncommon)
-    
-    return fallback_grid
-
 
-# Game loop
-running = True
-game_over = False
 
-while running:
-    # Check for game over conditions - account for paused time
-    if is_paused:
-        current_pause_duration = time.time() - pause_start_time
-        total_paused = paused_time + current_pause_duration
-    else:
-        total_paused = paused_time
+def apply_replay_event(event):
+    """Apply a recorded input through the same animated path as a player click."""
+    global recommended_swaps
+    kind, _, pos1, pos2 = event
+    if kind in (EVENT_UNDO, EVENT_REDO):
+        restore_move(kind == EVENT_REDO)
+    elif player is not None:
+        if kind == EVENT_SWAP:
+            player.game.swap(pos1, pos2)
+        elif kind == EVENT_HINT:
+            player.game.hint()
+    elif kind == EVENT_SWAP:
+        animate_swap(pos1, pos2)
+        recommended_swaps = []  # Clear recommendations after a swap
+    elif kind == EVENT_HINT:
+        if engine.use_hint() is not None:
+            greedy_best_first_search_for_swaps()
+
+
+def instrument_profiler():
+    """Register the game's hot paths with the profiler; they are wrapped only while it is on."""
+    module = sys.modules[__name__]
+    for name in ("draw_grid", "draw_header", "draw_grid_tiles", "draw_background_and_header",
+                 "draw_grid_container", "animate_swap", "highlight_words", "pop_tiles", "drop_new_tiles",
+                 "draw_snapshot_frame"):
+        profiler.watch(module, name, "render")
+    profiler.watch(pygame.display, "flip", "render")
+    profiler.watch(pygame.display, "update", "render")
+    profiler.watch(module, "greedy_best_first_search_for_swaps", "logic", "hint search")
+    profiler.watch(module, "process_valid_words", "logic", "cascade")
+    profiler.watch(GameEngine, "get_words_and_positions", "logic")
+    profiler.count(engine_module, "check_word", "dictionary lookups")
+    profiler.count(pygame, "Surface", "surfaces")
+
+
+def draw_profiler_overlay():
+    """Draws the profiler statistics in the bottom-left corner."""
+    lines = profiler.summary()
+    line_height = SCORE_FONT.get_linesize()
+    width, height = 300, line_height * len(lines) + 10
+    panel = pygame.Surface((width, height), pygame.SRCALPHA)
+    panel.fill(OVERLAY_COLOR)
+    for i, line in enumerate(lines):
+        panel.blit(SCORE_FONT.render(line, True, WHITE), (6, 5 + i * line_height))
+    screen.blit(panel, (5, HEIGHT - height - 5))
+
+
+def idle_timeout(replay_events):
+    """Milliseconds the game loop may sleep before the screen changes on its own.
+
+    Zero while the selected tile pulses or snapshots are being eased
+    between; otherwise until the timer shows the next second or the next
+    recorded input is due. Input, or a snapshot from the engine thread,
+    ends the sleep early.
+    """
+    if selected_tile is not None or (player is not None and player.animating()):
+        return 0
+    timeout = MAX_IDLE_WAIT
+    tick = engine.next_tick()
+    if tick is not None:
+        timeout = min(timeout, tick * 1000)
+    if replay_events:
+        timeout = min(timeout, replay_events[0][1] - engine.elapsed_time() * 1000)
+    return max(1, math.ceil(timeout))
+
+
+def wait_for_events(timeout, frame_clock):
+    """Pending events, blocking up to ``timeout`` ms for one; 0 paces frames at ``FRAME_RATE``."""
+    if timeout <= 0:
+        frame_clock.tick(FRAME_RATE)
+        return pygame.event.get()
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+
+def watch_stream(address):
+    """Render a game streamed from another process (see ``stream``) until it ends."""
+    global engine, recommended_swaps
+
+    spectator = Spectator(address)
+    engine = spectator.mirror
+    while not engine.synced and not spectator.closed:
+        spectator.poll()
+        pygame.time.delay(10)
 
-    elapsed_time = int(time.time() - start_time - total_paused)
-    time_over = elapsed_time >= TIMER_START
-    moves_over = moves_left <= 0
+    running = True
+    shown_time = None
+    while running and not spectator.closed:
+        changed = spectator.poll()
+        events = pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+        # Redraw only when a frame arrived, on input or when the timer shows a new second
+        if changed or events or engine.remaining_time() != shown_time:
+            recommended_swaps = engine.hint_swaps
+            shown_time = engine.remaining_time()
+            draw_grid()
+            pygame.display.flip()
+        pygame.time.delay(10)
 
-    if (time_over or moves_over) and not game_over:
-        if is_paused:
-            is_paused = False
-            paused_time += (time.time() - pause_start_time)
-        
-        game_over = True
+    if running and engine.synced:
         show_game_over_menu()
-        running = False
-        continue
-    
-    # Draw the game interface 
-    # draw_grid now calls draw_background_and_header internally
-    draw_grid()
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
+    spectator.close()
+    print(spectator.frames.stats.report())
+    pygame.quit()
+
+
+def main(argv=None):
+    global engine, player, selected_tile, recommended_swaps, save_path
+
+    parser = argparse.ArgumentParser(description="Word Crush")
+    parser.add_argument("--seed", type=int, help="seed for a reproducible session")
+    parser.add_argument("--record", metavar="PATH", help="save a replay of this session to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="play back a recorded session in real time")
+    parser.add_argument("--selection", choices=sorted(SELECTION_RULES), default=DEFAULT_SELECTION,
+                        help="rule for choosing between overlapping words")
+    parser.add_argument("--scan", choices=sorted(SCAN_MODES), default=DEFAULT_SCAN_MODE,
+                        help="game mode: directions words are read in")
+    parser.add_argument("--hints", choices=("greedy", "expected"), default="greedy",
+                        help="rank hints by immediate score or by simulated expected score")
+    parser.add_argument("--player", default=os.environ.get("USER", "player"),
+                        help="name to save scores under on the leaderboard")
+    parser.add_argument("--leaderboard", metavar="PATH", default=LEADERBOARD_PATH,
+                        help="leaderboard database ('' to not save scores)")
+    parser.add_argument("--save", metavar="PATH", default=SAVE_PATH,
+                        help="checkpoint the session to PATH after every move ('' to not save)")
+    parser.add_argument("--resume", metavar="PATH", nargs="?", const=SAVE_PATH,
+                        help="continue the session saved in PATH (default: the last checkpoint)")
+    parser.add_argument("--daily", metavar="DATE", nargs="?", const="today",
+                        help="play the daily puzzle of DATE (YYYY-MM-DD, default today)")
+    parser.add_argument("--puzzles", metavar="PATH", default=PUZZLES_PATH, help="daily puzzle file")
+    parser.add_argument("--stream", metavar="ADDR",
+                        help="stream this session to spectators on host:port or unix:PATH")
+    parser.add_argument("--watch", metavar="ADDR", help="render a session streamed from ADDR")
+    parser.add_argument("--no-idle", dest="idle", action="store_false",
+                        help="redraw continuously instead of sleeping until input or the timer")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="log moves, hints, reshuffles and frame times to PATH (JSON lines, rotated)")
+    parser.add_argument("--threaded", action="store_true",
+                        help="run the engine on its own thread and render from its board snapshots")
+    parser.add_argument("--profile", action="store_true",
+                        help="start with the profiling overlay shown (F3 toggles it)")
+    args = parser.parse_args(argv)
+    if args.watch:
+        watch_stream(args.watch)
+        return
+    hint_search = expected_hints() if args.hints == "expected" else None
+
+    replay_events = []
+    recorder = None
+    if args.replay:
+        log = ReplayLog.load(args.replay)
+        engine = GameEngine(seed=log.seed, grid_size=log.grid_size, verbose=True,
+                            selection=log.selection, scan=log.scan, hint_search=hint_search)
+        replay_events = list(log.events)
+    elif args.daily:
+        date = datetime.date.today() if args.daily == "today" else datetime.date.fromisoformat(args.daily)
+        try:
+            puzzles = PuzzleFile(args.puzzles)
+        except ValueError as e:
+            print(e)
+            return
+        puzzle = puzzles.puzzle(date)
+        puzzles.close()
+        if puzzle is None:
+            print(f"No daily puzzle for {date} in {args.puzzles}")
+            return
+        engine = puzzle.engine(verbose=True, hint_search=hint_search)
+        print(f"Daily puzzle {date}: beat {puzzle.best_score} points (difficulty {puzzle.difficulty():.2f})")
+    elif args.resume:
+        engine = snapshot.load(args.resume, verbose=True, hint_search=hint_search)
+        print(f"Resumed from {args.resume}")
+    else:
+        engine = GameEngine(seed=args.seed, verbose=True, selection=args.selection, scan=args.scan,
+                            hint_search=hint_search)
+        if args.record:
+            recorder = ReplayLog(engine.seed, engine.grid_size, selection=engine.selection, scan=engine.scan)
+            engine.recorder = recorder
+    print(f"Session seed: {engine.seed}")
+    UndoStack(engine)
+    if not args.replay:
+        save_path = args.save
+    hub = None
+    if args.stream:
+        hub = StreamHub(args.stream).start()
+        StreamEncoder(hub.publish).attach(engine)
+        print(f"Streaming on {args.stream}")
+
+    telemetry = frame_times = None
+    if args.telemetry:
+        writer = TelemetryWriter(args.telemetry)
+        telemetry = GameTelemetry(writer)
+        telemetry.attach(engine)
+        frame_times = FrameTimes(writer)
+
+    if args.threaded:
+        def after_input(session):
+            if save_path:
+                snapshot.save(session, save_path)
+        def wake():
+            pygame.event.post(pygame.event.Event(SNAPSHOT_EVENT))
+        player = SnapshotPlayer(EngineThread(engine, after_input=after_input, wake=wake).start())
+        engine = player.view
+
+    instrument_profiler()
+    if args.profile:
+        profiler.enable()
+
+    # Game loop
+    running = True
+    game_over = False
+    frame_clock = pygame.time.Clock()
+
+    while running:
+        profiler.frame()
+        if frame_times is not None:
+            frame_times.tick()
+
+        # Check for game over conditions - account for paused time
+        time_over = engine.is_time_over()
+        moves_over = engine.moves_left <= 0
+        # With --threaded, not before the last move has been applied and shown
+        settled = player is None or player.idle()
+
+        if (time_over or moves_over) and settled and not game_over:
+            stop_engine_thread()
+            engine.resume_timer()
+
+            game_over = True
+            if telemetry is not None:
+                telemetry.game_over(engine)
+            rank = None
+            if args.leaderboard and not args.replay:
+                board = Leaderboard(args.leaderboard)
+                board.submit(args.player, engine.score, engine.grid_size, engine.seed, engine.selection)
+                board.flush()
+                rank = board.rank(args.player, engine.grid_size)
+                board.close()
+            if save_path and os.path.exists(save_path):
+                os.remove(save_path)  # Nothing left to resume
+            show_game_over_menu(rank)
             running = False
+            continue
+
+        # Feed recorded inputs once the game clock reaches their timestamp
+        if replay_events and engine.elapsed_time() * 1000 >= replay_events[0][1] and settled:
+            apply_replay_event(replay_events.pop(0))
+
+        # Draw the game interface 
+        # draw_grid now calls draw_background_and_header internally
+        if player is not None:
+            recommended_swaps = list(engine.hint_swaps)
+            draw_snapshot_frame(player.advance())
+        else:
+            draw_grid()
+        if profiler.enabled:
+            draw_profiler_overlay()
+        pygame.display.flip()
 
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            x, y = event.pos
-
-            # Check if the "Hint" button was clicked
-            hint_button_x = WIDTH - 110
-            hint_button_y = HEADER_HEIGHT // 2 - 20
-            if hint_button_x <= x <= hint_button_x + 100 and hint_button_y <= y <= hint_button_y + 40:
-                if hints_used < 3:  # Only allow hints if the player has hints remaining
-                    hints_used += 1
-                    greedy_best_first_search_for_swaps()  # Calculate the top 3 recommended moves
-            
-            # Handle tile selection and swapping
-            elif y > HEADER_HEIGHT and moves_left > 0 and not time_over:
-                # Adjust for grid position
-                grid_x = x - GRID_X
-                grid_y = y - GRID_Y
-                
-                # Check if click is within grid bounds
-                if 0 <= grid_x < GRID_WIDTH and 0 <= grid_y < GRID_HEIGHT:
-                    col = grid_x // TILE_SIZE
-                    row = grid_y // TILE_SIZE                    
-                    if 0 <= row < GRID_SIZE and 0 <= col < GRID_SIZE:  # Ensure within bounds
-                        if selected_tile is None:
-                            # Set this tile as selected
-                            selected_tile = (row, col)
-                            
-                            # Create a quick "selected" flash effect
-                            flash_x = GRID_X + col * TILE_SIZE
-                            flash_y = GRID_Y + row * TILE_SIZE
-                            flash_surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-                            flash_surface.fill((255, 255, 255, 180))  # White flash
-                            screen.blit(flash_surface, (flash_x, flash_y))
-                            pygame.display.update(pygame.Rect(flash_x, flash_y, TILE_SIZE, TILE_SIZE))
-                            pygame.time.delay(50)  # Brief delay for the flash effect
-                        else:
-                            # Check if tiles are adjacent
-                            if abs(row - selected_tile[0]) + abs(col - selected_tile[1]) == 1:
-                                animate_swap(selected_tile, (row, col))
-                                recommended_swaps = []  # Clear recommendations after a swap
-                            
-                            # Always clear selection
-                            selected_tile = None
-                            # Redraw the grid to remove selection highlight
-                            draw_grid()
-                            pygame.display.update()
-
-    pygame.display.flip()
-
-pygame.quit()
\ No newline at end of file
+        # When idle, sleep until input, the next timer second or the next replayed input
+        events = wait_for_events(idle_timeout(replay_events), frame_clock) if args.idle else pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+                stop_engine_thread()
+                if save_path:
+                    checkpoint()
+                    print(f"Game saved; continue with --resume {save_path}")
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+
+            elif (event.type == pygame.KEYDOWN and event.key in (pygame.K_z, pygame.K_y)
+                  and event.mod & pygame.KMOD_CTRL and not args.replay and settled and not time_over):
+                restore_move(redo=event.key == pygame.K_y)
+                selected_tile = None
+
+            elif event.type == pygame.MOUSEBUTTONDOWN and not args.replay:
+                x, y = event.pos
+
+                # Check if the "Hint" button was clicked
+                hint_button_x = WIDTH - 110
+                hint_button_y = HEADER_HEIGHT // 2 - 20
+                if hint_button_x <= x <= hint_button_x + 100 and hint_button_y <= y <= hint_button_y + 40:
+                    # Only allow hints if the player has hints remaining
+                    if player is not None:
+                        player.game.hint()  # Searched and checkpointed on the engine thread
+                    elif engine.use_hint() is not None:
+                        greedy_best_first_search_for_swaps()  # Calculate the top 3 recommended moves
+                        checkpoint()
+
+                # Handle tile selection and swapping
+                elif y > HEADER_HEIGHT and engine.moves_left > 0 and not time_over and settled:
+                    # Adjust for grid position
+                    grid_x = x - GRID_X
+                    grid_y = y - GRID_Y
+
+                    # Check if click is within grid bounds
+                    if 0 <= grid_x < GRID_WIDTH and 0 <= grid_y < GRID_HEIGHT:
+                        col = grid_x // TILE_SIZE
+                        row = grid_y // TILE_SIZE
+                        if 0 <= row < GRID_SIZE and 0 <= col < GRID_SIZE:  # Ensure within bounds
+                            if selected_tile is None:
+                                # Set this tile as selected
+                                selected_tile = (row, col)
+
+                                # Create a quick "selected" flash effect
+                                flash_x = GRID_X + col * TILE_SIZE
+                                flash_y = GRID_Y + row * TILE_SIZE
+                                flash_surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+                                flash_surface.fill((255, 255, 255, 180))  # White flash
+                                screen.blit(flash_surface, (flash_x, flash_y))
+                                pygame.display.update(pygame.Rect(flash_x, flash_y, TILE_SIZE, TILE_SIZE))
+                                pygame.time.delay(50)  # Brief delay for the flash effect
+                            else:
+                                # Check if tiles are adjacent
+                                if abs(row - selected_tile[0]) + abs(col - selected_tile[1]) == 1:
+                                    if player is not None:
+                                        player.game.swap(selected_tile, (row, col))
+                                    else:
+                                        animate_swap(selected_tile, (row, col))
+                                    recommended_swaps = []  # Clear recommendations after a swap
+
+                                # Always clear selection
+                                selected_tile = None
+                                # Redraw the grid to remove selection highlight
+                                draw_grid()
+                                pygame.display.update()
+
+    if profiler.enabled:
+        print("\n".join(profiler.summary()))
+        profiler.disable()
+    if telemetry is not None:
+        frame_times.flush()
+        telemetry.writer.close()
+    if recorder is not None:
+        recorder.save(args.record)
+        print(f"Replay saved to {args.record}")
+    if hub is not None:
+        hub.close()
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()